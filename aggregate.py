@@ -0,0 +1,137 @@
+# aggregate.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+A lógica de agregação dos resumos estava repetida e diferente em cada rota: `/geral/resumo` agrupava por plataforma e
+`/<plataforma>/resumo` somava tudo em uma única linha, enquanto o relatório pedido agrupa por conta. Além disso, para
+agregar era necessário ter todas as linhas em memória.
+
+Foi criado então um agregador único (`GroupAggregator`) que:
+
+1. Recebe as linhas à medida que chegam do fetch (geradores de view.py), em uma única passagem.
+2. Mantém, para cada grupo, apenas a quantidade de linhas, as somas e a quantidade de valores existentes de cada
+   métrica, ocupando memória proporcional à quantidade de grupos e não à de linhas.
+3. Aceita qualquer combinação das chaves 'platform' e 'account' e gera o mesmo formato de InsightsTable.group_by().
+4. Pode ser combinado com outro agregador (`merge`), permitindo calcular parciais separadas e juntá-las depois.
+"""
+from store import METRIC_COLUMNS, MEAN_COLUMNS, GROUP_KEYS, parse_metric
+"""
+As constantes de `store` definem as métricas, quais delas têm média calculada e as chaves de agrupamento aceitas,
+garantindo que o agregador e a InsightsTable calculem os resumos da mesma forma.
+A função `parse_metric` converte os valores da API, marcando os ausentes ou inválidos.
+"""
+
+_ROW_KEYS = {'platform': 'Platform', 'account': 'Ad Name'}
+"""
+Coluna das linhas de insights correspondente a cada chave de agrupamento.
+"""
+
+
+def parse_group(value, default):
+    """
+    Interpreta o parâmetro `?group=` das rotas de resumo, como 'platform', 'account' ou 'platform,account'.
+    'total' (ou vazio quando não há padrão) resulta em um único grupo com todas as linhas.
+    Retorna a tupla de chaves ou lança `ValueError` se alguma chave não for reconhecida.
+    """
+    if value is None:
+        return default
+    keys = tuple(key.strip() for key in value.split(',') if key.strip() and key.strip() != 'total')
+    unknown = [key for key in keys if key not in GROUP_KEYS]
+    if unknown:
+        raise ValueError(f"Agrupamento inválido: {', '.join(unknown)}. Use {', '.join(GROUP_KEYS)} ou total.")
+    return tuple(key for key in GROUP_KEYS if key in keys)
+
+
+class GroupAggregator:
+    """
+    Agregador de insights em uma única passagem, agrupando pelas chaves informadas.
+    Para cada grupo guarda [quantidade de linhas, somas das métricas..., quantidade de valores existentes...].
+    """
+    def __init__(self, keys=('platform',)):
+        unknown = set(keys) - set(GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"Chaves de agrupamento inválidas: {', '.join(sorted(unknown))}")
+        self.keys = tuple(keys)
+        self.groups = {}
+
+    def add(self, row):
+        """
+        Soma uma linha de insights ao seu grupo.
+        """
+        group = tuple(row.get(_ROW_KEYS[key], '') for key in self.keys)
+        state = self.groups.get(group)
+        if state is None:
+            state = self.groups[group] = [0] + [0.0] * len(METRIC_COLUMNS) + [0] * len(METRIC_COLUMNS)
+        state[0] += 1
+        for position, column in enumerate(METRIC_COLUMNS, start=1):
+            value, is_missing = parse_metric(row.get(column))
+            if not is_missing:
+                state[position] += value
+                state[position + len(METRIC_COLUMNS)] += 1
+
+    def update(self, rows):
+        """
+        Soma todas as linhas de um iterável (normalmente um gerador de view.py) e retorna o próprio agregador.
+        """
+        for row in rows:
+            self.add(row)
+        return self
+
+    def merge(self, other):
+        """
+        Junta os grupos de outro agregador com as mesmas chaves a este, como se as linhas tivessem sido somadas aqui.
+        """
+        if other.keys != self.keys:
+            raise ValueError("Só é possível juntar agregadores com as mesmas chaves de agrupamento.")
+        for group, other_state in other.groups.items():
+            state = self.groups.get(group)
+            if state is None:
+                self.groups[group] = list(other_state)
+            else:
+                for position, value in enumerate(other_state):
+                    state[position] += value
+        return self
+
+    def rollup(self, keys):
+        """
+        Retorna um novo agregador agrupado por um subconjunto das chaves deste, somando os grupos que passam a coincidir.
+        Exemplo: um agregador por ('platform', 'account') pode gerar o resumo por ('platform',) sem reler as linhas.
+        """
+        missing = set(keys) - set(self.keys)
+        if missing:
+            raise ValueError(f"Chaves ausentes no agregador: {', '.join(sorted(missing))}")
+        positions = [self.keys.index(key) for key in keys]
+        result = GroupAggregator(keys)
+        for group, state in self.groups.items():
+            subgroup = tuple(group[position] for position in positions)
+            target = result.groups.get(subgroup)
+            if target is None:
+                result.groups[subgroup] = list(state)
+            else:
+                for position, value in enumerate(state):
+                    target[position] += value
+        return result
+
+    def __len__(self):
+        return len(self.groups)
+
+    def results(self):
+        """
+        Retorna os grupos na ordem em que apareceram, no mesmo formato de InsightsTable.group_by(): dicionários com
+        'platform', 'account' (None quando não fazem parte do grupo), 'count' e as métricas, somadas ou com a média
+        calculada apenas sobre os valores existentes.
+        """
+        results = []
+        for group, state in self.groups.items():
+            summary = {key: None for key in GROUP_KEYS}
+            summary.update(zip(self.keys, group))
+            summary['count'] = state[0]
+            for position, column in enumerate(METRIC_COLUMNS, start=1):
+                value = state[position]
+                if column in MEAN_COLUMNS:
+                    present = state[position + len(METRIC_COLUMNS)]
+                    value = value / present if present else 0.0
+                summary[column] = value
+            results.append(summary)
+        return results
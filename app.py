@@ -18,35 +18,172 @@ Então foi pensando que deviria ser criado quatro tipos principais de relatório
    
 3. `/<plataforma>`: Retorna os dados dos anúncios específicos de cada uma plataforma solicitada.
    
-4. `/<plataforma>/resumo`: Similar ao endpoint anterior, mas retorna um resumo dos dados agregados por plataforma.
+4. `/<plataforma>/resumo`: Similar ao endpoint anterior, mas retorna um resumo dos dados agregados por conta.
 
-Para obter os dados de cada das plataformas, o servidor utiliza funções auxiliares (`fetch_platforms`, `fetch_accounts_and_fields` 
-e `fetch_insights`) para realizar as requisições à API externa e processar os dados conforme necessário. 
+Para obter os dados de cada das plataformas, o servidor utiliza funções auxiliares (`get_platforms`, `get_accounts_and_fields` 
+e `fetch_insights`) para realizar as requisições à API externa e processar os dados conforme necessário. Plataformas, contas
+e campos mudam raramente, então ficam em cache na memória e as rotas só esperam pela API para buscar os insights. 
 """
-from flask import Flask, Response
-from view import fetch_platforms, fetch_accounts_and_fields, fetch_insights, main
-from collections import defaultdict
+import hashlib
+import logging
+import time
+from datetime import datetime, timezone
+from flask import Flask, Response, request, jsonify, g
+from werkzeug.http import is_resource_modified
+from view import (get_platforms, get_platform_by_slug, get_accounts_and_fields, fetch_all_accounts_and_fields,
+                  iter_insights, iter_all_insights, collect_insights_within, platform_fields, union_columns,
+                  platform_slug, account_flight, main)
+from reports import REPORT_HEADERS, REPORT_COLUMNS, ALL_COLUMNS, summary_row, parse_columns, report_headers, covered_by
+from formats import MIMETYPES, parse_format, report_chunks, render_report
+from ordering import CURSOR_HEADER, parse_selection, select_rows
+from aggregate import GroupAggregator, parse_group
+from snapshots import get_snapshot
+from client import client
+from scheduler import scheduler
+from metrics import registry, route_latency, partial_responses, not_modified
+from config import LOG_LEVEL, PROFILING_ENABLED, GERAL_DEADLINE, COMPRESSION_MIN_SIZE
+from content_encoding import ENCODINGS, compress, iter_compressed, cached_encoded, cached_page
+from shared_cache import shared_cache
+import profiling
+from profiling import phase, timed_iter
+from itertools import chain
 """
 Bibliotecas Importadas:
 
 1. **Flask**: Framework web utilizado para criar o servidor local e expor os endpoints da API.
    - `Flask`: Classe principal para criação da aplicação web.
    - `Response`: Usado para retornar respostas personalizadas, como os arquivos CSV gerados.
+   - `request`: Usado para ler os parâmetros da URL, como o `?group=` dos resumos.
+   - `jsonify`: Usado para retornar os contadores internos na rota '/status'.
+   - `g`: Guarda o instante de início de cada requisição, usado na métrica de tempo por rota.
 
 2. **view**: Arquivo local contendo funções auxiliares que fazem as requisições à API externa para buscar dados sobre as plataformas,
     contas e insights. As funções importadas deste arquivo são:
-   - `fetch_platforms()`: Recupera as plataformas disponíveis na API.
-   - `fetch_accounts_and_fields()`: Recupera as contas e os campos associados a cada uma das plataformas específicas.
-   - `fetch_insights()`: Recupera os dados de insights de anúncios de uma plataforma ou conta específica.
+   - `get_platforms()`: Recupera as plataformas disponíveis na API, guardadas em cache.
+   - `get_platform_by_slug()`: Encontra a plataforma pelo nome usado na URL, a partir de um índice em cache.
+   - `get_accounts_and_fields()`: Recupera as contas e os campos associados a cada uma das plataformas específicas,
+    guardados em cache.
+   - `iter_insights()`: Gera os dados de insights de anúncios de uma plataforma específica à medida que chegam.
+   - `iter_all_insights()`: Gera os insights de todas as contas de várias plataformas, com as requisições feitas em paralelo.
+   - `collect_insights_within()`: Coleta os insights de todas as plataformas respeitando um prazo, informando as
+    plataformas que ficaram de fora.
+   - `fetch_all_accounts_and_fields()`, `platform_fields()` e `union_columns()`: Retornam os campos de uma plataforma
+    ou a união dos campos de todas elas, usados como colunas com `?columns=all`.
+   - `platform_slug()`: Retorna o nome da plataforma no formato usado nas URLs.
    - `main()`: Função principal (presumivelmente usada para iniciar algum processo dentro do projeto, como a configuração ou inicialização 
     de algo).
    
-3. **collections**:
-   - `defaultdict`: Usado para criar um dicionário com valores padrão para casos em que uma chave não existe ainda. É especialmente útil 
-    para o agrupamento e soma de dados nos relatórios.
+3. **reports** e **formats**: Arquivos locais com os cabeçalhos dos relatórios (`REPORT_HEADERS`) e a formatação das
+    linhas de resumo (`summary_row`). O formato da resposta (CSV, NDJSON ou Arrow) é escolhido por `parse_format`, a partir
+    do `?format=` ou do cabeçalho `Accept`, e gerado em pedaços (`report_chunks`) ou inteiro (`render_report`), com o tipo
+    de conteúdo de `MIMETYPES`. `parse_columns` interpreta o parâmetro `?columns=`, `report_headers` monta os
+    cabeçalhos das colunas pedidas e `covered_by` indica se elas existem nos snapshots.
+
+4. **ordering**: Arquivo local que interpreta `?sort=`, `?top=`, `?limit=` e `?after=` (`parse_selection`) e seleciona
+    as linhas pedidas: com um heap nas linhas que chegam da API (`select_rows`) e com os índices ordenados dos
+    snapshots nos relatórios prontos. O cursor da próxima página vai no cabeçalho `CURSOR_HEADER`.
+
+5. **aggregate**: Arquivo local com o `GroupAggregator`, que agrega as linhas dos resumos em uma única passagem, e o
+    `parse_group`, que interpreta o parâmetro `?group=`.
+
+6. **snapshots**: Arquivo local que mantém os relatórios prontos em memória, atualizados em segundo plano. A função
+    `get_snapshot()` retorna o conjunto atual de relatórios, ou None enquanto ele ainda não existe.
+
+7. **client** e **scheduler**: Cliente HTTP compartilhado, de onde vêm os contadores de requisições juntadas exibidos em
+    '/status' (junto com o `account_flight` de view.py), e o agendador de requisições, cuja taxa atual e fila também
+    aparecem em '/status'.
+
+8. **metrics** e **config**: o `registry` com todas as métricas, exposto em '/metrics', o histograma `route_latency`
+    do tempo de cada rota, os contadores `partial_responses` de relatórios incompletos e `not_modified` de respostas
+    304, e o `LOG_LEVEL`, nível das mensagens de log. `PROFILING_ENABLED` permite perfilar requisições,
+    `GERAL_DEADLINE` é o prazo de '/geral' e `COMPRESSION_MIN_SIZE` o tamanho mínimo das respostas comprimidas.
+
+9. **itertools**:
+   - `chain`: Usado para recolocar a primeira linha, já lida para verificar se existem dados, no início do relatório.
+
+10. **logging** e **time**: registram as mensagens das rotas, configuram o nível das mensagens de log e medem o tempo
+    de resposta de cada rota.
+
+11. **profiling**: Perfil opcional de uma requisição (`X-Profile: 1` ou `?profile=1`). `phase` e `timed_iter` marcam
+    as fases de agregação, montagem do CSV e espera pelas buscas em paralelo.
+
+12. **content_encoding**, **hashlib**, **datetime** e **werkzeug**: compressão das respostas (`ENCODINGS`, `compress`,
+    `iter_compressed`) e o cache dos relatórios já comprimidos (`cached_encoded`); `hashlib` calcula o ETag dos
+    relatórios prontos, `datetime` monta o cabeçalho `Last-Modified` e `is_resource_modified` compara os dois com os
+    cabeçalhos `If-None-Match` e `If-Modified-Since` da requisição.
+
+13. **shared_cache**: cache compartilhado entre os processos do servidor, cujos contadores aparecem em '/status'.
 """
 app = Flask(__name__)
 
+logger = logging.getLogger(__name__)
+"""
+Mensagens das rotas, como a plataforma consultada na API quando ela não está no snapshot.
+"""
+
+
+@app.before_request
+def start_timer():
+    """
+    Guarda o instante de início da requisição.
+    """
+    g.start_time = time.perf_counter()
+    if PROFILING_ENABLED and (request.headers.get('X-Profile') == '1' or request.args.get('profile') == '1'):
+        g.profile = profiling.start(request.path)
+
+
+@app.after_request
+def record_route_latency(response):
+    """
+    Registra o tempo da requisição no histograma da rota (o padrão da URL, como '/<plataforma>', e não o caminho
+    pedido). A medição é feita quando a resposta é fechada, então inclui o envio dos relatórios enviados em pedaços.
+    """
+    start = g.get('start_time')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'desconhecida'
+        status = response.status_code
+        response.call_on_close(lambda: route_latency.observe(time.perf_counter() - start, route=route, status=status))
+    profile = g.get('profile')
+    if profile is not None:
+        request_profile, _, profiler = profile
+        response.headers['X-Profile-Id'] = str(request_profile.id)
+        response.call_on_close(lambda: profiling.finish(request_profile, profiler))
+    return response
+
+
+@app.after_request
+def compress_response(response):
+    """
+    Comprime, no formato aceito pelo cliente (`Accept-Encoding`), as respostas que ainda não foram comprimidas: os
+    relatórios enviados em pedaços são comprimidos pedaço a pedaço e as demais respostas, a partir de
+    `COMPRESSION_MIN_SIZE` bytes, inteiras. Os relatórios prontos já chegam aqui comprimidos (ver cached_report()).
+    """
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiated_encoding()
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = iter_compressed(response.response, encoding)
+    elif response.content_length is not None and response.content_length >= COMPRESSION_MIN_SIZE:
+        response.set_data(compress(response.get_data(), encoding))
+    else:
+        return response
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+@app.teardown_request
+def reset_profile(error=None):
+    """
+    Desfaz o perfil atual ao final da requisição. O corpo enviado em pedaços continua sendo medido, pois os geradores
+    guardam o perfil ao serem criados, e o perfil só é encerrado quando a resposta é fechada.
+    """
+    profile = g.pop('profile', None)
+    if profile is not None:
+        profiling.reset(profile[1])
+
 @app.route('/')
 def home():
     """
@@ -64,48 +201,282 @@ def home():
     '''
 
 
+def stream_report(rows, headers=REPORT_HEADERS, report_format='csv', selection=None):
+    """
+    Cria a resposta com o relatório no formato `report_format` enviado em pedaços à medida que as linhas são geradas.
+    Retorna None caso não exista nenhuma linha, para que a rota possa responder com a mensagem de erro adequada
+    (depois de começar a enviar o corpo não é mais possível alterar o status da resposta).
+    Com `selection` (ver ordering.py), apenas as linhas pedidas são guardadas enquanto as linhas chegam e a resposta é
+    montada no final, com o cursor da próxima página. Uma página vazia depois de um cursor (`?after=`) não é um erro e
+    é respondida apenas com o cabeçalho do relatório.
+    """
+    if selection is not None:
+        rows, next_cursor = select_rows(rows, selection)
+        if not rows and selection.after is None:
+            return None
+        with phase('serialize'):
+            response = Response(render_report(rows, headers, report_format), mimetype=MIMETYPES[report_format])
+        response.vary.add('Accept')
+        return with_cursor(response, next_cursor)
+
+    rows = iter(rows)
+    first_row = next(rows, None)
+    if first_row is None:
+        return None
+    chunks = report_chunks(chain([first_row], rows), headers, report_format)
+    response = Response(timed_iter('serialize', chunks), mimetype=MIMETYPES[report_format])
+    response.vary.add('Accept')
+    return response
+
+
+def with_cursor(response, next_cursor):
+    """
+    Informa no cabeçalho `X-Next-Cursor` o cursor da próxima página, quando existe.
+    """
+    if next_cursor is not None:
+        response.headers[CURSOR_HEADER] = next_cursor
+    return response
+
+
+def requested_selection(columns):
+    """
+    Ordenação e paginação pedidas pelo cliente (ver ordering.parse_selection()). `?sort=` é validado contra as colunas
+    do relatório; com `?columns=all` elas só são conhecidas depois de consultar a API, então qualquer coluna é aceita.
+    Lança `ValueError` se algum parâmetro for inválido.
+    """
+    return parse_selection(request.args, None if columns == ALL_COLUMNS else report_headers(columns))
+
+
+def requested_format():
+    """
+    Formato do relatório pedido pelo cliente, pelo parâmetro `?format=` ou pelo cabeçalho `Accept` (ver
+    formats.parse_format()). Lança `ValueError` se o formato for inválido.
+    """
+    return parse_format(request.args.get('format'), request.accept_mimetypes)
+
+
+@app.route('/status')
+def status():
+    """
+    Função que lida com a rota '/status', retornando em JSON os contadores internos do servidor, para acompanhar a
+    economia de requisições sob carga:
+        - `single_flight`: requisições à API executadas (`leaders`), requisições idênticas que aproveitaram uma já em
+          andamento (`coalesced`) e quantas estão em andamento agora (`in_flight`).
+        - `account_flight`: os mesmos contadores para as buscas de insights de cada conta, que juntam também as
+          tarefas que ainda estão na fila.
+        - `scheduler`: a taxa de requisições por segundo liberada pelo agendador (None enquanto não houver limite),
+          quantas respostas 429 foram recebidas e quantas requisições esperam em cada prioridade.
+        - `shared_cache`: as consultas deste processo ao cache compartilhado entre os processos (None quando ele não
+          está configurado).
+    """
+    return jsonify({
+        "single_flight": client.single_flight.stats(),
+        "account_flight": account_flight.stats(),
+        "scheduler": scheduler.stats(),
+        "shared_cache": shared_cache.stats() if shared_cache is not None else None
+    })
+
+
+@app.route('/metrics')
+def metrics():
+    """
+    Função que lida com a rota '/metrics', retornando as métricas do servidor no formato de texto do Prometheus:
+        - tempo de cada requisição à API externa, por endpoint (platforms, accounts, fields e insights);
+        - tempo de resposta de cada rota;
+        - bytes e itens recebidos da API, erros e novas tentativas;
+        - consultas ao cache (acertos, valores vencidos e faltas) e buscas juntadas pelo single-flight.
+    """
+    return Response(registry.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route('/profiles')
+def profiles():
+    """
+    Função que lida com a rota '/profiles', listando os últimos perfis guardados (id, caminho, tempo total e tempo de
+    cada fase). Disponível apenas com `STRACT_PROFILING_ENABLED=1`.
+    """
+    if not PROFILING_ENABLED:
+        return "Perfil de requisições desativado.", 404
+    return jsonify(profiling.recent_profiles())
+
+
+@app.route('/profiles/<int:profile_id>')
+def profile_detail(profile_id):
+    """
+    Função que lida com a rota '/profiles/<id>', retornando o perfil de uma requisição: o tempo de cada fase (fetch,
+    parse, aggregate, serialize e wait) e as funções que mais gastaram tempo.
+    """
+    if not PROFILING_ENABLED:
+        return "Perfil de requisições desativado.", 404
+    request_profile = profiling.get_profile(profile_id)
+    if request_profile is None:
+        return f"Perfil {profile_id} não encontrado.", 404
+    return jsonify(request_profile.report())
+
+
+def insights_within_deadline(route, columns=REPORT_COLUMNS):
+    """
+    Coleta os insights de todas as plataformas dentro do prazo `GERAL_DEADLINE`, apenas com as colunas `columns`.
+    Retorna (linhas, plataformas ausentes, colunas) e conta o relatório como incompleto se alguma plataforma ficou de
+    fora.
+    """
+    with phase('wait'):
+        rows, missing, columns = collect_insights_within(get_platforms(), GERAL_DEADLINE, columns)
+    if missing:
+        partial_responses.inc(route=route)
+    return rows, missing, columns
+
+
+def mark_missing(response, missing):
+    """
+    Informa no cabeçalho `X-Missing-Platforms` as plataformas deixadas de fora do relatório.
+    """
+    if missing:
+        response.headers['X-Missing-Platforms'] = ','.join(missing)
+    return response
+
+
+def negotiated_encoding():
+    """
+    Formato de compressão escolhido a partir do cabeçalho `Accept-Encoding`, ou None para responder sem compressão.
+    """
+    return request.accept_encodings.best_match(ENCODINGS)
+
+
+def report_etag(digest, report_format, encoding):
+    """
+    ETag de um relatório pronto. Combina o hash dos dados do snapshot (ou da plataforma), a rota com os parâmetros
+    (exceto `profile`), o formato e a compressão, de forma que cada representação do relatório tenha o seu.
+    Com o arquivo do snapshot configurado, todos os processos (inclusive o que atualiza) servem o snapshot lido do
+    mesmo arquivo (ver SnapshotRefresher.refresh()), então o mesmo hash identifica o mesmo corpo em qualquer um deles.
+    """
+    args = sorted((key, value) for key, value in request.args.items(multi=True) if key != 'profile')
+    variant = f"{digest}|{request.path}|{args}|{report_format}|{encoding or 'identity'}"
+    return hashlib.sha1(variant.encode('utf-8')).hexdigest()
+
+
+def encode_report(body, encoding):
+    """
+    Converte o relatório em bytes (se for texto) e o comprime em `encoding`, exceto quando ele tem menos de
+    `COMPRESSION_MIN_SIZE` bytes. Retorna (corpo, compressão usada ou None).
+    """
+    data = body.encode('utf-8') if isinstance(body, str) else body
+    if encoding is None or len(data) < COMPRESSION_MIN_SIZE:
+        return data, None
+    return compress(data, encoding), encoding
+
+
+def cached_report(source, build, report_format='csv', cache=cached_encoded):
+    """
+    Responde com um relatório montado a partir do snapshot. `source` é o snapshot ou o relatório da plataforma usado
+    (com `digest` e `modified_at`) e `build` monta o relatório no formato `report_format`.
+    Se o cliente já tem essa versão (`If-None-Match` com o mesmo ETag ou `If-Modified-Since` posterior aos dados), a
+    resposta é 304, sem montar nem enviar o corpo. Caso contrário, o corpo comprimido no formato aceito pelo cliente vem
+    do cache (`cache`: content_encoding.cached_encoded() ou, nas páginas, cached_page()), e só é montado e comprimido
+    (ver encode_report()) na primeira vez em que a versão é pedida (nos relatórios inteiros, em qualquer um dos
+    processos).
+    """
+    encoding = negotiated_encoding()
+    etag = report_etag(source.digest, report_format, encoding)
+    last_modified = datetime.fromtimestamp(int(source.modified_at), timezone.utc)
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        not_modified.inc(route=request.url_rule.rule)
+        response = Response(status=304)
+    else:
+        body, body_encoding = cache(etag, lambda: encode_report(build(), encoding))
+        response = Response(body, mimetype=MIMETYPES[report_format])
+        if body_encoding is not None:
+            response.headers['Content-Encoding'] = body_encoding
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    response.vary.update(('Accept', 'Accept-Encoding'))
+    return response
+
+
+def page_report(source, page, headers, report_format):
+    """
+    Responde, como cached_report(), com a página (linhas, cursor da próxima página) selecionada de um relatório pronto.
+    A página fica no cache de páginas, para não descartar os relatórios inteiros do cache principal.
+    """
+    rows, next_cursor = page
+    return with_cursor(
+        cached_report(source, lambda: render_report(rows, headers, report_format), report_format, cache=cached_page),
+        next_cursor)
+
+
+def platform_report(platform_value):
+    """
+    Retorna os relatórios prontos da plataforma no snapshot atual, ou None se não houver snapshot ou se a plataforma
+    não estiver nele (nesse caso a rota consulta a API diretamente).
+    """
+    snapshot = get_snapshot()
+    if snapshot is None:
+        return None
+    return snapshot.platform_reports.get(platform_value)
+
+
 @app.route('/geral')
 def geral():
     """
     Função que lida com a rota '/geral', gerando um relatório completo de todas as plataformas de anúncios. 
     Para cada plataforma, são obtidos os dados de contas e insights, e esses dados são formatados separado por vírgulas, 
     que é retornado como resposta. O relatório inclui informações como cliques, impressões, gasto, CPC e CTR.
+    Quando existe um snapshot (ver snapshots.py), o relatório já pronto em memória é retornado. Caso contrário, a API
+    é consultada e as linhas são enviadas ao cliente à medida que os insights de cada conta chegam. Com o prazo
+    `GERAL_DEADLINE` configurado, as plataformas que não responderem a tempo ficam de fora e são listadas no cabeçalho
+    `X-Missing-Platforms`, de forma que uma plataforma lenta não atrase o relatório inteiro; como o cabeçalho vai antes
+    do corpo, nesse caso o relatório só começa a ser enviado quando todas as plataformas terminam ou o prazo acaba.
+    O parâmetro `?columns=` escolhe as colunas de insights (por exemplo `?columns=clicks,spend`), e apenas esses campos
+    são pedidos à API. Com `?columns=all`, o relatório tem a união dos campos de todas as plataformas, com 'N/A' nas
+    colunas que uma plataforma não tem. Colunas que não estão no snapshot são buscadas na API.
+    Os relatórios montados a partir do snapshot têm `ETag` e `Last-Modified` e são respondidos com 304 quando os dados
+    não mudaram desde a última consulta do cliente (ver cached_report()).
+    O parâmetro `?format=` (ou o cabeçalho `Accept`) escolhe o formato: `csv` (padrão), `ndjson` ou `arrow`.
+    `?sort=coluna` (ou `-coluna`, decrescente) ordena as linhas, `?top=N` retorna as N primeiras nessa ordem e
+    `?limit=N` retorna uma página de N linhas, com o cursor da próxima (`?after=`) no cabeçalho `X-Next-Cursor` (ver
+    ordering.py). A partir do snapshot, as páginas saem de um índice ordenado, sem percorrer o relatório inteiro.
     Retorna:
         - Um relatorio separado por vírgulas, gerado com os dados de todas as plataformas.
+        - Caso alguma coluna, o formato ou a ordenação/paginação seja inválido, retorna uma mensagem de erro com
+          status 400.
         - Caso não haja dados, retorna uma mensagem de erro "Sem dados disponíveis".
     """
-    platforms = fetch_platforms()
-    all_insights_data = []
-
-    for platform in platforms:
-        platform_value = platform['value']
-        print(f"Processando plataforma: {platform_value}")
-        
-        platform_data = fetch_accounts_and_fields(platform_value)
-        
-        if platform_data:
-            insights_data = fetch_insights(platform_data)
-            all_insights_data.extend(insights_data)
-
-    if not all_insights_data:
+    try:
+        columns = parse_columns(request.args.get('columns'))
+        report_format = requested_format()
+        selection = requested_selection(columns)
+    except ValueError as error:
+        return str(error), 400
+
+    snapshot = get_snapshot()
+    if snapshot is not None and covered_by(columns):
+        if not snapshot.row_count:
+            return "Sem dados disponíveis", 404
+        if selection is not None:
+            return page_report(snapshot, snapshot.row_index.select(selection), report_headers(columns), report_format)
+        if columns == REPORT_COLUMNS and report_format == 'csv':
+            return cached_report(snapshot, lambda: snapshot.geral_csv)
+        return cached_report(
+            snapshot, lambda: render_report(snapshot.rows(), report_headers(columns), report_format), report_format)
+
+    if GERAL_DEADLINE > 0:
+        rows, missing, columns = insights_within_deadline('/geral', columns)
+        response = stream_report(rows, report_headers(columns), report_format, selection)
+        if response is None:
+            return mark_missing(Response("Sem dados disponíveis", 404), missing)
+        return mark_missing(response, missing)
+
+    platforms = get_platforms()
+    if columns == ALL_COLUMNS:
+        columns = union_columns(fetch_all_accounts_and_fields(platforms))
+    response = stream_report(
+        timed_iter('wait', iter_all_insights(platforms, columns)), report_headers(columns), report_format, selection)
+
+    if response is None:
         return "Sem dados disponíveis", 404
 
-    headers = ['Platform', 'Ad Name', 'clicks', 'impressions', 'spend', 'cpc', 'ctr']
-    csv_data = ",".join(headers) + "\n"
-    
-    for insight in all_insights_data:
-        row = [
-            insight.get("Platform", ""),
-            insight.get("Ad Name", ""),
-            str(insight.get("clicks", "")),
-            str(insight.get("impressions", "")),
-            str(insight.get("spend", "")),
-            str(insight.get("cpc", "")),
-            str(insight.get("ctr", ""))
-        ]
-        csv_data += ",".join(row) + "\n"
-    
-    return Response(csv_data, mimetype="text/plain")
+    return response
 
 
 @app.route('/geral/resumo')
@@ -113,86 +484,57 @@ def geral_resumo():
     """
     Função que lida com a rota '/geral/resumo', gerando um resumo agregado de dados de todas as plataformas. 
     Os dados são agrupados por plataforma e as métricas numéricas (como cliques, impressões e gasto) são somadas. 
-    Além disso, a média de CPC e CTR é calculada.
+    Além disso, a média de CPC e CTR é calculada, considerando apenas os anúncios em que o valor existe.
+    O agrupamento pode ser alterado pelo parâmetro `?group=` (platform, account, platform,account ou total).
+    Quando existe um snapshot, o resumo é montado a partir dos resumos parciais guardados (o agrupamento padrão já fica
+    pronto). Caso contrário, os insights são coletados com o mesmo prazo de '/geral' (ou, sem prazo, agregados à
+    medida que chegam, guardando apenas os totais de cada grupo).
+    O parâmetro `?columns=` escolhe as métricas do resumo, entre as colunas padrão, e apenas elas são pedidas à API.
+    O formato é escolhido por `?format=` ou pelo `Accept`, e as linhas podem ser ordenadas e paginadas com `?sort=`,
+    `?top=`, `?limit=` e `?after=`, como em '/geral'.
     Retorna:
         - Um relatorio separado por vírgulas, gerado com os dados agregados por plataforma.
+        - Caso o agrupamento, alguma coluna, o formato ou a ordenação/paginação seja inválido, retorna uma mensagem de
+          erro com status 400.
         - Caso não haja dados, retorna uma mensagem de erro "Sem dados disponíveis".
     """
-    platforms = fetch_platforms()
-    all_insights_data = []
-
-    for platform in platforms:
-        platform_value = platform['value']
-        print(f"Processando plataforma: {platform_value}")
-        
-        platform_data = fetch_accounts_and_fields(platform_value)
-        
-        if platform_data:
-            insights_data = fetch_insights(platform_data)
-            all_insights_data.extend(insights_data)
-
-    if not all_insights_data:
-        return "Sem dados disponíveis", 404
-    
-    platform_summary = defaultdict(lambda: {
-        'clicks': 0,
-        'impressions': 0,
-        'spend': 0.0,
-        'cpc': 0.0,
-        'ctr': 0.0,
-        'count': 0
-    })
-
-
-    def safe_float(value):
-        """
-        Foi percebido que alguns valores possuiam casas decimais então foi pensando em uma função para converter os dados
-        caso fosse necessario somar.
-        Função para garantir que um valor seja convertido para float, se possível.
-        """
-        try:
-            return float(value) if value not in ['N/A', ''] else 0.0
-        except ValueError:
-            return 0.0
-
-    for insight in all_insights_data:
-        platform = insight.get("Platform", "")
-        platform_summary[platform]['clicks'] += insight.get("clicks", 0)
-        platform_summary[platform]['impressions'] += insight.get("impressions", 0)
-        
-        spend = insight.get("spend", "0.0")
-        platform_summary[platform]['spend'] += safe_float(spend)
-        
-        cpc = insight.get("cpc", "0.0")
-        ctr = insight.get("ctr", "0.0")
-        
-        platform_summary[platform]['cpc'] += safe_float(cpc)
-        platform_summary[platform]['ctr'] += safe_float(ctr)
-        
-        platform_summary[platform]['count'] += 1
-
-    headers = ['Platform', 'Ad Name', 'clicks', 'impressions', 'spend', 'cpc', 'ctr']
-    csv_data = ",".join(headers) + "\n"
-
-    for platform, data in platform_summary.items():
-        avg_cpc = data['cpc'] / data['count'] if data['count'] > 0 else 0
-        avg_ctr = data['ctr'] / data['count'] if data['count'] > 0 else 0
-
-        def format_float(value):
-            return f"{value:.2f}" if value != int(value) else str(int(value))
-        
-        row = [
-            platform,
-            str(data['count']),
-            str(data['clicks']),
-            str(data['impressions']),
-            format_float(data['spend']),
-            format_float(avg_cpc),
-            format_float(avg_ctr)
-        ]
-        csv_data += ",".join(row) + "\n"
-
-    return Response(csv_data, mimetype="text/plain")
+    try:
+        keys = parse_group(request.args.get('group'), ('platform',))
+        columns = parse_columns(request.args.get('columns'), REPORT_COLUMNS)
+        report_format = requested_format()
+        selection = requested_selection(columns)
+    except ValueError as error:
+        return str(error), 400
+    headers = report_headers(columns)
+
+    snapshot = get_snapshot()
+    if snapshot is not None:
+        if not snapshot.row_count:
+            return "Sem dados disponíveis", 404
+        if selection is not None:
+            return page_report(snapshot, select_rows(snapshot.summary_rows(keys), selection), headers, report_format)
+        if keys == ('platform',) and columns == REPORT_COLUMNS and report_format == 'csv':
+            return cached_report(snapshot, lambda: snapshot.geral_resumo_csv)
+        return cached_report(
+            snapshot, lambda: render_report(snapshot.summary_rows(keys), headers, report_format), report_format)
+
+    aggregator = GroupAggregator(keys)
+    missing = []
+
+    if GERAL_DEADLINE > 0:
+        rows, missing, _ = insights_within_deadline('/geral/resumo', columns)
+        with phase('aggregate'):
+            aggregator.update(rows)
+    else:
+        platforms = get_platforms()
+        with phase('aggregate'):
+            aggregator.update(timed_iter('wait', iter_all_insights(platforms, columns)))
+
+    if not len(aggregator):
+        return mark_missing(Response("Sem dados disponíveis", 404), missing)
+
+    summaries = (summary_row(summary) for summary in aggregator.results())
+    return mark_missing(stream_report(summaries, headers, report_format, selection), missing)
 
 
 @app.route('/<plataforma>')
@@ -200,136 +542,117 @@ def plataforma_data(plataforma):
     """
     Função que lida com a rota '/<plataforma>', onde o parâmetro `<plataforma>` representa o nome da plataforma 
     de anúncios solicitada. A função retorna um relatório de dados sobre os anúncios veiculados 
-    na plataforma especificada.
+    na plataforma especificada. Quando a plataforma está no snapshot, o relatório já pronto é retornado; caso contrário
+    ele é enviado ao cliente à medida que os insights de cada conta chegam.
+    O parâmetro `?columns=` escolhe as colunas de insights, como em '/geral'; com `?columns=all` o relatório tem todos
+    os campos da plataforma. O formato (`?format=`), a ordenação e a paginação (`?sort=`, `?top=`, `?limit=` e
+    `?after=`) funcionam como em '/geral'.
     Retorna:
         - Um relatorio separado por vírgulas, com dados da plataforma solicitada.
+        - Caso alguma coluna, o formato ou a ordenação/paginação seja inválido, retorna uma mensagem de erro com
+          status 400.
         - Caso a plataforma não seja encontrada ou não tenha dados, retorna uma mensagem de erro apropriada.
     """
-    platforms = fetch_platforms()
-    
-    platform_found = None
-    for platform in platforms:
-
-        if platform['text'].replace(" ", "_").lower() == plataforma.lower():
-            platform_found = platform
-            break
+    try:
+        columns = parse_columns(request.args.get('columns'))
+        report_format = requested_format()
+        selection = requested_selection(columns)
+    except ValueError as error:
+        return str(error), 400
+
+    platform_found = get_platform_by_slug(plataforma)
     
     if not platform_found:
         return f"Plataforma '{plataforma}' não encontrada.", 404
     
     platform_value = platform_found['value']
-    print(f"Processando plataforma: {platform_value}")
+    report = platform_report(platform_value) if covered_by(columns) else None
+    if report is not None:
+        if not report.row_count:
+            return f"Sem dados de insights para a plataforma {plataforma}.", 404
+        if selection is not None:
+            return page_report(report, report.row_index.select(selection), report_headers(columns), report_format)
+        if columns == REPORT_COLUMNS and report_format == 'csv':
+            return cached_report(report, lambda: report.csv)
+        return cached_report(
+            report, lambda: render_report(report.rows, report_headers(columns), report_format), report_format)
+
+    logger.info("Processando plataforma: %s", platform_value)
     
-    platform_data = fetch_accounts_and_fields(platform_value)
+    platform_data = get_accounts_and_fields(platform_value)
     
     if not platform_data:
         return f"Sem dados disponíveis para a plataforma {plataforma}.", 404
 
-    all_insights_data = []
-    insights_data = fetch_insights(platform_data)
-    all_insights_data.extend(insights_data)
+    if columns == ALL_COLUMNS:
+        columns = tuple(platform_fields(platform_data))
+    response = stream_report(
+        timed_iter('wait', iter_insights(platform_data, columns)), report_headers(columns), report_format, selection)
 
-    if not all_insights_data:
+    if response is None:
         return f"Sem dados de insights para a plataforma {plataforma}.", 404
     
-    headers = ['Platform', 'Ad Name', 'clicks', 'impressions', 'spend', 'cpc', 'ctr']
-    csv_data = ",".join(headers) + "\n"
-    
-    for insight in all_insights_data:
-        row = [
-            insight.get("Platform", ""),
-            insight.get("Ad Name", ""),
-            str(insight.get("clicks", "")),
-            str(insight.get("impressions", "")),
-            str(insight.get("spend", "")),
-            str(insight.get("cpc", "")),
-            str(insight.get("ctr", ""))
-        ]
-        csv_data += ",".join(row) + "\n"
-    
-    return Response(csv_data, mimetype="text/plain")
+    return response
 
 
 @app.route('/<plataforma>/resumo')
 def plataforma_resumo(plataforma):
     """
     Função que lida com a rota '/<plataforma>/resumo', onde o parâmetro `<plataforma>` representa o nome da plataforma 
-    de anúncios solicitada. Retorna um resumo agregado dos dados de anúncios da plataforma especificada, somando os valores 
-    de métricas como cliques, impressões, gasto, CPC e CTR, além de calcular as médias de CPC e CTR.
+    de anúncios solicitada. Retorna um resumo agregado dos dados de anúncios da plataforma especificada, com uma linha
+    por conta, somando os valores de métricas como cliques, impressões e gasto, além de calcular as médias de CPC e CTR.
+    O agrupamento pode ser alterado pelo parâmetro `?group=` (account, total, ...), como em '/geral/resumo'.
+    Quando a plataforma está no snapshot, o resumo é montado a partir do resumo parcial guardado.
+    Os parâmetros `?columns=`, `?format=`, `?sort=`, `?top=`, `?limit=` e `?after=` funcionam como em '/geral/resumo'.
     Retorna:
-        - Um relatorio separado por vírgulas, com os dados agregados por plataforma.
+        - Um relatorio separado por vírgulas, com os dados agregados por conta.
+        - Caso o agrupamento, alguma coluna, o formato ou a ordenação/paginação seja inválido, retorna uma mensagem de
+          erro com status 400.
         - Caso a plataforma não seja encontrada ou não tenha dados, retorna uma mensagem de erro apropriada.
     """
-    platforms = fetch_platforms()
-    
-    platform_found = None
-    for platform in platforms:
-        if platform['text'].replace(" ", "_").lower() == plataforma.lower():
-            platform_found = platform
-            break
+    try:
+        keys = parse_group(request.args.get('group'), ('account',))
+        columns = parse_columns(request.args.get('columns'), REPORT_COLUMNS)
+        report_format = requested_format()
+        selection = requested_selection(columns)
+    except ValueError as error:
+        return str(error), 400
+    headers = report_headers(columns)
+
+    platform_found = get_platform_by_slug(plataforma)
     
     if not platform_found:
         return f"Plataforma '{plataforma}' não encontrada.", 404
     
     platform_value = platform_found['value']
-    print(f"Processando plataforma: {platform_value}")
+    report = platform_report(platform_value)
+    if report is not None:
+        if not report.row_count:
+            return f"Sem dados de insights para a plataforma {plataforma}.", 404
+        if selection is not None:
+            return page_report(report, select_rows(report.summary_rows(keys), selection), headers, report_format)
+        if keys == ('account',) and columns == REPORT_COLUMNS and report_format == 'csv':
+            return cached_report(report, lambda: report.resumo_csv)
+        return cached_report(
+            report, lambda: render_report(report.summary_rows(keys), headers, report_format), report_format)
+
+    aggregator = GroupAggregator(keys)
+    logger.info("Processando plataforma: %s", platform_value)
     
-    platform_data = fetch_accounts_and_fields(platform_value)
+    platform_data = get_accounts_and_fields(platform_value)
     
     if not platform_data:
         return f"Sem dados disponíveis para a plataforma {plataforma}.", 404
 
-    all_insights_data = []
-    insights_data = fetch_insights(platform_data)
-    all_insights_data.extend(insights_data)
+    with phase('aggregate'):
+        aggregator.update(timed_iter('wait', iter_insights(platform_data, columns)))
 
-    if not all_insights_data:
+    if not len(aggregator):
         return f"Sem dados de insights para a plataforma {plataforma}.", 404
-
-    platform_summary = {
-        'Platform': platform_value,
-        'Ad Name': 'Total',
-        'clicks': 0,
-        'impressions': 0,
-        'spend': 0.0,
-        'cpc': 0.0,
-        'ctr': 0.0
-    }
-    
-    for insight in all_insights_data:
-        platform_summary['clicks'] += int(insight.get("clicks", 0))
-        platform_summary['impressions'] += int(insight.get("impressions", 0))
-        spend = insight.get("spend", '0.0')
-        platform_summary['spend'] += float(spend if spend != 'N/A' else 0.0)
-        
-        cpc = insight.get("cpc", '0.0')
-        platform_summary['cpc'] += float(cpc if cpc != 'N/A' else 0.0)
-
-        ctr = insight.get("ctr", '0.0')
-        platform_summary['ctr'] += float(ctr if ctr != 'N/A' else 0.0)
-    
-    ad_count = len(all_insights_data)
-    if ad_count > 0:
-        platform_summary['cpc'] = round(platform_summary['cpc'] / ad_count, 3)
-        platform_summary['ctr'] = round(platform_summary['ctr'] / ad_count, 3)
     
-    headers = ['Platform', 'Ad Name', 'clicks', 'impressions', 'spend', 'cpc', 'ctr']
-    csv_data = ",".join(headers) + "\n"
-    
-    row = [
-        platform_summary['Platform'],
-        platform_summary['Ad Name'],
-        str(platform_summary['clicks']),
-        str(platform_summary['impressions']),
-        str(round(platform_summary['spend'], 2)),
-        str(platform_summary['cpc']),
-        str(platform_summary['ctr'])
-    ]
-    csv_data += ",".join(row) + "\n"
-    
-    return Response(csv_data, mimetype="text/plain")
+    summaries = (summary_row(summary, platform_value) for summary in aggregator.results())
+    return stream_report(summaries, headers, report_format, selection)
 
-app = Flask(__name__)
 
 def display_available_links():
     """
@@ -339,7 +662,7 @@ def display_available_links():
         - Exibe os links no console para as rotas '/geral', '/geral/resumo' e para cada plataforma disponível.
     """
     print("\n--- Links disponíveis para acesso ---")
-    platforms = fetch_platforms()
+    platforms = get_platforms()
     
     base_url = "http://127.0.0.1:5000"
     
@@ -349,7 +672,7 @@ def display_available_links():
     
     for platform in platforms:
         platform_value = platform['value']
-        platform_text = platform['text'].replace(" ", "_").lower()
+        platform_text = platform_slug(platform)
         print(f"Link para a plataforma {platform['text']}: {base_url}/{platform_text}")
         print(f"Link para o resumo da plataforma {platform['text']}: {base_url}/{platform_text}/resumo")
     
@@ -357,6 +680,7 @@ def display_available_links():
 
 
 if __name__ == '__main__':
+    logging.basicConfig(level=LOG_LEVEL)
     display_available_links()
     app.run(debug=True)
     main()
@@ -0,0 +1,211 @@
+"""
+Este arquivo tem o objetivo de medir o desempenho dos relatórios de ponta a ponta, sem depender da API real.
+
+Para cada quantidade de contas (por padrão 10, 100, 1.000 e 10.000), o script:
+
+1. Inicia a API simulada (stub_api.py) em outro processo, com a quantidade de contas, o tamanho de página, a latência e a
+   taxa de erros escolhidos.
+2. Aponta o cliente HTTP do servidor para ela e limpa os caches, para que cada rodada comece do zero.
+3. Faz requisições reais (HTTP) ao servidor Flask, rodando em uma thread deste processo, para as rotas `/geral`,
+   `/geral/resumo`, `/<plataforma>` e `/<plataforma>/resumo`, com a concorrência escolhida.
+4. Mede a latência (p50 e p99), a vazão (requisições por segundo) e o pico de memória alocada pelo servidor em uma
+   requisição de cada rota (medido com `tracemalloc`, que não inclui a API simulada por ela rodar em outro processo).
+
+Por padrão os relatórios guardados em memória (snapshots.py) ficam desativados, para medir o caminho que consulta a API;
+com `--snapshots` eles são ativados e cada rodada espera o primeiro snapshot ficar pronto antes de medir.
+
+Uso:
+    python benchmark/bench.py
+    python benchmark/bench.py --accounts 10 100 --latency 0.02 --repeat 20 --concurrency 4 --json resultado.json
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from werkzeug.serving import make_server
+"""
+As bibliotecas `argparse`, `json`, `os`, `subprocess` e `sys` leem as opções, gravam o resultado e iniciam a API simulada.
+A biblioteca `logging` silencia o registro de cada requisição feito pelo servidor de desenvolvimento.
+As bibliotecas `socket`, `threading` e `werkzeug.serving` reservam portas e servem o Flask em uma thread.
+As bibliotecas `time` e `tracemalloc` medem o tempo e a memória.
+O `ThreadPoolExecutor` e o `requests` fazem as requisições concorrentes ao servidor.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB = os.path.join(ROOT, "benchmark", "stub_api.py")
+PLATFORM_SLUG = "facebook_ads"
+ROUTES = ["/geral", "/geral/resumo", f"/{PLATFORM_SLUG}", f"/{PLATFORM_SLUG}/resumo"]
+
+
+def free_port():
+    """
+    Reserva uma porta livre da máquina local.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_stub(accounts, args):
+    """
+    Inicia a API simulada em outro processo e espera ela começar a responder. Retorna (processo, endereço).
+    """
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, STUB, "--port", str(port), "--accounts", str(accounts),
+        "--ads-per-account", str(args.ads_per_account), "--page-size", str(args.page_size),
+        "--latency", str(args.latency), "--jitter", str(args.jitter), "--error-rate", str(args.error_rate)
+    ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{base_url}/api", timeout=1)
+            return process, base_url
+        except requests.ConnectionError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("A API simulada não iniciou.")
+
+
+def start_server(flask_app):
+    """
+    Serve a aplicação Flask em uma thread, com uma thread por requisição. Retorna (servidor, endereço).
+    """
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    port = free_port()
+    server = make_server("127.0.0.1", port, flask_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{port}"
+
+
+def percentile(values, fraction):
+    """
+    Percentil de uma lista de valores, pelo método do valor mais próximo.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))
+    return ordered[index]
+
+
+def measure_latency(url, repeat, concurrency):
+    """
+    Faz `repeat` requisições a `url` com `concurrency` em paralelo e retorna as latências, o tempo total, o tamanho
+    da última resposta e a quantidade de respostas com erro.
+    """
+    session = requests.Session()
+
+    def timed_get(_):
+        start = time.perf_counter()
+        response = session.get(url)
+        body = response.content
+        return time.perf_counter() - start, len(body), response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(timed_get, range(repeat)))
+    wall_time = time.perf_counter() - start
+    latencies = [latency for latency, _, _ in results]
+    errors = sum(1 for _, _, status in results if status != 200)
+    return latencies, wall_time, results[-1][1], errors
+
+
+def measure_memory(flask_app, route):
+    """
+    Pico de memória, em bytes, alocada durante uma requisição à rota (feita direto pelo cliente de testes do Flask).
+    """
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    flask_app.test_client().get(route).get_data()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def reset_state(base_url, use_snapshots):
+    """
+    Aponta o servidor para a API simulada da rodada e limpa caches e relatórios guardados da rodada anterior.
+    """
+    import client
+    import snapshots
+    import view
+    client.client.base_url = base_url
+    view.metadata_cache.invalidate()
+    if use_snapshots:
+        snapshots.refresher.stop()
+        snapshots.refresher = snapshots.SnapshotRefresher(path="")
+        snapshots.refresher.start()
+        while snapshots.refresher.snapshot is None:
+            time.sleep(0.05)
+
+
+def run(args):
+    os.environ["STRACT_SNAPSHOT_INTERVAL"] = "60" if args.snapshots else "0"
+    os.environ["STRACT_SNAPSHOT_PATH"] = ""
+    sys.path.insert(0, ROOT)
+    import app
+
+    server, app_url = start_server(app.app)
+    results = []
+    print(f"{'contas':>7} {'rota':<24} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>8} {'pico MiB':>9} {'KiB':>8} {'erros':>6}")
+    try:
+        for accounts in args.accounts:
+            process, base_url = start_stub(accounts, args)
+            try:
+                reset_state(base_url, args.snapshots)
+                for route in ROUTES:
+                    requests.get(f"{app_url}{route}")
+                    latencies, wall_time, size, errors = measure_latency(f"{app_url}{route}", args.repeat,
+                                                                         args.concurrency)
+                    peak = measure_memory(app.app, route)
+                    result = {
+                        "accounts": accounts,
+                        "route": route,
+                        "p50_ms": percentile(latencies, 0.50) * 1000,
+                        "p99_ms": percentile(latencies, 0.99) * 1000,
+                        "throughput_rps": len(latencies) / wall_time,
+                        "peak_memory_mib": peak / 2 ** 20,
+                        "body_kib": size / 1024,
+                        "errors": errors
+                    }
+                    results.append(result)
+                    print(f"{accounts:>7} {route:<24} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+                          f"{result['throughput_rps']:>8.2f} {result['peak_memory_mib']:>9.2f} "
+                          f"{result['body_kib']:>8.1f} {errors:>6}")
+            finally:
+                process.kill()
+                process.wait()
+    finally:
+        server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de ponta a ponta das rotas de relatório.")
+    parser.add_argument("--accounts", type=int, nargs="+", default=[10, 100, 1000, 10000],
+                        help="quantidades de contas a testar")
+    parser.add_argument("--ads-per-account", type=int, default=10)
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.01, help="latência fixa da API simulada, em segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latência aleatória adicional, em segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração de respostas 503 da API simulada")
+    parser.add_argument("--repeat", type=int, default=5, help="requisições por rota")
+    parser.add_argument("--concurrency", type=int, default=1, help="requisições simultâneas por rota")
+    parser.add_argument("--snapshots", action="store_true", help="ativa os relatórios guardados em memória")
+    parser.add_argument("--json", help="arquivo onde gravar os resultados em JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    run(parse_args())
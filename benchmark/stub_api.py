@@ -0,0 +1,203 @@
+"""
+Este arquivo tem o objetivo de permitir medir o desempenho do servidor sem depender da API real.
+
+O endereço da API é configurável (variável de ambiente `STRACT_API_BASE_URL`), então foi criada uma API simulada, com os
+mesmos endpoints e o mesmo formato de resposta da original, que gera dados sintéticos:
+
+/api/platforms
+/api/accounts?platform={{platform}}
+/api/fields?platform={{platform}}
+/api/insights?platform={{platform}}&account={{account}}&token={{token}}&fields={{field1,field2,etc}}
+
+As respostas são paginadas pelo parâmetro "page", com a chave "pagination" ({"current": N, "total": M}) como na API real.
+Os dados são gerados a partir de sementes fixas, então a mesma configuração sempre retorna os mesmos valores.
+
+É possível ajustar:
+- a quantidade de plataformas, de contas (total, dividido entre as plataformas) e de anúncios por conta;
+- o tamanho das páginas;
+- a latência de cada resposta (valor fixo mais uma variação aleatória);
+- a taxa de erros (respostas 503 sorteadas), para testar as novas tentativas do cliente;
+- plataformas lentas (latência adicional) ou sempre com erro, para testar o prazo de '/geral' e os disjuntores;
+- plataformas em que apenas os insights falham (contas e campos respondem normalmente);
+- respostas muito lentas sorteadas ("stragglers"), para testar a duplicação de requisições lentas;
+- um limite de requisições por segundo, acima do qual a API responde 429 com o cabeçalho `Retry-After`.
+
+Uso:
+    python benchmark/stub_api.py --accounts 1000 --latency 0.02 --error-rate 0.01 --port 8765
+    STRACT_API_BASE_URL=http://127.0.0.1:8765 python app.py
+"""
+import argparse
+import random
+import threading
+import time
+from flask import Flask, jsonify, request
+"""
+A biblioteca `argparse` lê as opções da linha de comando.
+A biblioteca `random` gera os dados sintéticos, a latência e os erros.
+A biblioteca `threading` protege o contador do limite de requisições por segundo.
+A biblioteca `time` simula a latência das respostas.
+O `Flask` serve os endpoints simulados.
+"""
+
+PLATFORM_NAMES = [
+    ("meta_ads", "Facebook Ads"),
+    ("ga4", "Google Analytics"),
+    ("tiktok_insights", "TikTok"),
+    ("linkedin_ads", "LinkedIn Ads"),
+    ("pinterest_ads", "Pinterest Ads")
+]
+"""
+Plataformas simuladas, no formato (value, text) da API real.
+"""
+
+FIELDS = ["ad_name", "clicks", "impressions", "spend", "cpc", "ctr", "status"]
+"""
+Campos de insights. Assim como na API real, a plataforma "ga4" não tem o campo "cpc".
+"""
+
+TOKEN = "ProcessoSeletivoStract2025"
+
+
+def create_app(platforms=3, accounts=30, ads_per_account=10, page_size=10, latency=0.0, jitter=0.0, error_rate=0.0,
+               seed=2025, slow_platforms=(), slow_latency=0.0, failing_platforms=(), straggler_rate=0.0,
+               straggler_latency=0.0, rate_limit=0.0, retry_after=None, failing_insights=()):
+    """
+    Cria a aplicação Flask da API simulada com a configuração informada.
+    `accounts` é o total de contas, dividido igualmente entre as plataformas.
+    As plataformas em `slow_platforms` têm `slow_latency` segundos a mais de latência e as de `failing_platforms`
+    sempre respondem 503. Nas de `failing_insights`, apenas `/api/insights` responde 503. Uma fração `straggler_rate`
+    das respostas demora `straggler_latency` segundos a mais.
+    Com `rate_limit`, as requisições acima dessa quantidade por segundo recebem 429, com `Retry-After` igual a
+    `retry_after` segundos (se informado).
+    """
+    app = Flask(__name__)
+    platform_list = [{"value": value, "text": text} for value, text in PLATFORM_NAMES[:platforms]]
+    accounts_per_platform = max(1, accounts // max(1, len(platform_list)))
+    chaos = random.Random(seed)
+    limiter = {"tokens": rate_limit, "updated": time.monotonic(), "lock": threading.Lock()}
+
+    def rate_limited():
+        if not rate_limit:
+            return False
+        with limiter["lock"]:
+            now = time.monotonic()
+            limiter["tokens"] = min(rate_limit, limiter["tokens"] + (now - limiter["updated"]) * rate_limit)
+            limiter["updated"] = now
+            if limiter["tokens"] < 1:
+                return True
+            limiter["tokens"] -= 1
+            return False
+
+    def paginate(items, key):
+        page = max(1, int(request.args.get("page", 1)))
+        total = max(1, -(-len(items) // page_size))
+        start = (page - 1) * page_size
+        return jsonify({key: items[start:start + page_size], "pagination": {"current": page, "total": total}})
+
+    def platform_fields(platform):
+        return [field for field in FIELDS if not (platform == "ga4" and field == "cpc")]
+
+    @app.before_request
+    def simulate_network():
+        if request.headers.get("Authorization") != f"Bearer {TOKEN}":
+            return jsonify({"error": "unauthorized"}), 401
+        if request.path != "/api" and rate_limited():
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else {}
+            return jsonify({"error": "rate limit exceeded"}), 429, headers
+        delay = latency + chaos.uniform(0, jitter) if jitter else latency
+        if request.args.get("platform") in slow_platforms:
+            delay += slow_latency
+        if straggler_rate and chaos.random() < straggler_rate:
+            delay += straggler_latency
+        if delay:
+            time.sleep(delay)
+        if request.args.get("platform") in failing_platforms:
+            return jsonify({"error": "simulated platform outage"}), 503
+        if error_rate and chaos.random() < error_rate:
+            return jsonify({"error": "simulated failure"}), 503
+        return None
+
+    @app.route("/api")
+    def root():
+        return "API simulada para testes de desempenho."
+
+    @app.route("/api/platforms")
+    def api_platforms():
+        return jsonify({"platforms": platform_list})
+
+    @app.route("/api/accounts")
+    def api_accounts():
+        platform = request.args.get("platform", "")
+        items = [
+            {"id": f"{platform}-{index}", "name": f"Conta {index % 97}", "token": f"token-{platform}-{index}"}
+            for index in range(accounts_per_platform)
+        ]
+        return paginate(items, "accounts")
+
+    @app.route("/api/fields")
+    def api_fields():
+        platform = request.args.get("platform", "")
+        return paginate([{"value": field, "text": field.replace("_", " ").title()}
+                         for field in platform_fields(platform)], "fields")
+
+    @app.route("/api/insights")
+    def api_insights():
+        platform = request.args.get("platform", "")
+        account = request.args.get("account", "")
+        if request.args.get("token") != f"token-{account}":
+            return jsonify({"error": "invalid account token"}), 403
+        if platform in failing_insights:
+            return jsonify({"error": "simulated insights outage"}), 503
+        fields = [field for field in request.args.get("fields", "").split(",") if field in platform_fields(platform)]
+        generator = random.Random(f"{seed}-{account}")
+        items = []
+        for index in range(ads_per_account):
+            clicks = generator.randint(0, 5000)
+            impressions = clicks + generator.randint(0, 50000)
+            spend = round(generator.uniform(0, 5000), 2)
+            values = {
+                "ad_name": f"Anúncio {index}",
+                "clicks": clicks,
+                "impressions": impressions,
+                "spend": spend,
+                "cpc": round(spend / clicks, 3) if clicks else 0,
+                "ctr": round(clicks / impressions, 3) if impressions else 0,
+                "status": generator.choice(["ACTIVE", "PAUSED"])
+            }
+            items.append({field: values[field] for field in fields})
+        return paginate(items, "insights")
+
+    return app
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="API simulada da Stract para testes de desempenho.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--platforms", type=int, default=3, help="quantidade de plataformas (até 5)")
+    parser.add_argument("--accounts", type=int, default=30, help="total de contas, dividido entre as plataformas")
+    parser.add_argument("--ads-per-account", type=int, default=10, help="anúncios (linhas de insights) por conta")
+    parser.add_argument("--page-size", type=int, default=10, help="itens por página")
+    parser.add_argument("--latency", type=float, default=0.0, help="latência fixa de cada resposta, em segundos")
+    parser.add_argument("--jitter", type=float, default=0.0, help="latência aleatória adicional máxima, em segundos")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fração das respostas que retornam 503")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("--slow-platform", action="append", default=[], help="plataforma com latência adicional")
+    parser.add_argument("--slow-latency", type=float, default=0.0, help="latência adicional das plataformas lentas")
+    parser.add_argument("--fail-platform", action="append", default=[], help="plataforma que sempre responde 503")
+    parser.add_argument("--fail-insights", action="append", default=[],
+                        help="plataforma em que apenas os insights respondem 503")
+    parser.add_argument("--straggler-rate", type=float, default=0.0, help="fração das respostas muito lentas")
+    parser.add_argument("--straggler-latency", type=float, default=0.0, help="latência adicional dessas respostas")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="requisições por segundo antes de responder 429")
+    parser.add_argument("--retry-after", type=float, help="valor do cabeçalho Retry-After das respostas 429")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    stub = create_app(args.platforms, args.accounts, args.ads_per_account, args.page_size, args.latency, args.jitter,
+                      args.error_rate, args.seed, args.slow_platform, args.slow_latency, args.fail_platform,
+                      args.straggler_rate, args.straggler_latency, args.rate_limit, args.retry_after,
+                      args.fail_insights)
+    stub.run(host=args.host, port=args.port, threaded=True)
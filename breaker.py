@@ -0,0 +1,90 @@
+# breaker.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Quando uma plataforma ou uma conta começa a falhar, cada relatório continuava tentando buscá-la, repetindo as novas
+tentativas do cliente HTTP e segurando as threads do pool até o tempo limite. Uma única plataforma com problemas deixava
+todos os relatórios lentos.
+
+Para evitar isso foi criado um disjuntor ("circuit breaker") por chave (plataforma ou conta):
+
+1. Fechado: as requisições passam normalmente. Cada falha é contada e um sucesso zera a contagem.
+2. Aberto: depois de `failure_threshold` falhas seguidas, as requisições daquela chave são recusadas imediatamente,
+   sem acessar a API, durante `cooldown` segundos.
+3. Meio-aberto: terminado o prazo, uma única requisição de teste é liberada. Se ela der certo o disjuntor fecha; se
+   falhar, ele abre novamente por mais `cooldown` segundos. Se ela não chegar a acessar a API (outro disjuntor recusou
+   a requisição ou o valor veio do cache), a vaga de teste é devolvida com `release()`, sem contar sucesso nem falha.
+"""
+import threading
+import time
+"""
+A biblioteca `threading` fornece a trava que protege o estado dos disjuntores, usados por várias threads.
+A biblioteca `time` fornece o relógio monotônico usado no prazo em que o disjuntor fica aberto.
+"""
+
+
+class CircuitBreaker:
+    """
+    Conjunto de disjuntores independentes, um por chave. Para cada chave com falhas guarda
+    [falhas seguidas, instante em que abriu (ou None), requisição de teste em andamento].
+    """
+    def __init__(self, failure_threshold, cooldown):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def allow(self, key):
+        """
+        Retorna True se a requisição da chave pode ser feita. Com o disjuntor aberto retorna False, exceto para a
+        primeira chamada depois do prazo, que passa a ser a requisição de teste.
+        """
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            state = self._states.get(key)
+            if state is None or state[1] is None:
+                return True
+            if time.monotonic() - state[1] < self.cooldown or state[2]:
+                return False
+            state[2] = True
+            return True
+
+    def release(self, key):
+        """
+        Devolve a vaga da requisição de teste liberada por allow() que não chegou a acessar a API, sem alterar a
+        contagem de falhas. Sem isso o disjuntor ficaria esperando para sempre o resultado do teste.
+        """
+        with self._lock:
+            state = self._states.get(key)
+            if state is not None:
+                state[2] = False
+
+    def record_success(self, key):
+        """
+        Fecha o disjuntor da chave e zera a contagem de falhas.
+        """
+        with self._lock:
+            self._states.pop(key, None)
+
+    def record_failure(self, key):
+        """
+        Conta uma falha da chave e abre o disjuntor ao atingir `failure_threshold` falhas seguidas (ou quando a
+        requisição de teste falha).
+        """
+        if self.failure_threshold <= 0:
+            return
+        with self._lock:
+            state = self._states.setdefault(key, [0, None, False])
+            state[0] += 1
+            state[2] = False
+            if state[0] >= self.failure_threshold:
+                state[1] = time.monotonic()
+
+    def open_keys(self):
+        """
+        Retorna as chaves com o disjuntor aberto (inclusive as que aguardam a requisição de teste).
+        """
+        with self._lock:
+            return [key for key, state in self._states.items() if state[1] is not None]
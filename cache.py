@@ -0,0 +1,125 @@
+# cache.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Foi percebido que cada rota buscava novamente a lista de plataformas e, para cada plataforma, as contas e os campos,
+mesmo esses dados mudando raramente. Até a rota `/<plataforma>` precisava de uma requisição só para descobrir qual
+plataforma corresponde ao nome da URL.
+
+Para evitar isso, foi criado um cache em memória com as seguintes características:
+
+1. Cada chave tem seu próprio tempo de validade (TTL).
+2. O cache tem um tamanho máximo; quando cheio, a chave usada há mais tempo é descartada.
+3. Depois de expirado, o valor ainda pode ser entregue por um período ("stale-while-revalidate"), enquanto uma thread
+   em segundo plano busca o valor atualizado. Assim as rotas respondem da memória e só esperam pela API quando o valor
+   não existe ou já passou muito do prazo.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from scheduler import background
+"""
+A biblioteca `logging` registra os erros das atualizações em segundo plano.
+A biblioteca `threading` fornece a trava que protege o cache e as threads de atualização em segundo plano.
+A biblioteca `time` fornece o relógio monotônico usado nos prazos de validade.
+O `OrderedDict` mantém as chaves na ordem de uso, para descartar a menos usada quando o cache enche.
+O `background` faz com que as atualizações em segundo plano fiquem atrás dos relatórios no agendador de requisições.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Cache em memória com validade por chave, tamanho máximo e entrega de valores expirados durante a atualização.
+    Cada entrada guarda (valor, expira_em, descartar_em). Entre `expira_em` e `descartar_em` o valor ainda é entregue,
+    mas uma atualização em segundo plano é iniciada.
+    """
+    def __init__(self, max_size, ttl, stale_ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def _store(self, key, value, ttl):
+        """
+        Guarda o valor com os prazos calculados a partir de agora e descarta as entradas excedentes.
+        Valores vazios (None, lista ou dicionário vazio) não são guardados, para que uma falha da API não fique em cache.
+        """
+        if not value:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (value, now + ttl, now + ttl + self.stale_ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def _refresh(self, key, loader, ttl):
+        """
+        Executa o `loader` em segundo plano e substitui o valor expirado. Em caso de erro o valor antigo é mantido.
+        """
+        try:
+            with background():
+                value = loader()
+            self._store(key, value, ttl)
+        except Exception:
+            logger.exception("Erro ao atualizar o cache para %s", key)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """
+        Retorna o valor guardado para `key`. Se ele não existir ou estiver vencido há mais de `stale_ttl` segundos,
+        chama `loader()` e guarda o resultado por `ttl` segundos (ou o TTL padrão do cache).
+        Se estiver vencido há menos tempo, retorna o valor antigo e inicia uma atualização em segundo plano.
+        """
+        ttl = self.ttl if ttl is None else ttl
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires_at, stale_until = entry
+                if now < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if now < stale_until:
+                    self._entries.move_to_end(key)
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, loader, ttl), daemon=True).start()
+                    return value
+                del self._entries[key]
+            self.misses += 1
+
+        value = loader()
+        self._store(key, value, ttl)
+        return value
+
+    def hit_ratio(self):
+        """
+        Fração das consultas respondidas com um valor guardado (válido ou vencido), ou 0.0 antes da primeira consulta.
+        """
+        with self._lock:
+            total = self.hits + self.stale_hits + self.misses
+            return (self.hits + self.stale_hits) / total if total else 0.0
+
+    def invalidate(self, key=None):
+        """
+        Remove uma chave do cache ou, se nenhuma for informada, todas elas.
+        """
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
@@ -0,0 +1,426 @@
+# client.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Inicialmente cada função de view.py chamava `requests.get` diretamente, o que abria uma nova conexão TCP/TLS a cada
+requisição e montava os cabeçalhos de autenticação toda vez. Com as requisições feitas em paralelo e todas as páginas
+sendo lidas, esse custo passou a se repetir centenas de vezes por relatório.
+
+Para resolver isso, foi criado um cliente único, compartilhado por todo o projeto, que:
+
+1. Mantém uma `requests.Session` com um pool de conexões reaproveitadas (keep-alive), de forma que o handshake com a API
+   seja feito uma vez por conexão e não uma vez por conta.
+2. Monta os cabeçalhos de autenticação uma única vez.
+3. Aplica tempo limite em todas as requisições.
+4. Repete as requisições que falharem por erros transitórios, esperando um tempo exponencial com variação aleatória
+   entre as tentativas, para que várias threads não tentem novamente no mesmo instante.
+5. Limita a quantidade de requisições em andamento ao mesmo tempo, somando todos os pools de threads.
+6. Junta requisições idênticas feitas ao mesmo tempo ("single-flight"): se vários relatórios pedirem a mesma página
+   da mesma conta enquanto ela ainda está sendo buscada, apenas uma requisição é feita e todos recebem a mesma resposta.
+7. Registra, por endpoint, o tempo de cada requisição, os bytes recebidos, os erros e as novas tentativas (metrics.py).
+8. Opcionalmente duplica requisições lentas ("hedging"): se uma requisição de insights passa do percentil configurado
+   das latências recentes, uma cópia é enviada e vale a primeira resposta. Poucas contas lentas deixam de decidir o
+   tempo total dos relatórios, e um limite na fração de requisições duplicadas impede que a carga na API dobre.
+9. Passa cada tentativa pelo agendador (scheduler.py), que respeita o limite de requisições por segundo da API. As
+   respostas 429 ajustam a taxa do agendador e são repetidas, respeitando o `Retry-After`, em vez de virar erro.
+10. Permite ler o corpo da resposta em pedaços (`stream=True`), para que as páginas de insights sejam convertidas em
+   linhas à medida que chegam, sem guardar a página inteira (ver jsonstream.py).
+"""
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+import requests
+from requests.adapters import HTTPAdapter
+from authentication import get_api_headers
+from config import (API_BASE_URL, MAX_IN_FLIGHT, CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, BACKOFF_BASE,
+                    BACKOFF_MAX, HEDGE_ENABLED, HEDGE_ENDPOINTS, HEDGE_PERCENTILE, HEDGE_MAX_RATE, HEDGE_MIN_SAMPLES,
+                    HEDGE_WINDOW, MAX_THROTTLE_RETRIES, PAGE_PREFETCH, STREAM_CHUNK_SIZE)
+from metrics import (upstream_latency, upstream_bytes, upstream_errors, upstream_retries, upstream_hedges,
+                     endpoint_name)
+from profiling import phase, wrap
+from scheduler import scheduler
+"""
+A biblioteca `random` é usada para sortear o tempo de espera entre as tentativas.
+A biblioteca `threading` fornece o semáforo que limita as requisições simultâneas.
+A biblioteca `time` é usada para esperar entre as tentativas.
+O `parsedate_to_datetime` lê o cabeçalho `Retry-After` quando ele vem como data.
+O `deque` guarda as latências e as decisões de duplicação mais recentes.
+O `Future` guarda o resultado de uma requisição em andamento para as chamadas idênticas que esperam por ela. O
+`ThreadPoolExecutor`, o `wait` e o `FIRST_COMPLETED` executam a requisição original e a duplicada ao mesmo tempo e
+esperam pela primeira que responder.
+A biblioteca `requests` e o `HTTPAdapter` são usados para criar a sessão com o pool de conexões.
+A função `get_api_headers` fornece os cabeçalhos de autenticação, que passam a ser definidos uma única vez na sessão.
+Os valores de `config` definem o endereço da API, os limites de tempo, a política de novas tentativas e o tamanho dos
+pedaços lidos das respostas em `stream`.
+As métricas de `metrics` registram o tempo, os bytes, os erros, as novas tentativas e as duplicações de cada endpoint.
+A função `phase` soma o tempo das requisições à fase 'fetch' da requisição que está sendo perfilada (profiling.py) e
+`wrap` leva esse perfil para as threads que fazem as requisições duplicadas.
+O `scheduler` libera cada requisição respeitando o limite de requisições por segundo e a prioridade.
+"""
+
+RETRY_STATUS_CODES = frozenset({500, 502, 503, 504})
+"""
+Status HTTP considerados transitórios, para os quais a requisição é repetida.
+"""
+
+THROTTLE_STATUS_CODE = 429
+
+
+def close_response(future):
+    """
+    Fecha a resposta de uma requisição que não vai mais ser lida (a mais lenta de uma requisição duplicada ou uma página
+    buscada antecipadamente e abandonada), devolvendo a conexão. Usada como `add_done_callback` do `Future`.
+    """
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def succeeded(future):
+    """
+    Retorna True se o `Future` de uma requisição terminou com uma resposta de sucesso (status 2xx ou 3xx). Erros de
+    conexão e respostas de erro (como 5xx e 429) não contam, e ficam para as novas tentativas de ApiClient._get().
+    """
+    return future.exception() is None and future.result().ok
+
+
+def retry_after(response):
+    """
+    Lê o cabeçalho `Retry-After` de uma resposta, em segundos ou como data, e retorna a espera em segundos, ou None se
+    ele não existir ou for inválido.
+    """
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, IndexError, OverflowError):
+        return None
+
+
+class SingleFlight:
+    """
+    Junta chamadas idênticas e simultâneas: enquanto a chamada de uma chave está em andamento, outras chamadas com a
+    mesma chave esperam e recebem o mesmo resultado (ou a mesma exceção), em vez de repetir o trabalho.
+    Os contadores `leaders` (chamadas executadas) e `coalesced` (chamadas que aproveitaram uma em andamento) permitem
+    medir a economia.
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, func):
+        """
+        Executa `func()` para `key`, ou espera pela execução em andamento da mesma chave e retorna o seu resultado.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = Future()
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as error:
+            future.set_exception(error)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def submit(self, key, start):
+        """
+        Versão assíncrona de do(): `start()` deve iniciar o trabalho e retornar um `Future` (por exemplo,
+        `executor.submit(...)`). Enquanto esse `Future` não terminar, chamadas com a mesma chave recebem o mesmo
+        `Future` em vez de iniciar outro. Assim também são juntadas tarefas que ainda estão na fila do pool de threads.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future
+            future = self._calls[key] = start()
+            self.leaders += 1
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def stats(self):
+        """
+        Retorna os contadores e a quantidade de chaves em andamento neste momento.
+        """
+        with self._lock:
+            return {"leaders": self.leaders, "coalesced": self.coalesced, "in_flight": len(self._calls)}
+
+
+class HedgePolicy:
+    """
+    Decide quando duplicar uma requisição. Para cada endpoint guarda as últimas `window` latências de respostas
+    bem-sucedidas; o prazo para duplicar é o percentil `percentile` delas. Também guarda, para as últimas `window`
+    requisições que podiam ser duplicadas, se foram ou não, de forma que no máximo `max_rate` delas sejam duplicadas.
+    """
+    def __init__(self, endpoints=HEDGE_ENDPOINTS, percentile=HEDGE_PERCENTILE, max_rate=HEDGE_MAX_RATE,
+                 min_samples=HEDGE_MIN_SAMPLES, window=HEDGE_WINDOW):
+        self.endpoints = frozenset(endpoints)
+        self.percentile = percentile
+        self.max_rate = max_rate
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {}
+        self._thresholds = {}
+        self._decisions = deque()
+        self._hedged = 0
+        self._lock = threading.Lock()
+
+    def observe(self, endpoint, seconds):
+        """
+        Registra a latência de uma resposta bem-sucedida. O percentil é recalculado a cada 16 novas latências.
+        """
+        if endpoint not in self.endpoints:
+            return
+        with self._lock:
+            latencies = self._latencies.get(endpoint)
+            if latencies is None:
+                latencies = self._latencies[endpoint] = deque(maxlen=self.window)
+            latencies.append(seconds)
+            if len(latencies) >= self.min_samples and (len(latencies) % 16 == 0 or endpoint not in self._thresholds):
+                ordered = sorted(latencies)
+                self._thresholds[endpoint] = ordered[min(len(ordered) - 1, int(self.percentile * len(ordered)))]
+
+    def delay(self, endpoint):
+        """
+        Retorna quantos segundos esperar antes de duplicar uma requisição do endpoint, ou None se ele não é duplicado
+        ou ainda não tem latências suficientes.
+        """
+        with self._lock:
+            return self._thresholds.get(endpoint)
+
+    def record(self, hedged):
+        """
+        Registra se uma requisição que podia ser duplicada foi duplicada.
+        """
+        with self._lock:
+            self._decisions.append(hedged)
+            self._hedged += hedged
+            while len(self._decisions) > self.window:
+                self._hedged -= self._decisions.popleft()
+
+    def allow(self):
+        """
+        Retorna True se mais uma duplicação mantém a fração de requisições duplicadas dentro de `max_rate`.
+        """
+        with self._lock:
+            return self._hedged + 1 <= self.max_rate * max(len(self._decisions), 1)
+
+
+class ApiClient:
+    """
+    Cliente HTTP compartilhado para a API externa.
+    Todas as requisições de view.py passam por aqui, reaproveitando as conexões do pool.
+    """
+    def __init__(self, base_url=API_BASE_URL, max_in_flight=MAX_IN_FLIGHT, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, hedge=HEDGE_ENABLED):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self.single_flight = SingleFlight()
+        self.hedge_policy = HedgePolicy() if hedge else None
+        self._hedge_executor = (ThreadPoolExecutor(max_workers=2 * max_in_flight, thread_name_prefix="stract-hedge")
+                                if hedge else None)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_in_flight * (1 + PAGE_PREFETCH), max_retries=0)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(get_api_headers())
+
+    def backoff(self, attempt):
+        """
+        Calcula a espera antes da tentativa `attempt` (começando em 1): um valor sorteado entre zero e
+        `backoff_base * 2 ** (attempt - 1)`, limitado a `backoff_max`.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (attempt - 1)))
+
+    def get(self, path, params=None, timeout=None, stream=False):
+        """
+        Faz um GET em `path` (relativo ao endereço base da API) e retorna a `requests.Response`.
+        Chamadas simultâneas com o mesmo caminho e os mesmos parâmetros (plataforma, conta, campos, página) são juntadas
+        em uma única requisição, e todas recebem a mesma resposta.
+        Com `stream`, a resposta é retornada assim que os cabeçalhos chegam e o corpo deve ser lido com iter_body(). Como
+        esse corpo só pode ser lido uma vez, essas chamadas não são juntadas. As vagas de requisições simultâneas são
+        liberadas quando os cabeçalhos chegam; o pool de conexões tem espaço para os corpos ainda em leitura, inclusive
+        os das páginas buscadas antecipadamente.
+        """
+        if stream:
+            return self._get(path, params, timeout, stream)
+        key = (path, tuple(sorted((params or {}).items())))
+        return self.single_flight.do(key, lambda: self._get(path, params, timeout))
+
+    def iter_body(self, response, endpoint, chunk_size=STREAM_CHUNK_SIZE):
+        """
+        Gera o corpo de uma resposta pedida com `stream` em pedaços de até `chunk_size` bytes, registrando os bytes
+        recebidos, e fecha a resposta ao terminar (ou se o gerador for fechado antes do fim).
+        """
+        try:
+            for chunk in response.iter_content(chunk_size):
+                upstream_bytes.inc(len(chunk), endpoint=endpoint)
+                yield chunk
+        finally:
+            response.close()
+
+    def _get(self, path, params, timeout, stream=False):
+        """
+        Executa o GET de fato. Cada tentativa espera a liberação do agendador. Respostas 429 reduzem a taxa do
+        agendador e são repetidas até `MAX_THROTTLE_RETRIES` vezes, sem contar como falha. Falhas de conexão, tempo
+        esgotado e status 5xx são repetidos até `max_retries` vezes.
+        Esgotadas as tentativas, a última resposta é retornada ou a última exceção é lançada.
+        """
+        url = f"{self.base_url}{path}"
+        endpoint = endpoint_name(path)
+        attempt = 0
+        throttled = 0
+        while True:
+            scheduler.acquire()
+            try:
+                response = self._send(url, params, timeout, endpoint, stream)
+                if response.status_code == THROTTLE_STATUS_CODE and throttled < MAX_THROTTLE_RETRIES:
+                    throttled += 1
+                    response.close()
+                    scheduler.on_throttle(retry_after(response))
+                    continue
+                if response.status_code < 500 and response.status_code != THROTTLE_STATUS_CODE:
+                    scheduler.on_success()
+                if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                    return response
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as error:
+                upstream_errors.inc(endpoint=endpoint,
+                                    reason="timeout" if isinstance(error, requests.Timeout) else "connection")
+                if attempt >= self.max_retries:
+                    raise
+            attempt += 1
+            upstream_retries.inc(endpoint=endpoint)
+            time.sleep(self.backoff(attempt))
+
+    def _request(self, url, params, timeout, endpoint, started=None, slot_acquired=False, stream=False):
+        """
+        Faz uma única requisição, respeitando o limite de requisições simultâneas, e registra o tempo, os bytes e os
+        erros de status. `started`, se informado, é sinalizado quando a requisição deixa a fila e é de fato enviada.
+        Com `slot_acquired` a vaga do limite de requisições simultâneas já foi reservada por quem chamou.
+        Com `stream`, o tempo registrado vai até a chegada dos cabeçalhos e os bytes são contados por iter_body().
+        """
+        if not slot_acquired:
+            self._in_flight.acquire()
+        try:
+            if started is not None:
+                started.set()
+            start = time.perf_counter()
+            try:
+                with phase('fetch'):
+                    response = self.session.get(url, params=params, timeout=timeout or self.timeout, stream=stream)
+            finally:
+                elapsed = time.perf_counter() - start
+                upstream_latency.observe(elapsed, endpoint=endpoint)
+        finally:
+            self._in_flight.release()
+        if not stream:
+            upstream_bytes.inc(len(response.content), endpoint=endpoint)
+        if response.status_code != 200:
+            upstream_errors.inc(endpoint=endpoint, reason=str(response.status_code))
+        elif self.hedge_policy is not None:
+            self.hedge_policy.observe(endpoint, elapsed)
+        return response
+
+    def _send(self, url, params, timeout, endpoint, stream=False):
+        """
+        Faz uma tentativa da requisição. Com a duplicação ativa e o endpoint elegível, a requisição é feita em outra
+        thread; se ela não responder dentro do percentil de latência do endpoint (contado a partir do envio, sem o tempo
+        na fila), o limite de duplicações permitir e houver uma vaga livre entre as requisições simultâneas, uma cópia é
+        enviada e vale a primeira resposta de sucesso (ver succeeded()): um erro de uma delas não descarta a outra, que
+        ainda pode responder. A requisição mais lenta não é interrompida, apenas descartada (e sua resposta fechada). Se
+        as duas falharem, vale a resposta de erro da original (ou da cópia, se a original lançou uma exceção), tratada
+        pelas novas tentativas de _get(). Sem vaga livre a cópia não é enviada, pois ela apenas tomaria o lugar de outra
+        requisição na fila.
+        """
+        delay = self.hedge_policy.delay(endpoint) if self.hedge_policy is not None else None
+        if delay is None:
+            return self._request(url, params, timeout, endpoint, stream=stream)
+
+        request = wrap(self._request)
+        started = threading.Event()
+        primary = self._hedge_executor.submit(request, url, params, timeout, endpoint, started, stream=stream)
+        started.wait()
+        try:
+            response = primary.result(timeout=delay)
+        except FuturesTimeoutError:
+            pass
+        else:
+            self.hedge_policy.record(False)
+            return response
+
+        if not self.hedge_policy.allow() or not self._in_flight.acquire(blocking=False):
+            self.hedge_policy.record(False)
+            return primary.result()
+        if not scheduler.try_acquire():
+            self._in_flight.release()
+            self.hedge_policy.record(False)
+            return primary.result()
+        self.hedge_policy.record(True)
+        upstream_hedges.inc(endpoint=endpoint, result="sent")
+        backup = self._hedge_executor.submit(request, url, params, timeout, endpoint, None, True, stream)
+
+        pending = {primary, backup}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [future for future in (primary, backup) if future in done and succeeded(future)]
+            if winners:
+                winner = winners[0]
+                if winner is backup:
+                    upstream_hedges.inc(endpoint=endpoint, result="won")
+                loser = backup if winner is primary else primary
+                loser.add_done_callback(close_response)
+                return winner.result()
+        winner = primary if primary.exception() is None or backup.exception() is not None else backup
+        loser = backup if winner is primary else primary
+        close_response(loser)
+        return winner.result()
+
+    def close(self):
+        """
+        Fecha as conexões abertas do pool.
+        """
+        self.session.close()
+
+
+client = ApiClient()
+"""
+Instância única do cliente, importada por view.py.
+"""
+
@@ -0,0 +1,142 @@
+# config.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Com o crescimento do projeto, alguns valores passaram a precisar de ajuste conforme o ambiente em que o servidor é executado
+(quantidade de requisições simultâneas, tempos limite, etc.). Para não espalhar esses números pelo código, foi criado este
+arquivo que centraliza as configurações. Cada valor pode ser sobrescrito por uma variável de ambiente com o mesmo nome
+prefixado por `STRACT_`.
+"""
+import os
+"""
+A biblioteca `os` é usada para ler as variáveis de ambiente que sobrescrevem os valores padrão.
+"""
+
+
+def _env_int(name, default):
+    """
+    Lê uma variável de ambiente `STRACT_<name>` como inteiro, retornando o valor padrão caso ela não exista.
+    """
+    return int(os.environ.get(f"STRACT_{name}", default))
+
+
+def _env_str(name, default):
+    """
+    Lê uma variável de ambiente `STRACT_<name>` como texto, retornando o valor padrão caso ela não exista.
+    """
+    return os.environ.get(f"STRACT_{name}", default)
+
+
+def _env_float(name, default):
+    """
+    Lê uma variável de ambiente `STRACT_<name>` como número decimal, retornando o valor padrão caso ela não exista.
+    """
+    return float(os.environ.get(f"STRACT_{name}", default))
+
+
+
+
+# Endereço base da API externa. Pode apontar para a API simulada de benchmark/stub_api.py em testes locais.
+API_BASE_URL = _env_str("API_BASE_URL", "https://sidebar.stract.to")
+
+# Quantidade máxima de requisições à API externa em andamento ao mesmo tempo.
+MAX_IN_FLIGHT = _env_int("MAX_IN_FLIGHT", 8)
+
+# Quantidade de páginas de um mesmo endpoint buscadas antecipadamente enquanto a página atual é processada.
+PAGE_PREFETCH = _env_int("PAGE_PREFETCH", 4)
+
+# Tempo limite, em segundos, para abrir a conexão e para receber a resposta de cada requisição.
+CONNECT_TIMEOUT = _env_float("CONNECT_TIMEOUT", 5)
+READ_TIMEOUT = _env_float("READ_TIMEOUT", 30)
+
+# Quantidade de novas tentativas para erros transitórios (falha de conexão, tempo esgotado e status 5xx) e os limites,
+# em segundos, da espera exponencial com variação aleatória entre elas.
+MAX_RETRIES = _env_int("MAX_RETRIES", 3)
+BACKOFF_BASE = _env_float("BACKOFF_BASE", 0.5)
+BACKOFF_MAX = _env_float("BACKOFF_MAX", 8)
+
+# Tempo, em segundos, que plataformas, contas e campos ficam em cache, por quanto tempo um valor vencido ainda pode ser
+# entregue enquanto é atualizado em segundo plano e a quantidade máxima de chaves guardadas.
+PLATFORMS_TTL = _env_float("PLATFORMS_TTL", 3600)
+ACCOUNTS_TTL = _env_float("ACCOUNTS_TTL", 300)
+FIELDS_TTL = _env_float("FIELDS_TTL", 3600)
+METADATA_STALE_TTL = _env_float("METADATA_STALE_TTL", 3600)
+METADATA_CACHE_SIZE = _env_int("METADATA_CACHE_SIZE", 256)
+
+# Intervalo, em segundos, entre as atualizações em segundo plano dos relatórios guardados em memória. Zero desativa os
+# relatórios guardados e todas as rotas passam a consultar a API a cada requisição.
+SNAPSHOT_INTERVAL = _env_float("SNAPSHOT_INTERVAL", 60)
+
+# Arquivo binário onde os insights do último snapshot são gravados e de onde são lidos ao iniciar o servidor. Vazio
+# desativa a gravação.
+SNAPSHOT_PATH = _env_str("SNAPSHOT_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "insights_data.bin"))
+
+# Nível das mensagens de log (DEBUG, INFO, WARNING, ERROR). Com DEBUG, as respostas de plataformas, contas e campos são
+# exibidas por completo.
+LOG_LEVEL = _env_str("LOG_LEVEL", "INFO").upper()
+
+# Permite perfilar requisições individuais com o cabeçalho `X-Profile: 1` ou `?profile=1` (ver profiling.py), quantos
+# perfis ficam guardados para consulta em '/profiles' e quantas funções são listadas em cada um.
+PROFILING_ENABLED = _env_int("PROFILING_ENABLED", 0) == 1
+PROFILE_STORE_SIZE = _env_int("PROFILE_STORE_SIZE", 20)
+PROFILE_TOP_FUNCTIONS = _env_int("PROFILE_TOP_FUNCTIONS", 25)
+
+# Tempo máximo, em segundos, que '/geral' e '/geral/resumo' esperam pela API quando não há snapshot. As plataformas que
+# não responderem a tempo ficam de fora e são listadas no cabeçalho `X-Missing-Platforms`. Como esse cabeçalho só pode
+# ser enviado antes do corpo, com o prazo o relatório só começa a sair depois que todas as plataformas terminarem (ou
+# o prazo acabar). Zero (o padrão) desativa o prazo e as linhas são enviadas à medida que chegam.
+GERAL_DEADLINE = _env_float("GERAL_DEADLINE", 0)
+
+# Falhas seguidas de uma plataforma ou conta até que ela deixe de ser consultada, e por quantos segundos, antes de uma
+# nova tentativa de teste. Zero desativa os disjuntores.
+BREAKER_FAILURES = _env_int("BREAKER_FAILURES", 5)
+BREAKER_COOLDOWN = _env_float("BREAKER_COOLDOWN", 30)
+
+# Requisições duplicadas ("hedging"): quando uma requisição de um dos endpoints de `HEDGE_ENDPOINTS` passa do percentil
+# `HEDGE_PERCENTILE` das latências recentes daquele endpoint, uma cópia é enviada e vale a primeira resposta. No máximo
+# `HEDGE_MAX_RATE` das requisições recentes são duplicadas, e só depois de `HEDGE_MIN_SAMPLES` latências observadas.
+HEDGE_ENABLED = _env_int("HEDGE_ENABLED", 0) == 1
+HEDGE_ENDPOINTS = tuple(name.strip() for name in _env_str("HEDGE_ENDPOINTS", "insights").split(",") if name.strip())
+HEDGE_PERCENTILE = _env_float("HEDGE_PERCENTILE", 0.95)
+HEDGE_MAX_RATE = _env_float("HEDGE_MAX_RATE", 0.1)
+HEDGE_MIN_SAMPLES = _env_int("HEDGE_MIN_SAMPLES", 20)
+HEDGE_WINDOW = _env_int("HEDGE_WINDOW", 200)
+
+# Agendador das requisições à API (scheduler.py): taxa máxima em requisições por segundo (zero = sem limite até a
+# primeira resposta 429), quantas fichas podem se acumular, a menor taxa permitida, quanto a taxa sobe por segundo
+# depois de respostas aceitas e por quanto é multiplicada a cada 429. `MAX_THROTTLE_RETRIES` limita quantas vezes uma
+# mesma requisição é repetida depois de receber 429.
+RATE_LIMIT = _env_float("RATE_LIMIT", 0)
+RATE_BURST = _env_float("RATE_BURST", MAX_IN_FLIGHT)
+RATE_MIN = _env_float("RATE_MIN", 1)
+RATE_INCREASE = _env_float("RATE_INCREASE", 10)
+RATE_DECREASE = _env_float("RATE_DECREASE", 0.5)
+MAX_THROTTLE_RETRIES = _env_int("MAX_THROTTLE_RETRIES", 20)
+
+# Leitura incremental das páginas de insights (ver jsonstream.py): o corpo é lido em pedaços de `STREAM_CHUNK_SIZE`
+# bytes e cada anúncio vira uma linha assim que chega, sem montar a página inteira em memória. Zero volta a usar
+# `response.json()`.
+STREAM_INSIGHTS = _env_int("STREAM_INSIGHTS", 1) == 1
+STREAM_CHUNK_SIZE = _env_int("STREAM_CHUNK_SIZE", 16 * 1024)
+
+# Compressão das respostas (ver content_encoding.py): nível do gzip, quantos relatórios comprimidos ficam em cache e o
+# tamanho mínimo, em bytes, das demais respostas para que valha a pena comprimi-las.
+COMPRESSION_LEVEL = _env_int("COMPRESSION_LEVEL", 6)
+ENCODED_CACHE_SIZE = _env_int("ENCODED_CACHE_SIZE", 64)
+# Quantas páginas de `?top=`/`?limit=` comprimidas ficam em um cache próprio, separado do cache dos relatórios inteiros
+# (cada cursor é uma chave nova, então as páginas não podem descartar os relatórios inteiros).
+PAGE_CACHE_SIZE = _env_int("PAGE_CACHE_SIZE", 16)
+COMPRESSION_MIN_SIZE = _env_int("COMPRESSION_MIN_SIZE", 1024)
+
+# Quantidade máxima de linhas pedidas em `?top=` e `?limit=` nas rotas de relatório (ver ordering.py).
+MAX_LIMIT = _env_int("MAX_LIMIT", 10000)
+
+# Cache compartilhado entre os processos do servidor na mesma máquina (ver shared_cache.py): arquivo SQLite com as
+# respostas de plataformas, contas e campos e os relatórios montados. Vazio desativa o compartilhamento. Com ele, apenas
+# um processo atualiza o snapshot e os demais leem o arquivo `SNAPSHOT_PATH` gravado por ele. `SHARED_CACHE_LEASE` é o
+# prazo, em segundos, da trava de um processo sobre uma chave (inclusive a atualização do snapshot) e
+# `SHARED_REPORT_TTL` por quanto tempo os relatórios montados ficam no arquivo.
+SHARED_CACHE_PATH = _env_str("SHARED_CACHE_PATH", "")
+SHARED_CACHE_LEASE = _env_float("SHARED_CACHE_LEASE", 300)
+SHARED_REPORT_TTL = _env_float("SHARED_REPORT_TTL", 3600)
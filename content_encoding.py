@@ -0,0 +1,135 @@
+# content_encoding.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Os painéis consultam '/geral' e as rotas das plataformas a cada minuto, e cada consulta recebia o CSV inteiro sem
+compressão, mesmo quando os dados não tinham mudado desde a consulta anterior.
+
+Este arquivo reúne a compressão das respostas:
+
+1. Os formatos disponíveis são gzip (biblioteca padrão) e, se as bibliotecas opcionais estiverem instaladas, zstd
+   (`zstandard`) e brotli (`brotli`). O formato é escolhido pelo cabeçalho `Accept-Encoding` do cliente.
+2. Os relatórios prontos dos snapshots são comprimidos uma única vez por versão dos dados e guardados em cache
+   (`encoded_cache`), com a chave igual ao ETag da resposta. Consultas repetidas entregam os bytes já comprimidos.
+3. Com vários processos, os relatórios comprimidos também ficam no cache compartilhado (ver shared_cache.py), então cada
+   versão é montada e comprimida por um único processo.
+4. As páginas de `?top=` e `?limit=` ficam em um cache menor e separado (`page_cache`), apenas no processo: cada cursor
+   gera uma chave nova, e no `encoded_cache` uma paginação descartaria os relatórios inteiros, bem mais caros de montar.
+5. Os relatórios enviados em pedaços, montados à medida que a API responde, são comprimidos pedaço a pedaço, sem
+   esperar pelo fim do relatório.
+"""
+import zlib
+from cache import TTLCache
+from config import COMPRESSION_LEVEL, ENCODED_CACHE_SIZE, PAGE_CACHE_SIZE, SHARED_REPORT_TTL
+from shared_cache import shared_cache
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import brotli
+except ImportError:
+    brotli = None
+"""
+A biblioteca `zlib` gera o formato gzip.
+O `TTLCache` guarda as respostas já comprimidas, descartando as menos usadas.
+`COMPRESSION_LEVEL` define o nível de compressão do gzip, `ENCODED_CACHE_SIZE` quantas respostas ficam em cache e
+`PAGE_CACHE_SIZE` quantas páginas.
+O `shared_cache` guarda os relatórios comprimidos para os demais processos por `SHARED_REPORT_TTL` segundos.
+As bibliotecas `zstandard` e `brotli` são opcionais: sem elas, apenas o gzip é oferecido.
+"""
+
+ENCODINGS = tuple(name for name, module in (("zstd", zstandard), ("br", brotli), ("gzip", zlib)) if module is not None)
+"""
+Formatos de compressão disponíveis, em ordem de preferência quando o cliente aceita mais de um com o mesmo peso.
+"""
+
+encoded_cache = TTLCache(max_size=ENCODED_CACHE_SIZE, ttl=float("inf"), stale_ttl=0)
+"""
+Corpos das respostas dos relatórios prontos, já comprimidos, por ETag. Como o ETag muda junto com os dados, as entradas
+não precisam de prazo de validade: as de versões antigas apenas deixam de ser usadas e são descartadas quando o cache
+enche.
+"""
+
+page_cache = TTLCache(max_size=PAGE_CACHE_SIZE, ttl=float("inf"), stale_ttl=0)
+"""
+Corpos já comprimidos das páginas de `?top=` e `?limit=`, por ETag, como o `encoded_cache`.
+"""
+
+
+def _pack(entry):
+    """
+    Converte (corpo, compressão ou None) em bytes para o cache compartilhado: o nome da compressão, ':' e o corpo.
+    """
+    body, encoding = entry
+    return (encoding or "").encode("ascii") + b":" + body
+
+
+def _unpack(data):
+    encoding, _, body = bytes(data).partition(b":")
+    return body, encoding.decode("ascii") or None
+
+
+def cached_encoded(etag, load):
+    """
+    Retorna (corpo, compressão ou None) do relatório pronto com o ETag `etag`: do `encoded_cache`, do cache
+    compartilhado entre os processos (se configurado) ou, na primeira vez, de `load()`, que monta e comprime o relatório.
+    """
+    if shared_cache is None:
+        return encoded_cache.get_or_load(etag, load)
+    return encoded_cache.get_or_load(
+        etag, lambda: shared_cache.get_or_load(f"report:{etag}", load, SHARED_REPORT_TTL, encode=_pack, decode=_unpack))
+
+
+def cached_page(etag, load):
+    """
+    Como cached_encoded(), para uma página de um relatório pronto: usa apenas o `page_cache` do processo, já que a
+    página custa pouco para montar (ver ordering.RowIndex).
+    """
+    return page_cache.get_or_load(etag, load)
+
+
+def compress(data, encoding):
+    """
+    Comprime `data` (bytes) no formato `encoding`. Com `encoding` igual a None retorna os próprios dados.
+    """
+    if encoding is None:
+        return data
+    if encoding == "gzip":
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor().compress(data)
+    if encoding == "br":
+        return brotli.compress(data)
+    raise ValueError(f"Formato de compressão desconhecido: {encoding}")
+
+
+def iter_compressed(chunks, encoding):
+    """
+    Comprime os pedaços de um relatório enviado em pedaços. Cada pedaço é comprimido e enviado assim que é gerado, para
+    que o cliente continue recebendo as linhas à medida que a API responde. Os pedaços podem ser textos ou bytes.
+    """
+    if encoding == "gzip":
+        compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 31)
+        process, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+    elif encoding == "zstd":
+        compressor = zstandard.ZstdCompressor().compressobj()
+        process, flush = compressor.compress, lambda: compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        finish = compressor.flush
+    elif encoding == "br":
+        compressor = brotli.Compressor()
+        process, flush, finish = compressor.process, compressor.flush, compressor.finish
+    else:
+        raise ValueError(f"Formato de compressão desconhecido: {encoding}")
+    try:
+        for chunk in chunks:
+            data = process(chunk.encode("utf-8") if isinstance(chunk, str) else chunk) + flush()
+            if data:
+                yield data
+        yield finish()
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
@@ -0,0 +1,216 @@
+# export.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+A função `main()` de view.py apenas imprimia as linhas coletadas, e o arquivo insights_data.csv era montado à mão. Para
+gerar os relatórios em arquivos era preciso chamar cada rota do Flask ('/geral', '/geral/resumo' e as duas rotas de
+cada plataforma), e cada uma percorria a API novamente.
+
+Este arquivo exporta todos os relatórios a partir de uma única passagem pela API:
+
+1. As plataformas, contas e campos e os insights de todas as contas são buscados uma única vez, em paralelo, pelas
+   mesmas funções de view.py usadas pelo servidor.
+2. Com as linhas em memória, cada relatório ('/geral', '/geral/resumo', '/<plataforma>' e '/<plataforma>/resumo') é
+   montado e gravado em paralelo no diretório de saída, no formato escolhido (CSV, NDJSON ou Arrow).
+3. Cada arquivo é escrito ao lado com outro nome e depois substitui o anterior de uma só vez, então quem lê os arquivos
+   durante a exportação nunca encontra um relatório pela metade.
+
+Contas e plataformas que falharem ficam de fora dos relatórios, são listadas ao final e o comando termina com o código
+de saída 1, para que a exportação noturna possa ser acompanhada. Se nenhuma plataforma ou nenhuma linha puder ser
+buscada (API fora do ar ou token inválido), nenhum arquivo é gravado, para que os relatórios anteriores (inclusive o
+insights_data.csv) não sejam substituídos por arquivos vazios.
+
+Uso:
+    python export.py --output exports
+    python export.py --output exports --format ndjson --workers 8
+    python export.py --output exports --insights-csv insights_data.csv
+"""
+import argparse
+import logging
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from aggregate import GroupAggregator
+from config import LOG_LEVEL
+from formats import available_formats, report_chunks
+from reports import REPORT_HEADERS, summary_row
+from view import get_platforms, fetch_all_accounts_and_fields, iter_account_results, platform_slug
+"""
+A biblioteca `argparse` lê as opções da linha de comando, `logging` configura as mensagens de view.py, `os` grava os
+arquivos, `re` troca os caracteres que não podem aparecer nos nomes dos arquivos, `sys` define o código de saída e
+`time` mede a duração de cada etapa.
+O `Counter` encontra plataformas com o mesmo nome de arquivo e o `ThreadPoolExecutor` grava os relatórios em paralelo.
+O `GroupAggregator` e o `summary_row` montam os resumos, como nas rotas de app.py.
+O `LOG_LEVEL` define o nível das mensagens.
+As funções de `formats` geram os relatórios no formato escolhido, em pedaços, e `REPORT_HEADERS` são as colunas.
+As funções de `view` buscam os dados da API, com as requisições em paralelo.
+"""
+
+EXTENSIONS = {'csv': 'csv', 'ndjson': 'ndjson', 'arrow': 'arrow'}
+"""
+Extensão dos arquivos de cada formato.
+"""
+
+GERAL_REPORTS = ('geral', 'geral_resumo')
+"""
+Nomes dos arquivos dos relatórios gerais, que nenhuma plataforma pode usar.
+"""
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+class ExportError(Exception):
+    """
+    Erro lançado quando a exportação não pode ser feita, antes de gravar qualquer arquivo.
+    """
+
+
+def crawl():
+    """
+    Percorre a API uma única vez: plataformas, contas e campos, e os insights de todas as contas, em paralelo.
+    Retorna (plataformas, linhas por plataforma, falhas). As linhas ficam na ordem de plataforma e conta, e as falhas
+    são textos descrevendo as plataformas e contas que não puderam ser buscadas.
+    """
+    platforms = get_platforms()
+    platform_datas = fetch_all_accounts_and_fields(platforms)
+    fetched = {platform_data['platform'] for platform_data in platform_datas}
+    failures = [f"plataforma {platform['value']}" for platform in platforms if platform['value'] not in fetched]
+
+    rows_by_platform = {platform['value']: [] for platform in platforms if platform['value'] in fetched}
+    for platform, account, rows in iter_account_results(platform_datas):
+        if rows is None:
+            failures.append(f"conta {account.get('id')} da plataforma {platform}")
+            continue
+        rows_by_platform[platform].extend(rows)
+    return platforms, rows_by_platform, failures
+
+
+def summary_rows(rows, keys, platform=None):
+    """
+    Linhas do resumo de `rows` agrupado por `keys`, como nas rotas de resumo.
+    """
+    aggregator = GroupAggregator(keys).update(rows)
+    return [summary_row(summary, platform) for summary in aggregator.results()]
+
+
+def file_names(platforms):
+    """
+    Nome do arquivo de cada plataforma ({valor: nome}): o nome usado na URL (ver view.platform_slug()), com '_' no lugar
+    dos caracteres que não podem aparecer em nomes de arquivo. Quando duas plataformas têm o mesmo nome, ou quando o
+    nome coincide com o de um relatório geral, o valor da plataforma (único na API) é acrescentado ao nome, como em
+    'facebook_ads-meta_ads'.
+    """
+    slugs = {platform['value']: _UNSAFE_NAME.sub('_', platform_slug(platform)) for platform in platforms}
+    counts = Counter(slugs.values())
+    return {value: f"{slug}-{_UNSAFE_NAME.sub('_', value)}" if counts[slug] > 1 or slug in GERAL_REPORTS else slug
+            for value, slug in slugs.items()}
+
+
+def report_jobs(platforms, rows_by_platform):
+    """
+    Lista (nome do arquivo sem extensão, função que retorna as linhas) de cada relatório, com os mesmos nomes das rotas:
+    'geral', 'geral_resumo', '<plataforma>' e '<plataforma>_resumo' (ver file_names()). Os resumos são calculados na
+    própria tarefa de gravação, em paralelo com os demais relatórios.
+    Lança `ExportError` se dois relatórios ainda tiverem o mesmo nome de arquivo (por exemplo, as plataformas 'X' e
+    'X Resumo'), já que um substituiria o outro.
+    """
+    all_rows = [row for rows in rows_by_platform.values() for row in rows]
+    jobs = [
+        ('geral', lambda: all_rows),
+        ('geral_resumo', lambda: summary_rows(all_rows, ('platform',)))
+    ]
+    names = file_names(platforms)
+    for platform in platforms:
+        value = platform['value']
+        if value not in rows_by_platform:
+            continue
+        rows = rows_by_platform[value]
+        name = names[value]
+        jobs.append((name, lambda rows=rows: rows))
+        jobs.append((f"{name}_resumo", lambda rows=rows, value=value: summary_rows(rows, ('account',), value)))
+    repeated = sorted(name for name, count in Counter(name for name, _ in jobs).items() if count > 1)
+    if repeated:
+        raise ExportError(f"Relatórios com o mesmo nome de arquivo: {', '.join(repeated)}")
+    return jobs
+
+
+def write_report(path, rows, report_format):
+    """
+    Grava o relatório em `path`, em pedaços, e retorna a quantidade de linhas. O arquivo é escrito ao lado com outro
+    nome e substitui o anterior de uma só vez.
+    """
+    temporary_path = f"{path}.tmp{os.getpid()}"
+    with open(temporary_path, 'wb') as file:
+        for chunk in report_chunks(rows, REPORT_HEADERS, report_format):
+            file.write(chunk.encode('utf-8') if isinstance(chunk, str) else chunk)
+    os.replace(temporary_path, path)
+    return len(rows)
+
+
+def export(output, report_format='csv', workers=4, insights_csv=None):
+    """
+    Busca os dados uma única vez e grava todos os relatórios em `output` em paralelo, com até `workers` gravações ao
+    mesmo tempo. Com `insights_csv`, o relatório geral também é gravado em CSV nesse caminho (o antigo
+    insights_data.csv). Retorna (arquivos gravados com a quantidade de linhas, falhas).
+    Lança `ExportError`, sem gravar nenhum arquivo, se nenhuma plataforma ou nenhuma linha puder ser buscada.
+    """
+    start = time.perf_counter()
+    platforms, rows_by_platform, failures = crawl()
+    crawled = time.perf_counter()
+    row_count = sum(len(rows) for rows in rows_by_platform.values())
+    print(f"API percorrida em {crawled - start:.2f}s: {row_count} linhas de {len(rows_by_platform)} plataforma(s)")
+    if not rows_by_platform:
+        raise ExportError("Nenhuma plataforma pôde ser buscada na API; nenhum relatório foi gravado.")
+    if not row_count:
+        raise ExportError("A API não retornou nenhuma linha de insights; nenhum relatório foi gravado.")
+
+    jobs = report_jobs(platforms, rows_by_platform)
+    os.makedirs(output, exist_ok=True)
+    tasks = [(os.path.join(output, f"{name}.{EXTENSIONS[report_format]}"), rows, report_format)
+             for name, rows in jobs]
+    if insights_csv:
+        tasks.append((insights_csv, tasks[0][1], 'csv'))
+
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="stract-export") as executor:
+        futures = [(path, executor.submit(lambda path=path, rows=rows, fmt=fmt: write_report(path, rows(), fmt)))
+                   for path, rows, fmt in tasks]
+        written = [(path, future.result()) for path, future in futures]
+    print(f"{len(written)} relatório(s) gravado(s) em {time.perf_counter() - crawled:.2f}s")
+    return written, failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta todos os relatórios a partir de uma única passagem pela API.")
+    parser.add_argument("--output", default="exports", help="diretório onde os relatórios são gravados")
+    parser.add_argument("--format", default="csv", choices=available_formats(), help="formato dos relatórios")
+    parser.add_argument("--workers", type=int, default=4, help="quantidade de relatórios gravados ao mesmo tempo")
+    parser.add_argument("--insights-csv", help="grava também o relatório geral em CSV neste arquivo")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Executa a exportação com as opções da linha de comando. Retorna o código de saída: 0, ou 1 se alguma plataforma ou
+    conta falhou ou se a exportação não pôde ser feita.
+    """
+    args = parse_args(argv)
+    try:
+        written, failures = export(args.output, args.format, args.workers, args.insights_csv)
+    except ExportError as error:
+        print(error)
+        return 1
+    for path, count in written:
+        print(f"{path}: {count} linhas")
+    if failures:
+        print(f"Ficaram de fora dos relatórios: {', '.join(failures)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL)
+    sys.exit(main())
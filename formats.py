@@ -0,0 +1,191 @@
+# formats.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Os relatórios eram enviados apenas como CSV em texto. Os sistemas que carregam esses dados precisavam ler o CSV de novo
+e adivinhar o tipo de cada coluna (número inteiro, decimal ou texto), o que é lento para muitas contas e sujeito a erros
+com valores como 'N/A'.
+
+Este arquivo gera os mesmos relatórios em outros formatos, escolhidos pelo parâmetro `?format=` ou pelo cabeçalho
+`Accept`:
+
+1. `csv` (padrão): o CSV de reports.py, sem mudanças.
+2. `ndjson`: uma linha JSON por registro, com os números já como números e os valores ausentes como `null`, enviada em
+   pedaços à medida que as linhas são geradas.
+3. `arrow`: o formato de streaming IPC do Apache Arrow, em colunas e com tipos definidos, que pode ser carregado sem
+   leitura linha a linha (por exemplo com `pyarrow.ipc.open_stream`). As linhas são enviadas em lotes de
+   `ARROW_BATCH_SIZE`. Depende da biblioteca opcional `pyarrow`; sem ela, o formato não é oferecido.
+"""
+import io
+import json
+from reports import CSV_CHUNK_SIZE, csv_chunks
+from store import METRIC_COLUMNS, INTEGER_COLUMNS, parse_metric
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+"""
+A biblioteca `io` fornece o buffer onde cada lote do Arrow é escrito antes de ser enviado.
+A biblioteca `json` escreve as linhas do NDJSON.
+O `CSV_CHUNK_SIZE` e o `csv_chunks` de `reports` definem o tamanho dos pedaços enviados e geram o CSV.
+As constantes e a função `parse_metric` de `store` definem quais colunas são numéricas e convertem os valores da API,
+da mesma forma que nos resumos.
+A biblioteca `pyarrow` é opcional e só é necessária para o formato `arrow`.
+"""
+
+MIMETYPES = {
+    'csv': 'text/plain',
+    'ndjson': 'application/x-ndjson',
+    'arrow': 'application/vnd.apache.arrow.stream'
+}
+"""
+Tipo de conteúdo das respostas de cada formato. O CSV continua como 'text/plain', como antes.
+"""
+
+ACCEPT_TYPES = {
+    'text/plain': 'csv',
+    'text/csv': 'csv',
+    'application/x-ndjson': 'ndjson',
+    'application/jsonl': 'ndjson',
+    'application/vnd.apache.arrow.stream': 'arrow'
+}
+"""
+Tipos aceitos no cabeçalho `Accept` e o formato correspondente, em ordem de preferência quando o cliente aceita
+qualquer um ('*/*').
+"""
+
+ARROW_BATCH_SIZE = 4096
+"""
+Quantidade de linhas de cada lote (record batch) do Arrow. Lotes maiores deixam o arquivo mais compacto e rápido de
+carregar; menores fazem as primeiras linhas chegarem antes.
+"""
+
+
+def available_formats():
+    """
+    Formatos que podem ser gerados com as bibliotecas instaladas.
+    """
+    return tuple(name for name in MIMETYPES if name != 'arrow' or pyarrow is not None)
+
+
+def parse_format(value, accept=None):
+    """
+    Escolhe o formato do relatório: o parâmetro `?format=` (`value`), se informado, ou o melhor tipo do cabeçalho
+    `Accept` (`accept`, um `MIMEAccept` do Flask) entre os formatos disponíveis. Sem nenhum dos dois, ou sem um tipo
+    conhecido no `Accept`, retorna 'csv'.
+    Lança `ValueError` se o formato pedido em `?format=` não existir ou depender de uma biblioteca não instalada.
+    """
+    formats = available_formats()
+    if value:
+        value = value.strip().lower()
+        if value not in MIMETYPES:
+            raise ValueError(f"Formato inválido: {value}. Use {', '.join(formats)}.")
+        if value not in formats:
+            raise ValueError(f"O formato {value} requer a biblioteca pyarrow, que não está instalada.")
+        return value
+    if accept is None:
+        return 'csv'
+    best = accept.best_match([mimetype for mimetype, name in ACCEPT_TYPES.items() if name in formats])
+    return ACCEPT_TYPES.get(best, 'csv')
+
+
+def typed_value(column, value):
+    """
+    Converte o valor de uma coluna para o seu tipo: as métricas viram números (inteiros para as contagens) e os valores
+    ausentes ou inválidos, como 'N/A', viram None. As demais colunas ficam como texto.
+    """
+    if column in METRIC_COLUMNS:
+        number, missing = parse_metric(value)
+        if missing:
+            return None
+        return int(number) if column in INTEGER_COLUMNS else number
+    if value is None or value == '' or value == 'N/A':
+        return None
+    return value if isinstance(value, str) else str(value)
+
+
+def ndjson_chunks(rows, headers):
+    """
+    Gera o NDJSON em pedaços de até `CSV_CHUNK_SIZE` caracteres, com um objeto JSON por linha e as chaves na ordem de
+    `headers`. Assim como no CSV, apenas o pedaço atual fica em memória.
+    """
+    buffer = []
+    size = 0
+    for row in rows:
+        line = json.dumps({header: typed_value(header, row.get(header)) for header in headers}, ensure_ascii=False)
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= CSV_CHUNK_SIZE:
+            yield "\n".join(buffer) + "\n"
+            buffer = []
+            size = 0
+    if buffer:
+        yield "\n".join(buffer) + "\n"
+
+
+def arrow_schema(headers):
+    """
+    Esquema do Arrow das colunas `headers`: contagens como int64, as demais métricas como float64 e o resto como texto.
+    """
+    fields = []
+    for header in headers:
+        if header in INTEGER_COLUMNS:
+            field_type = pyarrow.int64()
+        elif header in METRIC_COLUMNS:
+            field_type = pyarrow.float64()
+        else:
+            field_type = pyarrow.string()
+        fields.append(pyarrow.field(header, field_type))
+    return pyarrow.schema(fields)
+
+
+def arrow_chunks(rows, headers, batch_size=ARROW_BATCH_SIZE):
+    """
+    Gera o relatório no formato de streaming IPC do Arrow: primeiro o esquema e depois um lote a cada `batch_size`
+    linhas, montado coluna a coluna, de forma que apenas o lote atual fique em memória.
+    """
+    schema = arrow_schema(headers)
+    sink = io.BytesIO()
+    writer = pyarrow.ipc.new_stream(sink, schema)
+
+    def flush():
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+
+    columns = [[] for _ in headers]
+    yield flush()
+    for row in rows:
+        for values, header in zip(columns, headers):
+            values.append(typed_value(header, row.get(header)))
+        if len(columns[0]) >= batch_size:
+            writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+            columns = [[] for _ in headers]
+            yield flush()
+    if columns[0]:
+        writer.write_batch(pyarrow.record_batch(columns, schema=schema))
+    writer.close()
+    yield flush()
+
+
+def report_chunks(rows, headers, report_format='csv'):
+    """
+    Gera o relatório no formato `report_format` em pedaços (textos no CSV e no NDJSON, bytes no Arrow).
+    """
+    if report_format == 'ndjson':
+        return ndjson_chunks(rows, headers)
+    if report_format == 'arrow':
+        return arrow_chunks(rows, headers)
+    return csv_chunks(rows, headers)
+
+
+def render_report(rows, headers, report_format='csv'):
+    """
+    Monta o relatório completo no formato `report_format`, para os relatórios montados a partir do snapshot.
+    Retorna um texto (CSV e NDJSON) ou bytes (Arrow).
+    """
+    chunks = report_chunks(rows, headers, report_format)
+    return b"".join(chunks) if report_format == 'arrow' else "".join(chunks)
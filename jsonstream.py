@@ -0,0 +1,164 @@
+# jsonstream.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Cada página de insights era lida com `response.json()`: o corpo inteiro era recebido, guardado em memória e convertido
+em uma árvore de objetos antes que a primeira linha do relatório pudesse ser montada. Em páginas grandes, a memória de
+cada requisição crescia com o tamanho da página, e a leitura só começava depois do último byte.
+
+Este arquivo lê respostas no formato da API ({"insights": [...], "pagination": {...}}) de forma incremental, a partir
+dos pedaços do corpo à medida que chegam da rede:
+
+1. A lista da chave pedida é percorrida item a item, e cada item é entregue assim que termina de chegar. Apenas o item
+   atual e o pedaço em leitura ficam em memória.
+2. Os demais campos do objeto principal (como 'pagination') são lidos inteiros e guardados para quem chamou, já que são
+   pequenos e podem vir antes ou depois da lista.
+3. Cada item é convertido pelo decodificador em C do módulo `json` (`raw_decode`), então o custo por item é o mesmo de
+   `response.json()`; quando um item ainda não chegou inteiro, o próximo pedaço é lido e a conversão é repetida.
+"""
+import codecs
+import json
+import re
+"""
+A biblioteca `codecs` fornece o decodificador UTF-8 incremental, que trata caracteres divididos entre dois pedaços.
+A biblioteca `json` converte cada item e cada campo com `raw_decode`, a partir de uma posição do texto.
+A biblioteca `re` pula os espaços entre os elementos do JSON.
+"""
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+class _Reader:
+    """
+    Texto do JSON lido sob demanda a partir de um iterável de pedaços em bytes. Guarda apenas o trecho ainda não
+    consumido.
+    """
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._decode = codecs.getincrementaldecoder('utf-8')().decode
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        """
+        Acrescenta o próximo pedaço ao texto. Retorna False se o corpo já terminou.
+        """
+        if self._eof:
+            return False
+        for chunk in self._chunks:
+            text = self._decode(chunk)
+            if text:
+                self._buffer = self._buffer[self._pos:] + text
+                self._pos = 0
+                return True
+        self._decode(b'', True)
+        self._eof = True
+        return False
+
+    def peek(self):
+        """
+        Pula os espaços e retorna o próximo caractere sem consumi-lo, ou '' no fim do corpo.
+        """
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, *chars):
+        """
+        Consome o próximo caractere (depois dos espaços) e o retorna. Lança `ValueError` se ele não for um de `chars`.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            found = repr(char) if char else "o fim do corpo"
+            raise ValueError(f"JSON inválido: esperado {' ou '.join(map(repr, chars))}, encontrado {found}")
+        self._pos += 1
+        return char
+
+    def value(self):
+        """
+        Converte o próximo valor JSON completo. Enquanto o valor não chegou inteiro, novos pedaços são lidos e a
+        conversão é repetida. Um valor que termina exatamente no fim do texto lido também espera pelo próximo pedaço,
+        já que um número como '12' pode continuar no pedaço seguinte.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                if not self._fill():
+                    raise
+                continue
+            if end == len(self._buffer) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def items(self):
+        """
+        Gera os itens de uma lista cujo '[' já foi consumido, até o ']' final. Os itens que já estão inteiros no texto
+        lido são convertidos direto pelo decodificador em C, sem passar por peek() e value(); apenas o item que
+        atravessa o fim do pedaço usa o caminho mais lento.
+        """
+        if self.peek() == ']':
+            self._pos += 1
+            return
+        scan = _decoder.scan_once
+        skip = _WHITESPACE.match
+        while True:
+            buffer = self._buffer
+            start = skip(buffer, self._pos).end()
+            try:
+                value, end = scan(buffer, start)
+                after = skip(buffer, end).end()
+            except (StopIteration, json.JSONDecodeError):
+                after = len(buffer)
+            if after < len(buffer):
+                delimiter = buffer[after]
+                if delimiter not in ',]':
+                    raise ValueError(f"JSON inválido: esperado ',' ou ']', encontrado {delimiter!r}")
+                self._pos = after + 1
+            else:
+                self._pos = start
+                value = self.value()
+                delimiter = self.expect(',', ']')
+            yield value
+            if delimiter == ']':
+                return
+
+
+def iter_array(chunks, key, rest=None):
+    """
+    Gera, um a um, os itens da lista `key` do objeto JSON lido de `chunks` (iterável de pedaços em bytes, como
+    `response.iter_content()`). Os demais campos do objeto são guardados no dicionário `rest`, se informado, e ficam
+    completos quando o gerador termina. Um objeto sem a chave, ou com o valor null, não gera nenhum item.
+    O corpo é lido até o fim, para que a conexão possa ser reaproveitada. Lança `ValueError` se o JSON for inválido.
+    """
+    reader = _Reader(chunks)
+    reader.expect('{')
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            name = reader.value()
+            if not isinstance(name, str):
+                raise ValueError("JSON inválido: o nome de um campo deve ser um texto")
+            reader.expect(':')
+            if name == key and reader.peek() == '[':
+                reader.expect('[')
+                yield from reader.items()
+            else:
+                value = reader.value()
+                if name == key and value is not None:
+                    raise ValueError(f"JSON inválido: o campo '{key}' não é uma lista")
+                if rest is not None and name != key:
+                    rest[name] = value
+            if reader.expect(',', '}') == '}':
+                break
+    if reader.peek():
+        raise ValueError("JSON inválido: conteúdo após o fim do objeto")
@@ -0,0 +1,201 @@
+# metrics.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+A única forma de acompanhar o servidor era pelos `print` espalhados no código, o que não permite saber quanto tempo cada
+endpoint da API leva, quantos erros e novas tentativas aconteceram ou quanto o cache está ajudando.
+
+Por isso foi criado este módulo de métricas, sem dependências externas, no formato de texto do Prometheus:
+
+1. `Counter`: contadores que só aumentam (bytes e linhas recebidos, erros, novas tentativas).
+2. `Histogram`: distribuição de tempos em faixas (latência de cada endpoint da API e de cada rota do Flask).
+3. `CallbackMetric`: valores lidos no momento da consulta de outros objetos (acertos do cache, requisições juntadas).
+
+Todas as métricas ficam em um registro único (`registry`), exposto pela rota `/metrics` de app.py.
+"""
+import bisect
+import threading
+"""
+A biblioteca `bisect` encontra a faixa do histograma de cada observação.
+A biblioteca `threading` fornece a trava que protege os valores, já que várias threads registram métricas ao mesmo tempo.
+"""
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+"""
+Limites, em segundos, das faixas padrão dos histogramas de latência.
+"""
+
+
+def _format_labels(labels):
+    """
+    Formata um dicionário de rótulos no formato do Prometheus: {chave="valor",...}.
+    """
+    if not labels:
+        return ""
+    escaped = (f'{key}="{str(value).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """
+    Contador que só aumenta, separado pelos valores dos rótulos (`labelnames`).
+    """
+    type = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name, tuple(zip(self.labelnames, key)), value
+
+
+class Histogram:
+    """
+    Histograma com faixas cumulativas, soma e contagem, separado pelos valores dos rótulos.
+    """
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(label, "")) for label in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(state[0]), state[1], state[2])) for key, state in self._values.items()]
+        for key, (counts, total, count) in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(float(bound))),), cumulative
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, count
+
+
+class CallbackMetric:
+    """
+    Métrica cujos valores são lidos na hora da consulta, chamando `callback()`, que deve retornar uma lista de
+    (dicionário de rótulos, valor). Usada para expor contadores que já existem em outros objetos.
+    """
+    def __init__(self, name, documentation, callback, type="gauge"):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.type = type
+
+    def samples(self):
+        for labels, value in self.callback():
+            yield self.name, tuple(labels.items()), value
+
+
+class Registry:
+    """
+    Conjunto de métricas expostas em `/metrics`.
+    """
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, type="gauge"):
+        return self.register(CallbackMetric(name, documentation, callback, type))
+
+    def render(self):
+        """
+        Retorna todas as métricas no formato de texto do Prometheus.
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+"""
+Registro único de métricas do servidor.
+"""
+
+upstream_latency = registry.histogram(
+    "stract_upstream_request_seconds", "Tempo de cada requisição à API externa, por endpoint.", ("endpoint",))
+upstream_bytes = registry.counter(
+    "stract_upstream_bytes_total", "Bytes recebidos da API externa, por endpoint.", ("endpoint",))
+upstream_errors = registry.counter(
+    "stract_upstream_errors_total", "Respostas com erro ou falhas de conexão da API externa.", ("endpoint", "reason"))
+upstream_retries = registry.counter(
+    "stract_upstream_retries_total", "Novas tentativas de requisições à API externa.", ("endpoint",))
+upstream_hedges = registry.counter(
+    "stract_upstream_hedges_total", "Requisições duplicadas enviadas (sent) e que responderam primeiro (won).",
+    ("endpoint", "result"))
+rows_ingested = registry.counter(
+    "stract_rows_ingested_total", "Itens recebidos da API externa (plataformas, contas, campos e insights).",
+    ("endpoint",))
+partial_responses = registry.counter(
+    "stract_partial_responses_total", "Relatórios enviados sem alguma plataforma (prazo esgotado ou falha).",
+    ("route",))
+not_modified = registry.counter(
+    "stract_not_modified_total", "Relatórios respondidos com 304, sem reenviar o corpo (ETag ou data não mudaram).",
+    ("route",))
+route_latency = registry.histogram(
+    "stract_route_seconds", "Tempo de resposta das rotas do Flask, incluindo o envio do corpo.", ("route", "status"))
+
+
+def endpoint_name(path):
+    """
+    Nome curto do endpoint da API usado como rótulo: '/api/insights' -> 'insights'.
+    """
+    return path.rstrip('/').rsplit('/', 1)[-1] or 'root'
@@ -0,0 +1,308 @@
+# ordering.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Os relatórios sempre traziam todas as linhas, na ordem em que foram buscadas. Um cliente que queria, por exemplo, os 20
+anúncios com maior gasto precisava baixar o relatório inteiro e ordená-lo por conta própria.
+
+Este arquivo interpreta os parâmetros de ordenação e paginação das rotas de relatório e seleciona as linhas pedidas:
+
+1. `?sort=coluna` ordena pela coluna em ordem crescente e `?sort=-coluna` em ordem decrescente. Valores ausentes
+   ('N/A') ficam sempre no fim, e linhas empatadas mantêm a ordem original. Números (inclusive os que chegam como
+   texto, como '100') são comparados como números e vêm antes dos textos, então os campos extras de `?columns=all`
+   (contagens, ids, orçamentos) também ficam na ordem certa.
+2. `?top=N` retorna apenas as N primeiras linhas na ordem pedida (exige `?sort=`).
+3. `?limit=N` retorna uma página de até N linhas e, se houver mais, um cursor no cabeçalho `X-Next-Cursor`. A página
+   seguinte é pedida com `?after=<cursor>`. O cursor guarda a posição da última linha entregue na ordenação (o valor e
+   a posição original), então as páginas continuam corretas mesmo se os dados forem atualizados entre uma e outra.
+
+As linhas que chegam da API são selecionadas com um heap (`heapq.nsmallest`), guardando apenas as N melhores: O(n log k)
+em vez de ordenar tudo. Nos relatórios prontos dos snapshots, cada ordenação pedida gera uma única vez um índice
+ordenado (`RowIndex`), e cada consulta encontra o início da página por busca binária e copia apenas as k linhas pedidas:
+O(log n + k).
+"""
+import base64
+import heapq
+import json
+import math
+import threading
+from bisect import bisect_right
+from itertools import islice
+from config import MAX_LIMIT
+from store import METRIC_COLUMNS, parse_metric
+"""
+A biblioteca `base64` e a `json` montam o cursor enviado ao cliente, e a `math` identifica os valores que não são
+números (NaN), tratados como ausentes.
+A biblioteca `heapq` seleciona as N primeiras linhas sem ordenar todas, e o `bisect_right` encontra o início da página
+no índice ordenado.
+A biblioteca `threading` protege a montagem dos índices, feita na primeira consulta de cada ordenação.
+O `islice` corta as páginas dos relatórios sem ordenação, sem percorrer as linhas seguintes.
+O `MAX_LIMIT` limita a quantidade de linhas de `?top=` e `?limit=`.
+As `METRIC_COLUMNS` e o `parse_metric` de `store` definem quais colunas são ordenadas como números.
+"""
+
+CURSOR_HEADER = 'X-Next-Cursor'
+"""
+Cabeçalho da resposta com o cursor da próxima página.
+"""
+
+
+_NUMBER = 0
+_TEXT = 1
+"""
+Tipo do valor na chave de ordenação: em ordem crescente os números vêm antes dos textos.
+"""
+
+
+class _Descending:
+    """
+    Inverte a comparação de um texto, para ordená-lo em ordem decrescente com a mesma chave (os números são apenas
+    negados, o que é bem mais rápido de comparar).
+    """
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+
+class Selection:
+    """
+    Ordenação e paginação pedidas em uma consulta:
+    - `column` e `descending`: a coluna de `?sort=` e a direção (None quando a ordem original é mantida).
+    - `count`: a quantidade de linhas de `?top=` ou `?limit=` (None para todas).
+    - `paginated`: se a resposta deve informar o cursor da próxima página (`?limit=`).
+    - `after`: a chave da última linha da página anterior, lida de `?after=`.
+    """
+    def __init__(self, column=None, descending=False, count=None, paginated=False, after=None):
+        self.column = column
+        self.descending = descending
+        self.count = count
+        self.paginated = paginated
+        self.after = after
+
+    @property
+    def spec(self):
+        """
+        Ordenação no formato de `?sort=` ('' quando não há ordenação), guardada no cursor.
+        """
+        if self.column is None:
+            return ''
+        return f"-{self.column}" if self.descending else self.column
+
+    def key(self, row, position):
+        """
+        Chave de ordenação de uma linha: (ausente, tipo, valor, posição), com o tipo e o valor invertidos em ordem
+        decrescente. Sem ordenação, apenas a posição.
+        """
+        if self.column is None:
+            return (position,)
+        missing, kind, value = _sort_value(self.column, row.get(self.column))
+        return (missing, *self._directed(kind, value), position)
+
+    def _directed(self, kind, value):
+        """
+        Retorna (tipo, valor) na direção da ordenação: em ordem decrescente os textos vêm antes dos números, os números
+        são negados e os textos têm a comparação invertida.
+        """
+        if not self.descending:
+            return kind, value
+        if kind == _NUMBER:
+            return _TEXT, -value
+        return _NUMBER, _Descending(value)
+
+    def cursor(self, key):
+        """
+        Cursor da página seguinte à linha com a chave `key`.
+        """
+        values = [value.value if isinstance(value, _Descending) else value for value in key]
+        payload = json.dumps([self.spec] + values, separators=(',', ':')).encode('utf-8')
+        return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+    def parse_cursor(self, value):
+        """
+        Lê a chave guardada em um cursor. Lança `ValueError` se o cursor for inválido ou tiver sido gerado com outra
+        ordenação.
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)))
+        except (ValueError, TypeError):
+            raise ValueError("Cursor inválido em after.") from None
+        if not isinstance(payload, list) or not payload or payload[0] != self.spec:
+            raise ValueError("Cursor inválido em after: ele foi gerado com outra ordenação (sort).")
+        values = payload[1:]
+        if self.column is None:
+            if len(values) != 1 or not isinstance(values[0], int):
+                raise ValueError("Cursor inválido em after.")
+            return (values[0],)
+        if (len(values) != 4 or not isinstance(values[0], bool) or values[1] not in (_NUMBER, _TEXT)
+                or isinstance(values[1], bool) or not isinstance(values[3], int)):
+            raise ValueError("Cursor inválido em after.")
+        missing, kind, value, position = values
+        if (kind == _TEXT) != self.descending:
+            if not isinstance(value, str):
+                raise ValueError("Cursor inválido em after.")
+            return (missing, *self._directed(_TEXT, value), position)
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise ValueError("Cursor inválido em after.")
+        return (missing, kind, value, position)
+
+
+def _number(text):
+    """
+    Converte um texto como '100' ou '12.5' em número, ou retorna None se ele não for um número.
+    """
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        number = float(text)
+    except ValueError:
+        return None
+    return None if math.isnan(number) else number
+
+
+def _sort_value(column, value):
+    """
+    Retorna (ausente, tipo, valor) para a ordenação. As métricas são sempre números. Nas demais colunas, números e
+    textos que representam números são comparados como números, e os outros valores como texto; assim um campo extra
+    numérico fica na ordem 9, 25, 100 e não '100', '25', '9'. Valores ausentes recebem um valor neutro, para que possam
+    ser comparados entre si.
+    """
+    if column in METRIC_COLUMNS:
+        number, missing = parse_metric(value)
+        return missing, _NUMBER, number
+    if value is None or value == '' or value == 'N/A':
+        return True, _NUMBER, 0
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return (True, _NUMBER, 0) if isinstance(value, float) and math.isnan(value) else (False, _NUMBER, value)
+    text = value if isinstance(value, str) else str(value)
+    number = _number(text.strip()) if isinstance(value, str) else None
+    if number is not None:
+        return False, _NUMBER, number
+    return False, _TEXT, text
+
+
+def _parse_count(value, name):
+    """
+    Interpreta `?top=` e `?limit=`: um inteiro entre 1 e `MAX_LIMIT`. Lança `ValueError` caso contrário.
+    """
+    try:
+        count = int(value)
+    except ValueError:
+        raise ValueError(f"Valor inválido em {name}: {value}. Use um número inteiro positivo.") from None
+    if not 1 <= count <= MAX_LIMIT:
+        raise ValueError(f"Valor inválido em {name}: {value}. Use um número entre 1 e {MAX_LIMIT}.")
+    return count
+
+
+def parse_selection(args, headers=None):
+    """
+    Interpreta `?sort=`, `?top=`, `?limit=` e `?after=` (`args`, como `request.args`). `headers` são as colunas do
+    relatório aceitas em `?sort=`; sem elas (colunas ainda desconhecidas, como em `?columns=all`), qualquer nome é
+    aceito.
+    Retorna None quando nenhum parâmetro é informado, para que o relatório seja enviado inteiro como antes.
+    Lança `ValueError` se algum parâmetro for inválido ou se eles forem combinados de forma inválida.
+    """
+    sort, top, limit, after = (args.get(name) for name in ('sort', 'top', 'limit', 'after'))
+    if not any((sort, top, limit, after)):
+        return None
+    selection = Selection()
+    if sort:
+        sort = sort.strip()
+        descending = sort.startswith('-')
+        column = sort.lstrip('-+').strip()
+        if not column or (headers is not None and column not in headers):
+            accepted = f" Use {', '.join(headers)}." if headers is not None else ""
+            raise ValueError(f"Coluna inválida em sort: {column or sort}.{accepted}")
+        selection.column, selection.descending = column, descending
+    if top:
+        if limit or after:
+            raise ValueError("top não pode ser combinado com limit ou after.")
+        if selection.column is None:
+            raise ValueError("top requer uma ordenação em sort, como sort=-spend.")
+        selection.count = _parse_count(top, 'top')
+    if limit:
+        selection.count = _parse_count(limit, 'limit')
+        selection.paginated = True
+    if after:
+        selection.after = selection.parse_cursor(after.strip())
+        selection.paginated = True
+    return selection
+
+
+def select_rows(rows, selection):
+    """
+    Seleciona as linhas pedidas de um iterável (por exemplo, as linhas que chegam da API ou as de um resumo). Com
+    ordenação e quantidade, apenas as melhores linhas ficam em um heap; sem ordenação, as linhas já estão na ordem e a
+    leitura para assim que a página fica completa.
+    Retorna (linhas, cursor da próxima página ou None).
+    """
+    keyed = ((selection.key(row, position), row) for position, row in enumerate(rows))
+    if selection.after is not None:
+        keyed = (item for item in keyed if selection.after < item[0])
+    if selection.column is None:
+        selected = list(islice(keyed, selection.count + 1)) if selection.count is not None else list(keyed)
+    elif selection.count is not None:
+        selected = heapq.nsmallest(selection.count + 1, keyed, key=lambda item: item[0])
+    else:
+        selected = sorted(keyed, key=lambda item: item[0])
+    return _page(selected, selection)
+
+
+def _page(selected, selection):
+    """
+    Separa as linhas da página do item seguinte, usado apenas para saber se existe uma próxima página.
+    """
+    if selection.count is None or len(selected) <= selection.count:
+        return [row for _, row in selected], None
+    selected = selected[:selection.count]
+    next_cursor = selection.cursor(selected[-1][0]) if selection.paginated else None
+    return [row for _, row in selected], next_cursor
+
+
+class RowIndex:
+    """
+    Linhas de um relatório pronto com os índices ordenados de cada ordenação já pedida. Os índices são montados na
+    primeira consulta (O(n log n)) e reaproveitados enquanto o snapshot for o mesmo; as consultas seguintes custam
+    O(log n + k).
+    """
+    def __init__(self, rows):
+        self.rows = rows
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def keys(self, selection):
+        """
+        Chaves de todas as linhas na ordem de `selection`, cada uma terminando com a posição da linha.
+        """
+        spec = selection.spec
+        keys = self._keys.get(spec)
+        if keys is None:
+            with self._lock:
+                keys = self._keys.get(spec)
+                if keys is None:
+                    keys = sorted(selection.key(row, position) for position, row in enumerate(self.rows))
+                    self._keys[spec] = keys
+        return keys
+
+    def select(self, selection):
+        """
+        Seleciona as linhas pedidas. Retorna (linhas, cursor da próxima página ou None), como select_rows().
+        """
+        if selection.column is None:
+            start = selection.after[0] + 1 if selection.after is not None else 0
+            end = start + selection.count + 1 if selection.count is not None else len(self.rows)
+            positions = range(max(start, 0), min(end, len(self.rows)))
+            return _page([((position,), self.rows[position]) for position in positions], selection)
+        keys = self.keys(selection)
+        start = bisect_right(keys, selection.after) if selection.after is not None else 0
+        end = start + selection.count + 1 if selection.count is not None else len(keys)
+        return _page([(key, self.rows[key[-1]]) for key in keys[start:end]], selection)
@@ -0,0 +1,255 @@
+# profiling.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+As métricas de '/metrics' mostram que um relatório está lento, mas não onde o tempo é gasto: na rede, na leitura do
+JSON, na agregação ou na montagem do CSV. Para investigar uma requisição específica foi criado este modo de perfil,
+desativado por padrão (`PROFILING_ENABLED`) e ativado por requisição pelo cabeçalho `X-Profile: 1` ou por `?profile=1`:
+
+1. A requisição inteira é executada sob o `cProfile`, assim como as tarefas que ela envia aos pools de threads de
+   view.py (cada tarefa com o seu próprio perfil, juntados no final).
+2. Os trechos marcados com `phase()` somam o tempo de cada fase: 'fetch' (requisições à API), 'parse' (leitura do JSON),
+   'aggregate' (resumos), 'serialize' (montagem do CSV) e 'wait' (tempo da rota esperando as buscas em paralelo).
+   Fases dentro de outras fases são descontadas da fase externa. Como as buscas acontecem em várias threads ao mesmo
+   tempo, a soma das fases pode passar do tempo total da requisição.
+3. Ao final do envio da resposta o resultado é guardado, junto com as funções que mais gastaram tempo, e pode ser
+   consultado em '/profiles/<id>' (o id é informado no cabeçalho `X-Profile-Id` da resposta).
+
+Sem um perfil ativo, `phase()` apenas consulta uma variável de contexto, então as marcações não pesam nas demais
+requisições.
+"""
+import cProfile
+import contextvars
+import itertools
+import pstats
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager, nullcontext
+from config import PROFILE_STORE_SIZE, PROFILE_TOP_FUNCTIONS
+"""
+A biblioteca `cProfile` mede o tempo de cada função e a `pstats` junta e ordena os resultados.
+A biblioteca `contextvars` guarda o perfil da requisição atual, que é levado para as tarefas enviadas aos pools de threads.
+A biblioteca `itertools` gera os ids dos perfis.
+A biblioteca `threading` fornece a trava dos perfis guardados e a pilha de fases de cada thread.
+A biblioteca `time` mede a duração das fases.
+O `OrderedDict` guarda os últimos perfis, descartando os mais antigos.
+O `contextmanager` cria as marcações de fase e o `nullcontext` é usado quando não há perfil ativo.
+`PROFILE_STORE_SIZE` define quantos perfis ficam guardados e `PROFILE_TOP_FUNCTIONS` quantas funções são listadas.
+"""
+
+PHASES = ('fetch', 'parse', 'aggregate', 'serialize', 'wait')
+"""
+Fases medidas em cada requisição.
+"""
+
+_current = contextvars.ContextVar("stract_profile", default=None)
+"""
+Perfil da requisição em andamento, ou None quando ela não está sendo perfilada.
+"""
+
+
+class RequestProfile:
+    """
+    Perfil de uma requisição: o tempo de cada fase e os perfis do `cProfile` da thread da rota e das tarefas enviadas
+    aos pools de threads.
+    """
+    def __init__(self, profile_id, path):
+        self.id = profile_id
+        self.path = path
+        self.started_at = time.time()
+        self.start_time = time.perf_counter()
+        self.total = None
+        self.phases = dict.fromkeys(PHASES, 0.0)
+        self._profilers = []
+        self._stacks = threading.local()
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Soma ao tempo da fase `name` a duração do bloco, descontando as fases internas. Cada thread tem sua própria
+        pilha de fases, e o bloco não pode conter um `yield`, senão a pilha ficaria inconsistente.
+        """
+        stack = getattr(self._stacks, 'stack', None)
+        if stack is None:
+            stack = self._stacks.stack = []
+        now = time.perf_counter()
+        if stack:
+            outer = stack[-1]
+            self.add(outer[0], now - outer[1])
+        entry = [name, now]
+        stack.append(entry)
+        try:
+            yield
+        finally:
+            now = time.perf_counter()
+            stack.pop()
+            self.add(name, now - entry[1])
+            if stack:
+                stack[-1][1] = now
+
+    def start_profiler(self):
+        """
+        Inicia um `cProfile` na thread atual e o retorna, ou None se a thread já estiver sendo perfilada por outra
+        ferramenta.
+        """
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            return None
+        with self._lock:
+            self._profilers.append(profiler)
+        return profiler
+
+    def top_functions(self, limit=PROFILE_TOP_FUNCTIONS):
+        """
+        Junta os perfis de todas as threads e retorna as `limit` funções com maior tempo próprio (sem contar as
+        funções chamadas por elas).
+        """
+        with self._lock:
+            profilers = list(self._profilers)
+        stats = None
+        for profiler in profilers:
+            try:
+                stats = pstats.Stats(profiler) if stats is None else stats.add(profiler)
+            except TypeError:
+                continue
+        if stats is None:
+            return []
+        entries = sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            {
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "tottime": round(tottime, 6),
+                "cumtime": round(cumtime, 6)
+            }
+            for (filename, line, name), (_, calls, tottime, cumtime, _) in entries
+        ]
+
+    def summary(self):
+        with self._lock:
+            phases = {name: round(seconds, 6) for name, seconds in self.phases.items()}
+        return {
+            "id": self.id,
+            "path": self.path,
+            "started_at": self.started_at,
+            "total_seconds": None if self.total is None else round(self.total, 6),
+            "phases": phases
+        }
+
+    def report(self):
+        return {**self.summary(), "top_functions": self.top_functions()}
+
+
+_ids = itertools.count(1)
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
+
+
+def start(path):
+    """
+    Cria o perfil de uma requisição, o torna o perfil atual e inicia o `cProfile` na thread da rota.
+    Retorna (perfil, token, profiler); `finish()` recebe os mesmos valores.
+    """
+    profile = RequestProfile(next(_ids), path)
+    token = _current.set(profile)
+    profiler = profile.start_profiler()
+    return profile, token, profiler
+
+
+def finish(profile, profiler):
+    """
+    Encerra o perfil e o guarda entre os últimos `PROFILE_STORE_SIZE`.
+    """
+    if profiler is not None:
+        profiler.disable()
+    profile.total = time.perf_counter() - profile.start_time
+    with _profiles_lock:
+        _profiles[profile.id] = profile
+        while len(_profiles) > PROFILE_STORE_SIZE:
+            _profiles.popitem(last=False)
+
+
+def reset(token):
+    """
+    Desfaz o perfil atual da thread, para que as próximas requisições atendidas por ela não sejam perfiladas.
+    """
+    _current.reset(token)
+
+
+def current():
+    return _current.get()
+
+
+def get_profile(profile_id):
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def recent_profiles():
+    """
+    Resumos dos perfis guardados, do mais recente para o mais antigo.
+    """
+    with _profiles_lock:
+        profiles = list(_profiles.values())
+    return [profile.summary() for profile in reversed(profiles)]
+
+
+def phase(name):
+    """
+    Marca um trecho como parte da fase `name` no perfil da requisição atual. Sem perfil ativo não faz nada.
+    """
+    profile = _current.get()
+    return nullcontext() if profile is None else profile.phase(name)
+
+
+def timed_iter(name, iterable, profile=None):
+    """
+    Gera os itens de `iterable`, somando à fase `name` o tempo gasto para obter cada um. Usado nos geradores, em que a
+    fase não pode envolver o `yield`. O perfil é lido na criação, já que o corpo das respostas em pedaços é gerado
+    depois que a rota retorna.
+    """
+    profile = profile or _current.get()
+    if profile is None:
+        return iterable
+    return _timed_iter(profile, name, iter(iterable))
+
+
+def _timed_iter(profile, name, iterator):
+    while True:
+        with profile.phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
+
+
+def wrap(func):
+    """
+    Prepara `func` para ser executada em um pool de threads levando o perfil da requisição atual: na thread do pool o
+    perfil passa a ser o atual e a função roda sob um `cProfile` próprio da tarefa. Sem perfil ativo retorna `func`.
+    """
+    profile = _current.get()
+    if profile is None:
+        return func
+
+    def profiled(*args, **kwargs):
+        token = _current.set(profile)
+        profiler = profile.start_profiler()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            _current.reset(token)
+
+    return profiled
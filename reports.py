@@ -0,0 +1,133 @@
+# reports.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+No início os relatórios eram montados concatenando strings (`csv_data += ",".join(row)`), o que mantinha o relatório
+inteiro em memória, ficava mais lento a cada linha adicionada e não tratava valores com vírgulas ou aspas. Além disso,
+o primeiro byte só era enviado depois que a última requisição à API terminasse.
+
+Este arquivo reúne o que é comum a todos os relatórios: os cabeçalhos e a geração do CSV em pedaços, usando o módulo
+`csv` da biblioteca padrão, para que as rotas possam enviar as linhas ao cliente à medida que os dados chegam.
+
+Também interpreta o parâmetro `?columns=`, com o qual cada relatório declara as colunas de insights que precisa. Apenas
+essas colunas são pedidas à API (ver view.py), o que reduz o tamanho das respostas, o tempo de leitura e a memória.
+"""
+import csv
+import io
+import re
+"""
+A biblioteca `csv` é usada para escrever as linhas com o escape correto dos valores.
+A biblioteca `io` fornece o buffer em memória onde cada pedaço do CSV é escrito antes de ser enviado.
+A biblioteca `re` valida os nomes das colunas pedidas em `?columns=`.
+"""
+
+REPORT_HEADERS = ['Platform', 'Ad Name', 'clicks', 'impressions', 'spend', 'cpc', 'ctr']
+"""
+Colunas dos relatórios, na ordem em que aparecem no CSV.
+"""
+
+TEXT_HEADERS = REPORT_HEADERS[:2]
+REPORT_COLUMNS = tuple(REPORT_HEADERS[2:])
+"""
+Colunas de identificação, presentes em todos os relatórios, e colunas de insights usadas quando `?columns=` não é
+informado.
+"""
+
+ALL_COLUMNS = 'all'
+"""
+Valor de `?columns=` que pede todos os campos da plataforma (ou, em '/geral', a união dos campos de todas elas).
+"""
+
+_COLUMN_NAME = re.compile(r'^[A-Za-z0-9_]+$')
+
+CSV_CHUNK_SIZE = 16 * 1024
+"""
+Tamanho aproximado, em caracteres, de cada pedaço enviado ao cliente. Enviar linha a linha deixaria a resposta lenta por
+excesso de escritas pequenas; acumular um pouco antes de enviar mantém a memória constante sem esse custo.
+"""
+
+
+def csv_chunks(rows, headers=REPORT_HEADERS, write_header=True):
+    """
+    Gera o CSV em pedaços de até `CSV_CHUNK_SIZE` caracteres, começando pela linha de cabeçalho (a menos que
+    `write_header` seja falso, para montar trechos que depois são concatenados).
+    `rows` pode ser qualquer iterável de dicionários (inclusive um gerador); apenas o pedaço atual fica em memória.
+    Colunas ausentes em uma linha ficam vazias.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if write_header:
+        writer.writerow(headers)
+    for row in rows:
+        writer.writerow([row.get(header, "") for header in headers])
+        if buffer.tell() >= CSV_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def parse_columns(value, allowed=None):
+    """
+    Interpreta o parâmetro `?columns=`, como 'clicks,spend'. Retorna `REPORT_COLUMNS` quando ele não é informado,
+    `ALL_COLUMNS` para 'all' ou a tupla de colunas, sem repetições e na ordem pedida.
+    Com `allowed`, apenas essas colunas são aceitas e 'all' equivale a todas elas.
+    Lança `ValueError` se alguma coluna for inválida.
+    """
+    if value is None or not value.strip():
+        return REPORT_COLUMNS
+    if value.strip() == ALL_COLUMNS:
+        return tuple(allowed) if allowed is not None else ALL_COLUMNS
+    columns = []
+    for column in value.split(','):
+        column = column.strip()
+        if not column or column in columns:
+            continue
+        if not _COLUMN_NAME.match(column) or (allowed is not None and column not in allowed):
+            accepted = ', '.join(allowed) if allowed is not None else "letras, números e '_'"
+            raise ValueError(f"Coluna inválida: {column}. Use {accepted}.")
+        columns.append(column)
+    if not columns:
+        raise ValueError("Nenhuma coluna informada em columns.")
+    return tuple(columns)
+
+
+def report_headers(columns):
+    """
+    Cabeçalhos de um relatório com as colunas de insights `columns`.
+    """
+    return TEXT_HEADERS + list(columns)
+
+
+def covered_by(columns, available=REPORT_COLUMNS):
+    """
+    Indica se todas as colunas pedidas fazem parte de `available`, ou seja, se o relatório pode ser montado a partir de
+    linhas que já têm essas colunas (como as dos snapshots) sem consultar a API.
+    """
+    return columns != ALL_COLUMNS and set(columns) <= set(available)
+
+
+def summary_row(summary, platform=None):
+    """
+    Converte um grupo de GroupAggregator.results() (ou InsightsTable.group_by()) em uma linha de relatório.
+    As colunas de texto que não fazem parte do agrupamento ficam vazias; `platform` preenche a coluna 'Platform' quando
+    o relatório já é de uma única plataforma. Contagens saem inteiras, o gasto com duas casas e CPC/CTR com três.
+    """
+    return {
+        'Platform': summary['platform'] or platform or '',
+        'Ad Name': summary['account'] or '',
+        'clicks': int(summary['clicks']),
+        'impressions': int(summary['impressions']),
+        'spend': round(summary['spend'], 2),
+        'cpc': round(summary['cpc'], 3),
+        'ctr': round(summary['ctr'], 3)
+    }
+
+
+def render_csv(rows, headers=REPORT_HEADERS, write_header=True):
+    """
+    Monta o CSV completo como uma única string, para os relatórios que ficam guardados em memória.
+    """
+    return "".join(csv_chunks(rows, headers, write_header))
@@ -0,0 +1,318 @@
+# scheduler.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Com as requisições feitas em paralelo, a API externa passa a limitar a quantidade de requisições por segundo,
+respondendo com o status 429 (e, às vezes, com o cabeçalho `Retry-After`). Antes esse status era tratado como qualquer
+outro erro: a mensagem era exibida e as linhas da conta ficavam de fora do relatório.
+
+Para resolver isso, todas as requisições à API passam por um agendador central, que:
+
+1. Libera as requisições por um "balde de fichas" (token bucket): cada requisição consome uma ficha e as fichas são
+   repostas na taxa permitida, com um pequeno acúmulo (`burst`). Sem limite configurado, as requisições passam
+   livremente até a primeira resposta 429.
+2. Ajusta a taxa sozinho: a cada 429 a taxa cai pela metade (partindo da vazão medida, se ainda não havia limite) e,
+   havendo `Retry-After`, nenhuma requisição é liberada até o prazo informado. A cada resposta bem-sucedida a taxa
+   volta a subir aos poucos, até a taxa em que o último 429 foi recebido, mantendo a vazão próxima do limite permitido
+   pela API.
+3. Tem duas classes de prioridade: as requisições dos relatórios pedidos pelo usuário (`INTERACTIVE`) são liberadas
+   antes das atualizações em segundo plano e das páginas buscadas antecipadamente (`BACKGROUND`).
+
+Sem limite de taxa, as requisições não esperam no agendador, e sim na fila do pool de threads que faz as buscas
+(view.py). Por isso esse pool é um `PriorityExecutor`: as tarefas de um relatório pedido pelo usuário passam na frente
+das tarefas da atualização em segundo plano que ainda estão na fila, mesmo antes do primeiro 429.
+
+A requisição que recebe 429 é repetida pelo cliente HTTP (client.py) depois de passar novamente pelo agendador, então
+nenhuma linha é perdida por causa do limite.
+"""
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager
+from config import RATE_LIMIT, RATE_BURST, RATE_MIN, RATE_INCREASE, RATE_DECREASE
+from metrics import registry
+"""
+A biblioteca `contextvars` guarda a prioridade das requisições feitas no contexto atual (rota, tarefa ou thread).
+A biblioteca `heapq` ordena as requisições que esperam por prioridade e ordem de chegada, e `itertools` gera essa ordem.
+A biblioteca `threading` fornece a condição usada para esperar pelas fichas.
+A biblioteca `time` fornece o relógio monotônico usado na reposição das fichas e no `Retry-After`.
+O `deque` guarda os instantes das últimas liberações, usados para medir a vazão.
+O `Executor` e o `Future` são a base do `PriorityExecutor`, que pode ser usado no lugar de um `ThreadPoolExecutor`.
+O `contextmanager` cria os blocos `prioritized()` e `background()`, que definem a prioridade das requisições feitas
+dentro deles.
+Os valores de `config` definem a taxa inicial, o acúmulo de fichas e o ajuste da taxa, e o `registry` expõe o estado do
+agendador em '/metrics'.
+"""
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("stract_priority", default=INTERACTIVE)
+"""
+Prioridade das requisições feitas no contexto atual.
+"""
+
+_THROTTLE_INTERVAL = 1.0
+"""
+Intervalo mínimo, em segundos, entre duas reduções da taxa. Várias requisições simultâneas costumam receber 429 ao
+mesmo tempo, e todas elas juntas devem contar como um único sinal.
+"""
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def prioritized(priority):
+    """
+    Define a prioridade das requisições feitas dentro do bloco.
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def background():
+    """
+    Faz com que as requisições feitas dentro do bloco (e nas tarefas enviadas aos pools de view.py a partir dele) sejam
+    tratadas como trabalho em segundo plano.
+    """
+    return prioritized(BACKGROUND)
+
+
+class PriorityExecutor(Executor):
+    """
+    Pool de threads com a mesma interface do `ThreadPoolExecutor`, mas com a fila ordenada por prioridade: a tarefa
+    recebe a prioridade do contexto de quem a enviou (ver prioritized()) e, entre as tarefas que esperam, as de maior
+    prioridade e, dentro da mesma prioridade, as mais antigas são executadas primeiro. As tarefas já em execução não
+    são interrompidas. As threads são criadas conforme a necessidade, até `max_workers`.
+    """
+    def __init__(self, max_workers, thread_name_prefix="stract-priority"):
+        self.max_workers = max_workers
+        self.thread_name_prefix = thread_name_prefix
+        self._queue = []
+        self._sequence = itertools.count()
+        self._threads = []
+        self._idle = 0
+        self._shutdown = False
+        self._cond = threading.Condition()
+
+    def submit(self, fn, /, *args, **kwargs):
+        future = Future()
+        with self._cond:
+            if self._shutdown:
+                raise RuntimeError("Não é possível enviar tarefas depois de shutdown().")
+            heapq.heappush(self._queue, (current_priority(), next(self._sequence), future, fn, args, kwargs))
+            if len(self._queue) > self._idle and len(self._threads) < self.max_workers:
+                thread = threading.Thread(target=self._work, name=f"{self.thread_name_prefix}_{len(self._threads)}",
+                                          daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            else:
+                self._cond.notify()
+        return future
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue and not self._shutdown:
+                    self._idle += 1
+                    self._cond.wait()
+                    self._idle -= 1
+                if not self._queue:
+                    return
+                _, _, future, fn, args, kwargs = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = fn(*args, **kwargs)
+            except BaseException as error:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def waiting(self):
+        """
+        Quantidade de tarefas na fila, por prioridade.
+        """
+        with self._cond:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for entry in self._queue:
+                waiting[PRIORITY_NAMES.get(entry[0], str(entry[0]))] += 1
+            return waiting
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        with self._cond:
+            self._shutdown = True
+            if cancel_futures:
+                for entry in self._queue:
+                    entry[2].cancel()
+                self._queue.clear()
+            self._cond.notify_all()
+            threads = list(self._threads)
+        if wait:
+            for thread in threads:
+                thread.join()
+
+
+class RateScheduler:
+    """
+    Balde de fichas com taxa ajustável, pausa por `Retry-After` e fila por prioridade.
+    `rate` igual a None significa sem limite, até a primeira resposta 429. `max_rate` é o limite configurado e
+    `ceiling` a taxa em que o último 429 foi recebido: a taxa volta a subir depois de um 429, mas sem passar de nenhum
+    dos dois.
+    """
+    def __init__(self, rate=RATE_LIMIT or None, burst=RATE_BURST, min_rate=RATE_MIN, increase=RATE_INCREASE,
+                 decrease=RATE_DECREASE):
+        self.rate = rate
+        self.max_rate = rate
+        self.ceiling = None
+        self.burst = max(1.0, burst)
+        self.min_rate = min_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_throttle = float("-inf")
+        self._grants = deque(maxlen=64)
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._cond = threading.Condition()
+        self.throttles = 0
+
+    def _refill(self, now):
+        if self.rate is not None:
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _grant(self, now):
+        if self.rate is not None:
+            self._tokens -= 1
+        self._grants.append(now)
+
+    def _measured_rate(self, now):
+        """
+        Vazão das últimas liberações, em requisições por segundo.
+        """
+        if len(self._grants) < 2:
+            return self.min_rate
+        elapsed = max(now - self._grants[0], 1e-3)
+        return len(self._grants) / elapsed
+
+    def acquire(self, priority=None):
+        """
+        Espera até a requisição poder ser feita e retorna quanto tempo esperou, em segundos.
+        Entre as requisições que esperam, as de maior prioridade e, dentro da mesma prioridade, as mais antigas são
+        liberadas primeiro.
+        """
+        priority = current_priority() if priority is None else priority
+        start = time.monotonic()
+        entry = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == entry:
+                        if now < self._blocked_until:
+                            timeout = self._blocked_until - now
+                        elif self.rate is not None and self._tokens < 1:
+                            timeout = (1 - self._tokens) / self.rate
+                        else:
+                            heapq.heappop(self._waiters)
+                            self._grant(now)
+                            self._cond.notify_all()
+                            break
+                    else:
+                        timeout = None
+                    self._cond.wait(timeout)
+            except BaseException:
+                if entry in self._waiters:
+                    self._waiters.remove(entry)
+                    heapq.heapify(self._waiters)
+                    self._cond.notify_all()
+                raise
+        waited = time.monotonic() - start
+        scheduler_wait.observe(waited, priority=PRIORITY_NAMES.get(priority, str(priority)))
+        return waited
+
+    def try_acquire(self):
+        """
+        Libera a requisição apenas se isso puder ser feito agora sem passar na frente de ninguém. Usado para requisições
+        opcionais, como as cópias de requisições lentas.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self._refill(now)
+            if self._waiters or now < self._blocked_until or (self.rate is not None and self._tokens < 1):
+                return False
+            self._grant(now)
+            return True
+
+    def on_success(self):
+        """
+        Sobe a taxa aos poucos depois de uma resposta aceita pela API: cerca de `increase` requisições por segundo a
+        cada segundo, sem passar do limite configurado (quando existe) nem da taxa em que o último 429 foi recebido.
+        """
+        if self.rate is None:
+            return
+        with self._cond:
+            self.rate += self.increase / self.rate
+            for limit in (self.max_rate, self.ceiling):
+                if limit is not None:
+                    self.rate = min(self.rate, limit)
+
+    def on_throttle(self, retry_after=None):
+        """
+        Reage a uma resposta 429: reduz a taxa por `decrease` (no máximo uma vez a cada segundo), guarda a taxa anterior
+        como teto da recuperação (`ceiling`), esvazia o balde e, se a API informou `Retry-After`, pausa todas as
+        liberações até o prazo.
+        """
+        with self._cond:
+            now = time.monotonic()
+            self.throttles += 1
+            self._refill(now)
+            if now - self._last_throttle >= _THROTTLE_INTERVAL:
+                base = self.rate if self.rate is not None else self._measured_rate(now)
+                self.ceiling = max(self.min_rate, base)
+                self.rate = max(self.min_rate, base * self.decrease)
+                self._last_throttle = now
+                self._tokens = 0.0
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            waiting = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                waiting[PRIORITY_NAMES.get(priority, str(priority))] += 1
+            return {"rate": self.rate, "ceiling": self.ceiling, "throttles": self.throttles, "waiting": waiting}
+
+
+scheduler_wait = registry.histogram(
+    "stract_scheduler_wait_seconds", "Tempo de espera no agendador antes de cada requisição à API, por prioridade.",
+    ("priority",))
+
+scheduler = RateScheduler()
+"""
+Instância única do agendador, usada pelo cliente HTTP (client.py).
+"""
+
+registry.callback(
+    "stract_rate_limit_rps", "Taxa atual de requisições por segundo liberada pelo agendador (0 = sem limite).",
+    lambda: [({}, scheduler.rate or 0.0)])
+registry.callback(
+    "stract_scheduler_waiting", "Requisições esperando no agendador, por prioridade.",
+    lambda: [({"priority": name}, count) for name, count in scheduler.stats()["waiting"].items()])
@@ -0,0 +1,229 @@
+# shared_cache.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Em produção o servidor roda com vários processos (workers) na mesma máquina, e cada um deles mantinha o seu próprio
+cache: cada processo buscava na API as mesmas plataformas, contas e campos, percorria a API inteira para montar o seu
+snapshot e guardava a sua cópia de cada relatório. A carga na API e a memória cresciam junto com a quantidade de
+processos.
+
+Este arquivo fornece um cache compartilhado entre os processos, guardado em um arquivo SQLite (`SHARED_CACHE_PATH`):
+
+1. Cada entrada tem uma chave, o valor em bytes e o prazo de validade, em horário do sistema (o relógio monotônico não
+   é o mesmo entre processos).
+2. Uma trava por chave, com prazo (`SHARED_CACHE_LEASE`), garante que apenas um processo por vez busque o valor de uma
+   chave. Os demais entregam o valor antigo, se houver, ou esperam o valor novo ser gravado. Se o processo que tem a
+   trava morrer, ela expira sozinha.
+3. O arquivo usa o modo WAL do SQLite, em que as leituras não esperam pelas escritas, e cada gravação é uma transação:
+   um processo nunca lê um valor gravado pela metade.
+
+Ele é usado para as respostas de plataformas, contas e campos (view.py), para os relatórios já montados e comprimidos
+(app.py) e para escolher qual processo atualiza o snapshot (snapshots.py). Sem `SHARED_CACHE_PATH`, `shared_cache` é
+None e cada processo funciona sozinho, como antes.
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from config import SHARED_CACHE_PATH, SHARED_CACHE_LEASE
+from metrics import registry
+"""
+A biblioteca `json` converte os valores guardados para bytes e de volta.
+A biblioteca `logging` registra os erros de acesso ao arquivo, com o traceback.
+A biblioteca `os` identifica o processo dono de cada trava.
+A biblioteca `sqlite3` acessa o arquivo compartilhado, com as travas de arquivo do próprio SQLite entre os processos.
+A biblioteca `threading` mantém uma conexão por thread, já que uma conexão SQLite não deve ser usada por várias threads.
+A biblioteca `time` fornece o horário usado nos prazos e a espera entre as consultas pelo valor de outro processo.
+O `SHARED_CACHE_PATH` é o arquivo do cache e o `SHARED_CACHE_LEASE` o prazo das travas.
+O `registry` expõe em '/metrics' as consultas ao cache compartilhado.
+"""
+
+logger = logging.getLogger(__name__)
+
+_POLL_INTERVAL = 0.05
+"""
+Intervalo, em segundos, entre as consultas de um processo que espera o valor que outro processo está buscando.
+"""
+
+_BUSY_TIMEOUT = 10
+"""
+Tempo máximo, em segundos, que uma consulta espera enquanto outro processo grava no arquivo. As gravações são pequenas,
+então a espera costuma ser de milissegundos.
+"""
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS leases (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires_at REAL NOT NULL)"
+)
+
+
+def encode_json(value):
+    return json.dumps(value, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(data):
+    return json.loads(data)
+
+
+class SharedCache:
+    """
+    Cache em um arquivo SQLite, compartilhado por todos os processos que usam o mesmo `path`.
+    Erros de acesso ao arquivo não interrompem as rotas: a consulta é tratada como uma falta e o processo busca o valor
+    sozinho.
+    """
+    def __init__(self, path, lease=SHARED_CACHE_LEASE):
+        self.path = path
+        self.lease = lease
+        self._local = threading.local()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.errors = 0
+
+    def _connection(self):
+        """
+        Conexão da thread atual, criada na primeira consulta. O modo WAL e as tabelas são configurados por cada conexão
+        (os comandos não fazem nada se já tiverem sido executados por outro processo).
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=_BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            self._local.connection = connection
+        return connection
+
+    def _owner(self):
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def _error(self, action, key, error):
+        """
+        Conta e registra um erro de acesso ao arquivo. Chamado dentro do `except`, então o traceback é registrado junto.
+        """
+        self.errors += 1
+        logger.warning("Erro no cache compartilhado ao %s %s: %s", action, key, error, exc_info=True)
+
+    def get(self, key):
+        """
+        Retorna (valor em bytes, expira_em) da chave, mesmo se já vencido, ou None se ela não existir.
+        """
+        try:
+            return self._connection().execute(
+                "SELECT value, expires_at FROM entries WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error as error:
+            self._error("ler", key, error)
+            return None
+
+    def set(self, key, value, ttl):
+        """
+        Grava `value` (bytes) na chave, válido por `ttl` segundos.
+        """
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO entries (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, sqlite3.Binary(value), time.time() + ttl))
+        except sqlite3.Error as error:
+            self._error("gravar", key, error)
+
+    def acquire(self, key, lease=None):
+        """
+        Tenta pegar a trava da chave por `lease` segundos (ou `SHARED_CACHE_LEASE`), sem esperar. Retorna True se a
+        trava estava livre, vencida ou já pertencia a esta thread. Com erro no arquivo retorna True, para que o
+        processo siga sozinho.
+        """
+        now = time.time()
+        try:
+            cursor = self._connection().execute(
+                "INSERT INTO leases (key, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+                "WHERE leases.expires_at < ? OR leases.owner = excluded.owner",
+                (key, self._owner(), now + (self.lease if lease is None else lease), now))
+            return cursor.rowcount == 1
+        except sqlite3.Error as error:
+            self._error("travar", key, error)
+            return True
+
+    def release(self, key):
+        """
+        Libera a trava da chave, se ela pertencer a esta thread.
+        """
+        try:
+            self._connection().execute("DELETE FROM leases WHERE key = ? AND owner = ?", (key, self._owner()))
+        except sqlite3.Error as error:
+            self._error("liberar", key, error)
+
+    def get_or_load(self, key, loader, ttl, encode=encode_json, decode=decode_json):
+        """
+        Retorna o valor da chave, guardado por qualquer processo. Se ele não existir ou estiver vencido, apenas o
+        processo que conseguir a trava chama `loader()` e grava o resultado por `ttl` segundos; os demais entregam o
+        valor vencido, se houver, ou esperam o novo valor ser gravado. `encode` e `decode` convertem o valor para bytes
+        e de volta (JSON por padrão). Valores vazios não são guardados, como no TTLCache.
+        """
+        entry = self.get(key)
+        if entry is not None and time.time() < entry[1]:
+            self.hits += 1
+            return decode(entry[0])
+        waited = False
+        while True:
+            if self.acquire(key):
+                try:
+                    latest = self.get(key)
+                    if latest is not None and time.time() < latest[1]:
+                        self.hits += 1
+                        return decode(latest[0])
+                    self.misses += 1
+                    value = loader()
+                    if value:
+                        self.set(key, encode(value), ttl)
+                    return value
+                finally:
+                    self.release(key)
+            if entry is not None:
+                self.stale_hits += 1
+                return decode(entry[0])
+            if not waited:
+                self.waits += 1
+                waited = True
+            time.sleep(_POLL_INTERVAL)
+            entry = self.get(key)
+            if entry is not None:
+                self.hits += 1
+                return decode(entry[0])
+
+    def prune(self):
+        """
+        Remove as entradas vencidas há mais de um `lease` e as travas vencidas, para que o arquivo não cresça sem
+        limite com relatórios de versões antigas.
+        """
+        now = time.time()
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM entries WHERE expires_at < ?", (now - self.lease,))
+            connection.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+        except sqlite3.Error as error:
+            self._error("limpar", "entradas vencidas", error)
+
+    def stats(self):
+        return {"path": self.path, "hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses,
+                "waits": self.waits, "errors": self.errors}
+
+
+shared_cache = SharedCache(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
+"""
+Instância única do cache compartilhado, ou None quando `SHARED_CACHE_PATH` não é configurado.
+"""
+
+if shared_cache is not None:
+    registry.callback(
+        "stract_shared_cache_requests_total",
+        "Consultas ao cache compartilhado entre os processos, por resultado (wait = esperou por outro processo).",
+        lambda: [({"result": result}, getattr(shared_cache, attribute))
+                 for result, attribute in (("hit", "hits"), ("stale", "stale_hits"), ("miss", "misses"),
+                                           ("wait", "waits"), ("error", "errors"))],
+        type="counter")
@@ -0,0 +1,554 @@
+# snapshots.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Mesmo com as requisições em paralelo, cada acesso a `/geral` ou `/geral/resumo` percorria a API inteira antes de
+responder, então o tempo de resposta dependia da API e da quantidade de contas.
+
+Para resolver isso, foi criado um processo em segundo plano que mantém em memória os quatro relatórios já prontos
+("snapshot") e os atualiza periodicamente. A cada atualização:
+
+1. Os insights de cada conta são buscados e é calculado um hash das linhas recebidas.
+2. Apenas as contas cujo hash mudou têm o resumo parcial recalculado; as demais reaproveitam o da atualização anterior.
+3. Apenas as plataformas com alguma conta alterada têm o CSV e o resumo refeitos. O relatório geral é montado juntando
+   os trechos de CSV de cada plataforma, sem escrever novamente as linhas que não mudaram.
+4. O novo snapshot substitui o anterior de uma só vez, então as rotas sempre leem um conjunto consistente.
+
+Enquanto o primeiro snapshot não fica pronto, as rotas continuam consultando a API diretamente.
+
+Para que o servidor não comece vazio a cada reinício, os insights do último snapshot são gravados em um arquivo binário
+em colunas (ver InsightsTable.save()). Ao iniciar, esse arquivo é mapeado em memória e os relatórios são servidos a
+partir dele (`TableSnapshot`) enquanto a primeira atualização é feita. Os relatórios de cada plataforma e os CSVs desse
+snapshot são montados apenas quando pedidos (as linhas de uma plataforma são uma fatia das colunas mapeadas) e os
+resumos são calculados de forma vetorizada, então o primeiro relatório sai em milissegundos.
+
+Com vários processos na mesma máquina e o cache compartilhado configurado (ver shared_cache.py), apenas um processo
+por vez atualiza o snapshot: a cada rodada, quem conseguir a trava 'snapshot' percorre a API, grava o arquivo (que
+substitui o anterior de uma só vez) e publica o hash e o horário da atualização no cache compartilhado. Os demais
+processos apenas verificam essa publicação e, quando o hash muda, trocam o snapshot em uso pelo arquivo novo, mapeado
+em memória e, por isso, compartilhado entre todos pelo cache de páginas do sistema operacional. O processo que
+atualiza também passa a servir o arquivo que gravou, para que o mesmo hash (e o mesmo ETag) corresponda ao mesmo
+corpo em todos os processos.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections.abc import Mapping
+from functools import cached_property
+from aggregate import GroupAggregator
+from config import SNAPSHOT_INTERVAL, SNAPSHOT_PATH
+from ordering import RowIndex
+from reports import REPORT_HEADERS, render_csv, summary_row
+from store import InsightsTable
+from scheduler import background
+from shared_cache import shared_cache, encode_json, decode_json
+from view import get_platforms, fetch_all_accounts_and_fields, iter_account_results
+"""
+A biblioteca `hashlib` calcula o hash das linhas de cada conta, usado para detectar mudanças.
+A biblioteca `json` serializa as linhas de forma estável antes do hash.
+A biblioteca `logging` registra as atualizações e os erros ao gravar e ler o arquivo.
+A biblioteca `os` verifica se o arquivo do último snapshot existe.
+A biblioteca `threading` fornece a thread de atualização e as travas.
+A biblioteca `time` registra o momento de cada atualização.
+O `Mapping` dá aos relatórios das plataformas do snapshot lido do arquivo a interface de um dicionário.
+O `cached_property` monta os CSVs do snapshot lido do arquivo e os índices de ordenação apenas na primeira vez em que
+são pedidos.
+O `RowIndex` guarda os índices ordenados usados por `?sort=`, `?top=` e `?limit=`.
+O `GroupAggregator` calcula os resumos parciais por conta e por plataforma.
+O `SNAPSHOT_INTERVAL` define o intervalo entre as atualizações e o `SNAPSHOT_PATH` o arquivo do último snapshot.
+O `background` faz com que as requisições da atualização fiquem atrás das requisições dos relatórios no agendador.
+O `shared_cache` escolhe o processo que atualiza o snapshot e publica as atualizações para os demais processos.
+As funções de `reports` montam os CSVs, a `InsightsTable` grava e lê o arquivo e as funções de `view` buscam os dados
+da API.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def _digest(rows):
+    """
+    Calcula o hash das linhas de uma conta, independente da ordem das chaves de cada dicionário.
+    """
+    return hashlib.sha1(json.dumps(rows, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+SNAPSHOT_KEY = "snapshot"
+"""
+Chave do cache compartilhado com a trava da atualização e a última atualização publicada ({"digest", "generated_at"}).
+"""
+
+_FOLLOW_INTERVAL = 5.0
+"""
+Intervalo máximo, em segundos, entre as verificações de um processo que não atualiza o snapshot, para que ele passe a
+servir o arquivo novo pouco depois de ele ser gravado.
+"""
+
+
+class AccountPartial:
+    """
+    Resultado de uma conta em uma atualização: o hash, as linhas e o resumo parcial por (plataforma, conta).
+    """
+    def __init__(self, digest, rows):
+        self.digest = digest
+        self.rows = rows
+        self.aggregator = GroupAggregator(('platform', 'account')).update(rows)
+
+
+class PlatformReport:
+    """
+    Relatórios prontos de uma plataforma:
+    - `rows`: as linhas de insights, na ordem das contas.
+    - `body`: o CSV das linhas sem o cabeçalho, reaproveitado no relatório geral.
+    - `aggregator`: o resumo parcial por (plataforma, conta), usado para qualquer agrupamento pedido em `?group=`.
+    - `resumo_csv`: o CSV do resumo padrão da rota `/<plataforma>/resumo` (uma linha por conta).
+    - `digest`: hash que combina os hashes das contas, usado para identificar a versão dos dados.
+    - `modified_at`: instante em que os dados da plataforma mudaram (o relatório só é recriado quando mudam).
+    - `row_index`: as linhas com os índices ordenados de `?sort=`, montados na primeira consulta de cada ordenação.
+    """
+    def __init__(self, platform, partials):
+        self.platform = platform
+        self.digest = hashlib.sha1("".join(partial.digest for partial in partials).encode('utf-8')).hexdigest()
+        self.modified_at = time.time()
+        self.rows = [row for partial in partials for row in partial.rows]
+        self.row_count = len(self.rows)
+        self.body = render_csv(self.rows, write_header=False)
+        self.aggregator = GroupAggregator(('platform', 'account'))
+        for partial in partials:
+            self.aggregator.merge(partial.aggregator)
+        self.resumo_csv = self.summary_csv(('account',))
+
+    @property
+    def csv(self):
+        return render_csv([]) + self.body
+
+    @cached_property
+    def row_index(self):
+        return RowIndex(self.rows)
+
+    def summary_rows(self, keys):
+        """
+        Linhas do resumo da plataforma agrupado por `keys`, a partir do resumo parcial.
+        """
+        return [summary_row(summary, self.platform) for summary in self.aggregator.rollup(keys).results()]
+
+    def summary_csv(self, keys, headers=REPORT_HEADERS):
+        """
+        Monta o CSV do resumo da plataforma agrupado por `keys` com as colunas `headers`.
+        """
+        return render_csv(self.summary_rows(keys), headers)
+
+
+class ReportSnapshot:
+    """
+    Conjunto consistente dos relatórios gerados em uma atualização. Depois de criado não é mais alterado.
+    `modified_at` é o instante em que os dados mudaram pela última vez: o de `previous` (o snapshot anterior), se os
+    dados forem os mesmos, ou `generated_at`.
+    """
+    def __init__(self, platform_reports, generated_at, previous=None):
+        self.platform_reports = platform_reports
+        self.generated_at = generated_at
+        self.digest = hashlib.sha1("".join(report.digest for report in platform_reports.values())
+                                   .encode('utf-8')).hexdigest()
+        unchanged = previous is not None and previous.digest == self.digest
+        self.modified_at = previous.modified_at if unchanged else generated_at
+        self.row_count = sum(report.row_count for report in platform_reports.values())
+        self.geral_csv = render_csv([]) + "".join(report.body for report in platform_reports.values())
+        self.geral_resumo_csv = self.summary_csv(('platform',))
+
+    def aggregator(self):
+        """
+        Junta os resumos parciais de todas as plataformas em um único agregador por (plataforma, conta).
+        """
+        aggregator = GroupAggregator(('platform', 'account'))
+        for report in self.platform_reports.values():
+            aggregator.merge(report.aggregator)
+        return aggregator
+
+    def summary_rows(self, keys):
+        """
+        Linhas do resumo geral agrupado por `keys`, a partir dos resumos parciais das plataformas.
+        """
+        return [summary_row(summary) for summary in self.aggregator().rollup(keys).results()]
+
+    def summary_csv(self, keys, headers=REPORT_HEADERS):
+        """
+        Monta o CSV do resumo geral agrupado por `keys` com as colunas `headers`.
+        """
+        return render_csv(self.summary_rows(keys), headers)
+
+    def rows(self):
+        """
+        Gera todas as linhas de insights do snapshot, na ordem de plataforma e conta.
+        """
+        for report in self.platform_reports.values():
+            yield from report.rows
+
+    @cached_property
+    def row_index(self):
+        """
+        Todas as linhas do snapshot com os índices ordenados de `?sort=`, montados na primeira consulta de cada
+        ordenação e descartados junto com o snapshot.
+        """
+        return RowIndex(list(self.rows()))
+
+
+class TablePlatformReport:
+    """
+    Equivalente a PlatformReport para o snapshot lido do arquivo: os dados ficam na InsightsTable da plataforma e os
+    CSVs são montados apenas quando pedidos. `digest` e `modified_at` são os gravados no arquivo para a plataforma, de
+    forma que o ETag seja o mesmo em todos os processos que leram o arquivo.
+    """
+    def __init__(self, platform, table, digest, modified_at):
+        self.platform = platform
+        self.table = table
+        self.row_count = len(table)
+        self.digest = digest
+        self.modified_at = modified_at
+
+    @property
+    def rows(self):
+        return list(self.table.rows())
+
+    @cached_property
+    def row_index(self):
+        return RowIndex(self.rows)
+
+    @cached_property
+    def aggregator(self):
+        """
+        Resumo parcial por (plataforma, conta), montado apenas quando a plataforma é mantida em um ReportSnapshot (ver
+        SnapshotRefresher.refresh()).
+        """
+        return GroupAggregator(('platform', 'account')).update(self.table.rows())
+
+    @cached_property
+    def body(self):
+        return render_csv(self.table.rows(), write_header=False)
+
+    @property
+    def csv(self):
+        return render_csv([]) + self.body
+
+    @cached_property
+    def resumo_csv(self):
+        return self.summary_csv(('account',))
+
+    def summary_rows(self, keys):
+        return [summary_row(summary, self.platform) for summary in self.table.group_by(keys)]
+
+    def summary_csv(self, keys, headers=REPORT_HEADERS):
+        return render_csv(self.summary_rows(keys), headers)
+
+
+class LazyPlatformReports(Mapping):
+    """
+    Dicionário {plataforma: relatório} do TableSnapshot em que cada relatório é montado por `build(plataforma)` apenas
+    na primeira vez em que é pedido. Percorrer as chaves ou consultar se uma plataforma existe não monta nada.
+    """
+    def __init__(self, platforms, build):
+        self._platforms = platforms
+        self._build = build
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, platform):
+        report = self._reports.get(platform)
+        if report is not None:
+            return report
+        if platform not in self._platforms:
+            raise KeyError(platform)
+        with self._lock:
+            report = self._reports.get(platform)
+            if report is None:
+                report = self._reports[platform] = self._build(platform)
+        return report
+
+    def __contains__(self, platform):
+        return platform in self._platforms
+
+    def __iter__(self):
+        return iter(self._platforms)
+
+    def __len__(self):
+        return len(self._platforms)
+
+
+class TableSnapshot:
+    """
+    Snapshot lido do arquivo gravado pela última atualização, com a mesma interface de ReportSnapshot.
+    Os resumos são calculados de forma vetorizada pela InsightsTable, direto das colunas mapeadas em memória.
+    """
+    def __init__(self, table):
+        self.table = table
+        self.generated_at = table.metadata.get("generated_at", 0.0)
+        self.modified_at = table.metadata.get("modified_at", self.generated_at)
+        self.digest = table.metadata.get("digest", "")
+        self.row_count = len(table)
+        self.platform_reports = LazyPlatformReports(table.platforms, self._platform_report)
+
+    def _platform_report(self, platform):
+        """
+        Relatório de uma plataforma. Arquivos gravados antes de guardarem o hash de cada plataforma usam um hash
+        derivado do hash do snapshot inteiro.
+        """
+        info = self.table.metadata.get("platforms", {}).get(platform, {})
+        digest = info.get("digest") or hashlib.sha1(f"{self.digest}:{platform}".encode('utf-8')).hexdigest()
+        return TablePlatformReport(platform, self.table.where_platform(platform), digest,
+                                   info.get("modified_at", self.modified_at))
+
+    @cached_property
+    def geral_csv(self):
+        return render_csv(self.table.rows())
+
+    @cached_property
+    def geral_resumo_csv(self):
+        return self.summary_csv(('platform',))
+
+    def summary_rows(self, keys):
+        return [summary_row(summary) for summary in self.table.group_by(keys)]
+
+    def summary_csv(self, keys, headers=REPORT_HEADERS):
+        return render_csv(self.summary_rows(keys), headers)
+
+    def rows(self):
+        return self.table.rows()
+
+    @cached_property
+    def row_index(self):
+        return RowIndex(list(self.table.rows()))
+
+
+class SnapshotRefresher:
+    """
+    Mantém o snapshot atual e o atualiza em uma thread em segundo plano a cada `interval` segundos.
+    """
+    def __init__(self, interval=SNAPSHOT_INTERVAL, path=SNAPSHOT_PATH):
+        self.interval = interval
+        self.path = path
+        self.snapshot = None
+        self._built = None
+        self._accounts = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """
+        Percorre a API uma vez e publica um novo snapshot, recalculando apenas as contas e plataformas que mudaram.
+        Contas que falharem mantêm o resultado da atualização anterior, e plataformas que falharem (disjuntor aberto ou
+        erro ao buscar contas e campos) mantêm todas as suas contas. Apenas as plataformas que deixaram de constar na
+        lista da API são removidas.
+        Se nenhuma plataforma puder ser buscada (por exemplo, com a API fora do ar ou o token inválido), o snapshot
+        atual continua sendo servido e nada é publicado nem gravado no arquivo.
+        Com o arquivo configurado, o snapshot montado da API (guardado em `_built` para a próxima atualização reaproveitar
+        os relatórios das plataformas) é gravado e o snapshot servido passa a ser o lido de volta do arquivo, como nos
+        demais processos: os dois formatam os valores e somam os resumos de formas diferentes, e o mesmo hash precisa
+        identificar o mesmo corpo (e o mesmo ETag) em todos eles. Se os dados não mudaram, o snapshot lido do arquivo
+        continua sendo servido. Se o arquivo não puder ser gravado ou lido, o snapshot montado é servido.
+        """
+        previous_snapshot = self.snapshot
+        previous_built = self._built or previous_snapshot
+        previous_accounts = self._accounts
+        accounts = {}
+        changed_platforms = set()
+
+        platforms = get_platforms()
+        platform_datas = fetch_all_accounts_and_fields(platforms)
+        if not platform_datas:
+            logger.warning("Relatórios não atualizados: nenhuma plataforma pôde ser buscada na API")
+            return previous_snapshot
+        listed = {platform['value'] for platform in platforms}
+        failed = listed - {platform_data['platform'] for platform_data in platform_datas}
+        for key, partial in previous_accounts.items():
+            if key[0] in failed:
+                accounts[key] = partial
+
+        for platform, account, rows in iter_account_results(platform_datas):
+            key = (platform, account.get('id'))
+            previous = previous_accounts.get(key)
+            if rows is None:
+                if previous is not None:
+                    accounts[key] = previous
+                continue
+            digest = _digest(rows)
+            if previous is not None and previous.digest == digest:
+                accounts[key] = previous
+                continue
+            accounts[key] = AccountPartial(digest, rows)
+            changed_platforms.add(platform)
+
+        changed_platforms.update(platform for platform, _ in previous_accounts.keys() - accounts.keys())
+
+        partials_by_platform = {}
+        for (platform, _), partial in accounts.items():
+            partials_by_platform.setdefault(platform, []).append(partial)
+
+        previous_reports = previous_built.platform_reports if previous_built is not None else {}
+        platform_reports = {}
+        for platform in (platform['value'] for platform in platforms):
+            previous_report = previous_reports.get(platform)
+            partials = partials_by_platform.get(platform)
+            if partials is None:
+                if platform in failed and previous_report is not None:
+                    platform_reports[platform] = previous_report
+            elif previous_report is not None and platform not in changed_platforms:
+                platform_reports[platform] = previous_report
+            else:
+                platform_reports[platform] = PlatformReport(platform, partials)
+
+        built = ReportSnapshot(platform_reports, time.time(), previous_built)
+        snapshot = built
+        saved = True
+        if self.path:
+            if (isinstance(previous_snapshot, TableSnapshot) and previous_snapshot.digest == built.digest
+                    and os.path.exists(self.path)):
+                snapshot = previous_snapshot
+            else:
+                saved = self.save(built)
+                snapshot = (self._read() if saved else None) or built
+        with self._lock:
+            self._accounts = accounts
+            self._built = built
+            self.snapshot = snapshot
+        logger.info("Relatórios atualizados: %s linhas, %s plataforma(s) alterada(s)", snapshot.row_count,
+                    len(changed_platforms))
+
+        if not saved:
+            return snapshot
+        if shared_cache is not None and self.path:
+            published = {"digest": built.digest, "generated_at": built.generated_at}
+            shared_cache.set(SNAPSHOT_KEY, encode_json(published), max(self.interval, _FOLLOW_INTERVAL))
+            shared_cache.prune()
+        return snapshot
+
+    def save(self, snapshot):
+        """
+        Grava os insights do snapshot no arquivo binário, para que o próximo início do servidor (e os demais processos,
+        com o cache compartilhado) já tenham dados. Junto são gravados o hash e a data de alteração de cada plataforma.
+        Retorna False se o arquivo não pôde ser gravado.
+        """
+        platforms = {platform: {"digest": report.digest, "modified_at": report.modified_at}
+                     for platform, report in snapshot.platform_reports.items()}
+        try:
+            InsightsTable.from_rows(snapshot.rows()).save(self.path, generated_at=snapshot.generated_at,
+                                                            modified_at=snapshot.modified_at, digest=snapshot.digest,
+                                                            platforms=platforms)
+        except OSError:
+            logger.exception("Erro ao gravar o snapshot em %s", self.path)
+            return False
+        return True
+
+    def _read(self):
+        """
+        Lê o arquivo do snapshot. Retorna o TableSnapshot, ou None se a leitura falhar.
+        """
+        try:
+            return TableSnapshot(InsightsTable.load(self.path))
+        except (OSError, ValueError):
+            logger.exception("Erro ao ler o snapshot de %s", self.path)
+            return None
+
+    def load(self, replace=False):
+        """
+        Lê o snapshot gravado no arquivo, se existir, e passa a servi-lo até a primeira atualização terminar (ou, com
+        `replace`, no lugar do snapshot atual, quando o arquivo foi gravado por outro processo).
+        Como o arquivo não guarda os ids das contas, a primeira atualização seguinte recalcula todas as plataformas.
+        """
+        if not self.path or not os.path.exists(self.path):
+            return None
+        snapshot = self._read()
+        if snapshot is None:
+            return None
+        with self._lock:
+            if self.snapshot is None or replace:
+                self.snapshot = snapshot
+                self._built = None
+                self._accounts = {}
+        logger.info("Snapshot lido de %s: %s linhas", self.path, snapshot.row_count)
+        return snapshot
+
+    def published(self):
+        """
+        Última atualização publicada no cache compartilhado ({"digest", "generated_at"}), ou None.
+        """
+        entry = shared_cache.get(SNAPSHOT_KEY)
+        return decode_json(entry[0]) if entry is not None else None
+
+    def follow(self, published):
+        """
+        Passa a servir o snapshot gravado por outro processo, se o hash publicado for diferente do atual.
+        """
+        current = self.snapshot
+        if published is None or (current is not None and current.digest == published["digest"]):
+            return current
+        return self.load(replace=True)
+
+    def update(self):
+        """
+        Uma rodada de atualização. Sem o cache compartilhado (ou sem o arquivo do snapshot, por onde os processos o
+        compartilham), o processo atualiza o próprio snapshot. Com ele, apenas um processo atualiza, e só se a última
+        atualização publicada tiver mais de `interval` segundos; os demais seguem o snapshot publicado.
+        """
+        if shared_cache is None or not self.path:
+            with background():
+                return self.refresh()
+        published = self.published()
+        if published is not None and time.time() - published["generated_at"] < self.interval:
+            return self.follow(published)
+        if not shared_cache.acquire(SNAPSHOT_KEY):
+            return self.follow(published)
+        try:
+            published = self.published()
+            if published is not None and time.time() - published["generated_at"] < self.interval:
+                return self.follow(published)
+            with background():
+                return self.refresh()
+        finally:
+            shared_cache.release(SNAPSHOT_KEY)
+
+    def _run(self):
+        wait = min(self.interval, _FOLLOW_INTERVAL) if shared_cache is not None and self.path else self.interval
+        while not self._stop.is_set():
+            try:
+                self.update()
+            except Exception:
+                logger.exception("Erro ao atualizar os relatórios")
+            self._stop.wait(wait)
+
+    def start(self):
+        """
+        Inicia a thread de atualização, caso ainda não tenha sido iniciada e o intervalo seja maior que zero.
+        Antes disso, carrega o snapshot gravado em arquivo, se existir.
+        """
+        with self._lock:
+            if self._thread is not None or self.interval <= 0:
+                return
+            self._thread = threading.Thread(target=self._run, name="stract-snapshots", daemon=True)
+        self.load()
+        self._thread.start()
+
+    def stop(self):
+        """
+        Pede para a thread de atualização parar ao final da espera atual.
+        """
+        self._stop.set()
+
+
+refresher = SnapshotRefresher()
+"""
+Instância única, usada pelas rotas de app.py.
+"""
+
+
+def get_snapshot():
+    """
+    Retorna o snapshot atual, ou None caso ele ainda não exista ou os relatórios em memória estejam desativados.
+    Na primeira chamada inicia a atualização em segundo plano, de forma que apenas processos que realmente atendem
+    requisições (e não, por exemplo, o processo que observa os arquivos no modo debug) percorram a API.
+    """
+    refresher.start()
+    return refresher.snapshot
@@ -0,0 +1,337 @@
+# store.py
+"""
+Este projeto tem como objetivo o desenvolvimento de um servidor local em Python utilizando Flask, que consome dados de
+uma API externa e gera relatórios em tempo real.
+
+Os insights eram guardados como uma lista de dicionários, uma por anúncio, com os valores ainda como vieram da API
+(inclusive textos como 'N/A'). Os resumos percorriam essa lista em Python convertendo cada valor com `float(...)` a cada
+soma, o que fica lento e ocupa muita memória quando a quantidade de anúncios cresce.
+
+Para isso foi criada uma tabela em colunas (`InsightsTable`):
+
+1. Cada métrica (cliques, impressões, gasto, CPC e CTR) fica em um array NumPy de números, convertido uma única vez.
+2. Valores ausentes ou inválidos ficam marcados em uma máscara por coluna, em vez de virarem zero.
+3. Os nomes de plataforma e de conta, que se repetem muito, são guardados uma única vez em um dicionário e cada linha
+   guarda apenas o código (posição) do nome.
+4. Os resumos são calculados com operações vetorizadas do NumPy (`np.unique` + `np.bincount`) agrupando pelos códigos.
+5. A tabela pode ser gravada em um arquivo binário e lida de volta com memória mapeada (`mmap`): as colunas são usadas
+   diretamente das páginas do arquivo, sem cópia, e vários processos que abrirem o mesmo arquivo compartilham essas
+   páginas pelo cache do sistema operacional.
+6. No arquivo, as linhas ficam agrupadas por plataforma e o cabeçalho guarda o intervalo de linhas de cada uma, então a
+   tabela de uma plataforma é uma fatia das colunas mapeadas, também sem cópia.
+"""
+from array import array
+import json
+import mmap
+import os
+import struct
+import numpy as np
+"""
+O `array` da biblioteca padrão é usado para acumular os valores de forma compacta enquanto as linhas chegam.
+As bibliotecas `json` e `struct` montam o cabeçalho do arquivo binário, `mmap` mapeia o arquivo em memória e `os` é usado
+para substituir o arquivo de uma só vez.
+A biblioteca `numpy` fornece os arrays das colunas e as operações vetorizadas de agrupamento.
+"""
+
+METRIC_COLUMNS = ('clicks', 'impressions', 'spend', 'cpc', 'ctr')
+"""
+Colunas numéricas guardadas na tabela.
+"""
+
+SUM_COLUMNS = ('clicks', 'impressions', 'spend')
+MEAN_COLUMNS = ('cpc', 'ctr')
+"""
+Nos resumos, as colunas de `SUM_COLUMNS` são somadas e as de `MEAN_COLUMNS` (que já são razões) têm a média calculada.
+"""
+
+INTEGER_COLUMNS = ('clicks', 'impressions')
+"""
+Colunas que representam contagens e são exibidas sem casas decimais.
+"""
+
+GROUP_KEYS = ('platform', 'account')
+"""
+Chaves possíveis de agrupamento dos resumos.
+"""
+
+FILE_MAGIC = b"STRACTI1"
+FILE_ALIGNMENT = 64
+"""
+Identificação do formato do arquivo binário e o alinhamento, em bytes, do início de cada coluna dentro dele.
+O arquivo é: FILE_MAGIC, o tamanho do cabeçalho (8 bytes), o cabeçalho em JSON e as colunas, cada uma alinhada.
+"""
+
+
+def parse_metric(value):
+    """
+    Converte um valor vindo da API para número.
+    Retorna (valor, ausente): valores vazios, 'N/A' ou que não sejam números retornam (0.0, True).
+    """
+    if value is None or value == '' or value == 'N/A':
+        return 0.0, True
+    try:
+        return float(value), False
+    except (TypeError, ValueError):
+        return 0.0, True
+
+
+def format_metric(column, value):
+    """
+    Formata um valor numérico da tabela para o relatório: contagens sem casas decimais e os demais como float.
+    """
+    if column in INTEGER_COLUMNS and float(value).is_integer():
+        return int(value)
+    return float(value)
+
+
+class _Dictionary:
+    """
+    Codifica textos repetidos (nomes de plataforma e conta) como inteiros, guardando cada texto uma única vez.
+    """
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class InsightsTable:
+    """
+    Tabela de insights em colunas.
+    - `platforms` e `accounts`: listas com os nomes distintos (dicionários).
+    - `platform_codes` e `account_codes`: arrays com a posição do nome de cada linha nessas listas.
+    - `values[coluna]`: array float64 com os valores da métrica.
+    - `missing[coluna]`: array booleano marcando as linhas em que a métrica não existe ou é inválida.
+    - `platform_ranges`: {plataforma: (início, fim)} com o intervalo de linhas de cada plataforma, quando as linhas estão
+      agrupadas por plataforma (tabelas lidas do arquivo), ou None.
+    """
+    def __init__(self, platforms, accounts, platform_codes, account_codes, values, missing, metadata=None,
+                 platform_ranges=None):
+        self.platforms = platforms
+        self.accounts = accounts
+        self.platform_codes = platform_codes
+        self.account_codes = account_codes
+        self.values = values
+        self.missing = missing
+        self.metadata = metadata or {}
+        self.platform_ranges = platform_ranges
+        self._mmap = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """
+        Monta a tabela a partir de linhas no formato de view.iter_insights() (dicionários com 'Platform', 'Ad Name' e
+        as métricas). `rows` pode ser um gerador; as linhas não são guardadas, apenas os valores convertidos.
+        """
+        platforms = _Dictionary()
+        accounts = _Dictionary()
+        platform_codes = array('i')
+        account_codes = array('i')
+        values = {column: array('d') for column in METRIC_COLUMNS}
+        missing = {column: array('b') for column in METRIC_COLUMNS}
+
+        for row in rows:
+            platform_codes.append(platforms.encode(row.get('Platform', '')))
+            account_codes.append(accounts.encode(row.get('Ad Name', '')))
+            for column in METRIC_COLUMNS:
+                value, is_missing = parse_metric(row.get(column))
+                values[column].append(value)
+                missing[column].append(is_missing)
+
+        return cls(
+            platforms.values,
+            accounts.values,
+            np.frombuffer(platform_codes, dtype=np.int32) if platform_codes else np.zeros(0, dtype=np.int32),
+            np.frombuffer(account_codes, dtype=np.int32) if account_codes else np.zeros(0, dtype=np.int32),
+            {column: np.frombuffer(values[column], dtype=np.float64) if values[column] else np.zeros(0)
+             for column in METRIC_COLUMNS},
+            {column: np.frombuffer(missing[column], dtype=np.int8).astype(bool) for column in METRIC_COLUMNS}
+        )
+
+    def __len__(self):
+        return len(self.platform_codes)
+
+    def _columns(self):
+        """
+        Lista (nome, array) de todas as colunas, na ordem em que são gravadas no arquivo.
+        """
+        columns = [('platform_codes', self.platform_codes), ('account_codes', self.account_codes)]
+        columns += [(f"values.{column}", self.values[column]) for column in METRIC_COLUMNS]
+        columns += [(f"missing.{column}", self.missing[column]) for column in METRIC_COLUMNS]
+        return columns
+
+    def save(self, path, **metadata):
+        """
+        Grava a tabela no arquivo binário `path`. Informações extras (como a data de geração) podem ser passadas como
+        `metadata` e ficam disponíveis em `tabela.metadata` ao ler o arquivo.
+        As linhas são gravadas agrupadas por plataforma (mantendo a ordem dentro de cada uma) e o intervalo de linhas de
+        cada plataforma vai no cabeçalho, para que where_platform() retorne fatias das colunas mapeadas.
+        O arquivo é escrito ao lado com outro nome e depois substitui o anterior de uma só vez, então processos que já
+        tinham o arquivo antigo mapeado continuam lendo-o normalmente.
+        """
+        codes = self.platform_codes
+        if len(codes) and np.any(codes[1:] < codes[:-1]):
+            order = np.argsort(codes, kind='stable')
+            columns = [(name, np.ascontiguousarray(data[order])) for name, data in self._columns()]
+            codes = codes[order]
+        else:
+            columns = [(name, np.ascontiguousarray(data)) for name, data in self._columns()]
+        bounds = np.searchsorted(codes, np.arange(len(self.platforms) + 1))
+        platform_ranges = {platform: [int(bounds[code]), int(bounds[code + 1])]
+                           for code, platform in enumerate(self.platforms)}
+        layout = {}
+        offset = 0
+        for name, data in columns:
+            layout[name] = {"dtype": data.dtype.str, "offset": offset, "count": len(data)}
+            offset += -(-data.nbytes // FILE_ALIGNMENT) * FILE_ALIGNMENT
+        header = json.dumps({
+            "rows": len(self),
+            "platforms": self.platforms,
+            "accounts": self.accounts,
+            "platform_ranges": platform_ranges,
+            "columns": layout,
+            "metadata": metadata
+        }).encode('utf-8')
+        data_start = -(-(len(FILE_MAGIC) + 8 + len(header)) // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+        temporary_path = f"{path}.tmp{os.getpid()}"
+        with open(temporary_path, 'wb') as file:
+            file.write(FILE_MAGIC)
+            file.write(struct.pack('<Q', len(header)))
+            file.write(header)
+            for name, data in columns:
+                file.seek(data_start + layout[name]["offset"])
+                file.write(data.tobytes())
+            file.truncate(data_start + offset)
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Lê uma tabela gravada com save() mapeando o arquivo em memória. As colunas são arrays somente leitura que
+        apontam diretamente para as páginas do arquivo, então a leitura é praticamente instantânea mesmo para arquivos
+        grandes. Arquivos gravados antes de guardarem o intervalo de cada plataforma são lidos sem `platform_ranges`.
+        Lança `ValueError` se o arquivo não estiver no formato esperado.
+        """
+        with open(path, 'rb') as file:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if mapped[:len(FILE_MAGIC)] != FILE_MAGIC:
+            mapped.close()
+            raise ValueError(f"{path} não é um arquivo de insights válido")
+        header_start = len(FILE_MAGIC) + 8
+        header_size, = struct.unpack('<Q', mapped[len(FILE_MAGIC):header_start])
+        header = json.loads(mapped[header_start:header_start + header_size].decode('utf-8'))
+        data_start = -(-(header_start + header_size) // FILE_ALIGNMENT) * FILE_ALIGNMENT
+
+        columns = {}
+        for name, layout in header["columns"].items():
+            columns[name] = np.frombuffer(mapped, dtype=np.dtype(layout["dtype"]), count=layout["count"],
+                                          offset=data_start + layout["offset"])
+
+        table = cls(
+            header["platforms"],
+            header["accounts"],
+            columns['platform_codes'],
+            columns['account_codes'],
+            {column: columns[f"values.{column}"] for column in METRIC_COLUMNS},
+            {column: columns[f"missing.{column}"] for column in METRIC_COLUMNS},
+            header.get("metadata"),
+            {platform: tuple(bounds) for platform, bounds in header["platform_ranges"].items()}
+            if "platform_ranges" in header else None
+        )
+        table._mmap = mapped
+        return table
+
+    def where_platform(self, platform):
+        """
+        Retorna uma nova tabela apenas com as linhas da plataforma informada (vazia se ela não existir).
+        Com `platform_ranges`, as colunas da nova tabela são fatias (views) das colunas desta, sem cópia; caso
+        contrário as linhas são copiadas a partir de uma máscara.
+        """
+        if self.platform_ranges is not None:
+            start, stop = self.platform_ranges.get(platform, (0, 0))
+            selected = slice(start, stop)
+        elif platform not in self.platforms:
+            selected = np.zeros(len(self), dtype=bool)
+        else:
+            selected = self.platform_codes == self.platforms.index(platform)
+        platform_codes = self.platform_codes[selected]
+        return InsightsTable(
+            self.platforms,
+            self.accounts,
+            platform_codes,
+            self.account_codes[selected],
+            {column: self.values[column][selected] for column in METRIC_COLUMNS},
+            {column: self.missing[column][selected] for column in METRIC_COLUMNS},
+            self.metadata,
+            {platform: (0, len(platform_codes))} if len(platform_codes) else {}
+        )
+
+    def rows(self):
+        """
+        Gera as linhas da tabela novamente como dicionários, com 'N/A' nos valores ausentes.
+        """
+        for index in range(len(self)):
+            row = {
+                'Platform': self.platforms[self.platform_codes[index]],
+                'Ad Name': self.accounts[self.account_codes[index]]
+            }
+            for column in METRIC_COLUMNS:
+                if self.missing[column][index]:
+                    row[column] = 'N/A'
+                else:
+                    row[column] = format_metric(column, self.values[column][index])
+            yield row
+
+    def group_by(self, keys=('platform',)):
+        """
+        Agrupa as linhas pelas chaves informadas ('platform', 'account' ou ambas; nenhuma gera um único grupo total).
+        As colunas de `SUM_COLUMNS` são somadas e as de `MEAN_COLUMNS` têm a média calculada apenas sobre os valores
+        existentes. Os grupos saem na ordem em que apareceram pela primeira vez.
+        Retorna uma lista de dicionários com 'platform', 'account' (None quando não faz parte do grupo), 'count' e as
+        métricas.
+        """
+        unknown = set(keys) - set(GROUP_KEYS)
+        if unknown:
+            raise ValueError(f"Chaves de agrupamento inválidas: {', '.join(sorted(unknown))}")
+        if not len(self):
+            return []
+
+        group_codes = np.zeros(len(self), dtype=np.int64)
+        if 'platform' in keys:
+            group_codes = group_codes * len(self.platforms) + self.platform_codes
+        if 'account' in keys:
+            group_codes = group_codes * len(self.accounts) + self.account_codes
+
+        _, first_index, inverse = np.unique(group_codes, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        order = np.argsort(first_index, kind='stable')
+        group_count = len(first_index)
+
+        counts = np.bincount(inverse, minlength=group_count)
+        metrics = {}
+        for column in METRIC_COLUMNS:
+            present = ~self.missing[column]
+            sums = np.bincount(inverse, weights=np.where(present, self.values[column], 0.0), minlength=group_count)
+            if column in MEAN_COLUMNS:
+                present_counts = np.bincount(inverse, weights=present, minlength=group_count)
+                sums = np.divide(sums, present_counts, out=np.zeros(group_count), where=present_counts > 0)
+            metrics[column] = sums
+
+        groups = []
+        for group in order:
+            first = first_index[group]
+            summary = {
+                'platform': self.platforms[self.platform_codes[first]] if 'platform' in keys else None,
+                'account': self.accounts[self.account_codes[first]] if 'account' in keys else None,
+                'count': int(counts[group])
+            }
+            for column in METRIC_COLUMNS:
+                summary[column] = float(metrics[column][group])
+            groups.append(summary)
+        return groups
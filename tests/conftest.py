@@ -0,0 +1,62 @@
+# tests/conftest.py
+"""
+Configuração comum dos testes.
+
+Os testes não acessam a API real: usam funções falsas no lugar das buscas de view.py ou a API simulada de
+benchmark/stub_api.py. As variáveis de ambiente abaixo são definidas antes de importar os arquivos do projeto, já que
+config.py lê os valores uma única vez:
+
+- sem snapshot em segundo plano nem arquivo de snapshot, para que as rotas consultem a API a cada requisição;
+- sem cache compartilhado entre os processos.
+
+A fixture `stub_api` inicia a API simulada em uma porta livre e aponta o cliente HTTP para ela.
+"""
+import os
+import sys
+import threading
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+os.environ["STRACT_SNAPSHOT_INTERVAL"] = "0"
+os.environ["STRACT_SNAPSHOT_PATH"] = ""
+os.environ["STRACT_SHARED_CACHE_PATH"] = ""
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmark"))
+
+
+@pytest.fixture
+def stub_api(monkeypatch):
+    """
+    Retorna uma função que inicia a API simulada com as opções de `stub_api.create_app()` e aponta o cliente HTTP
+    para ela. O cache de plataformas, contas e campos, os disjuntores e o agendador são recriados, para que um teste não
+    dependa do que outro deixou em memória, e a espera entre as novas tentativas é reduzida.
+    """
+    from werkzeug.serving import make_server
+    import client
+    import view
+    from breaker import CircuitBreaker
+    from cache import TTLCache
+    from config import BREAKER_FAILURES, BREAKER_COOLDOWN, METADATA_CACHE_SIZE, METADATA_STALE_TTL, ACCOUNTS_TTL
+    from scheduler import RateScheduler
+    from stub_api import create_app
+
+    servers = []
+
+    def start(**options):
+        server = make_server("127.0.0.1", 0, create_app(**options), threaded=True)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        monkeypatch.setattr(client.client, "base_url", f"http://127.0.0.1:{server.server_port}")
+        monkeypatch.setattr(client.client, "backoff_base", 0.001)
+        monkeypatch.setattr(client, "scheduler", RateScheduler(rate=None))
+        monkeypatch.setattr(view, "metadata_cache",
+                            TTLCache(max_size=METADATA_CACHE_SIZE, ttl=ACCOUNTS_TTL, stale_ttl=METADATA_STALE_TTL))
+        monkeypatch.setattr(view, "platform_breaker", CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN))
+        monkeypatch.setattr(view, "account_breaker", CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN))
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
@@ -0,0 +1,57 @@
+# tests/test_aggregate.py
+"""
+Testes do agregador de uma passagem usado nas rotas de resumo (aggregate.py).
+"""
+import pytest
+from aggregate import GroupAggregator, parse_group
+
+ROWS = [
+    {"Platform": "meta_ads", "Ad Name": "Conta 1", "clicks": 10, "impressions": 100, "spend": 5.0, "cpc": 0.5,
+     "ctr": 0.1},
+    {"Platform": "meta_ads", "Ad Name": "Conta 2", "clicks": 20, "impressions": 300, "spend": "N/A", "cpc": "N/A",
+     "ctr": 0.2},
+    {"Platform": "ga4", "Ad Name": "Conta 1", "clicks": "5", "impressions": 50, "spend": 1.0, "cpc": 0.2,
+     "ctr": None},
+    {"Platform": "meta_ads", "Ad Name": "Conta 1", "clicks": 1, "impressions": 10, "spend": 2.0, "cpc": 1.5,
+     "ctr": 0.3},
+]
+
+
+def summaries(aggregator):
+    return [(group["platform"], group["account"], group["count"], group["clicks"], group["spend"],
+             pytest.approx(group["cpc"]), pytest.approx(group["ctr"])) for group in aggregator.results()]
+
+
+def test_parse_group():
+    assert parse_group(None, ("platform",)) == ("platform",)
+    assert parse_group("account, platform", ()) == ("platform", "account")
+    assert parse_group("total", ("platform",)) == ()
+    with pytest.raises(ValueError):
+        parse_group("platform,campaign", ())
+
+
+def test_sums_and_means_skip_missing_values():
+    assert summaries(GroupAggregator(("platform",)).update(ROWS)) == [
+        ("meta_ads", None, 3, 31.0, 7.0, 1.0, 0.2),
+        ("ga4", None, 1, 5.0, 1.0, 0.2, 0.0)]
+
+
+def test_total_group():
+    assert summaries(GroupAggregator(()).update(ROWS)) == [(None, None, 4, 36.0, 8.0, 2.2 / 3, 0.2)]
+
+
+def test_merge_equals_a_single_pass():
+    merged = GroupAggregator(("platform", "account")).update(ROWS[:2])
+    merged.merge(GroupAggregator(("platform", "account")).update(ROWS[2:]))
+    assert summaries(merged) == summaries(GroupAggregator(("platform", "account")).update(ROWS))
+    with pytest.raises(ValueError):
+        merged.merge(GroupAggregator(("platform",)))
+
+
+def test_rollup_equals_grouping_the_rows():
+    by_account = GroupAggregator(("platform", "account")).update(ROWS)
+    for keys in (("platform",), ("account",), ()):
+        assert summaries(by_account.rollup(keys)) == summaries(GroupAggregator(keys).update(ROWS))
+    assert len(by_account) == 3
+    with pytest.raises(ValueError):
+        GroupAggregator(("platform",)).rollup(("account",))
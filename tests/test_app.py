@@ -0,0 +1,269 @@
+# tests/test_app.py
+"""
+Testes das rotas de relatório (app.py): as montadas enquanto a API simulada responde e as servidas a partir do
+snapshot (ETag, respostas 304 e cache dos corpos), montado com a API falsa de test_snapshots.py.
+"""
+import csv
+import gzip
+import io
+import time
+import pytest
+import app as app_module
+import view
+import content_encoding
+import reports
+from cache import TTLCache
+from config import MAX_IN_FLIGHT
+from scheduler import PriorityExecutor
+from snapshots import SnapshotRefresher, TableSnapshot
+from store import InsightsTable
+from test_snapshots import api  # noqa: F401
+
+
+@pytest.fixture
+def snapshots(api, tmp_path):  # noqa: F811
+    """
+    O snapshot servido pelo processo que atualiza, depois de gravar o arquivo, e o lido desse arquivo por outro processo.
+    Uma das contas tem valores como a API pode enviar (números inteiros e textos), que o arquivo guarda como float.
+    """
+    api.data["meta_ads"]["m3"] = [{"Platform": "meta_ads", "Ad Name": "Conta 4", "clicks": "7", "impressions": 70,
+                                   "spend": 3, "cpc": "N/A", "ctr": 0.1}]
+    refresher = SnapshotRefresher(interval=60, path=str(tmp_path / "insights.bin"))
+    refreshed = refresher.refresh()
+    return refreshed, TableSnapshot(InsightsTable.load(refresher.path))
+
+
+@pytest.fixture(autouse=True)
+def encoded_caches(monkeypatch):
+    """
+    Caches vazios dos relatórios comprimidos, para que um teste não receba os corpos guardados por outro.
+    """
+    caches = (TTLCache(max_size=64, ttl=float("inf"), stale_ttl=0), TTLCache(max_size=16, ttl=float("inf"), stale_ttl=0))
+    monkeypatch.setattr(content_encoding, "encoded_cache", caches[0])
+    monkeypatch.setattr(content_encoding, "page_cache", caches[1])
+    return caches
+
+
+@pytest.fixture
+def fetch_executor(monkeypatch):
+    """
+    Pool próprio para as buscas de view.py durante o teste. No fim, o teste espera as tarefas que ficaram em andamento
+    (por exemplo, as da plataforma deixada de fora pelo prazo) terminarem, para que elas não cheguem à API simulada do
+    teste seguinte.
+    """
+    executor = PriorityExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="stract-fetch")
+    monkeypatch.setattr(view, "_executor", executor)
+    yield executor
+    executor.shutdown(wait=True)
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def read_csv(response):
+    return list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+
+
+def test_live_reports_are_streamed(stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, page_size=2)
+
+    response = client.get("/geral")
+    assert response.status_code == 200 and response.is_streamed
+    rows = read_csv(response)
+    assert len(rows) == 12
+    assert {row["Platform"] for row in rows} == {"meta_ads", "ga4"}
+
+    response = client.get("/geral/resumo")
+    assert response.is_streamed
+    assert [row["Platform"] for row in read_csv(response)] == ["meta_ads", "ga4"]
+
+
+def test_live_platform_report_matches_the_api(stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=5, page_size=2)
+    rows = read_csv(client.get("/facebook_ads"))
+    assert len(rows) == 10
+    assert {row["Ad Name"] for row in rows} == {"Conta 0", "Conta 1"}
+    summary = read_csv(client.get("/facebook_ads/resumo"))
+    assert [row["Ad Name"] for row in summary] == ["Conta 0", "Conta 1"]
+    assert sum(int(row["clicks"]) for row in summary) == sum(int(row["clicks"]) for row in rows)
+
+
+def test_geral_leaves_slow_platforms_out_after_the_deadline(monkeypatch, stub_api, client, fetch_executor):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, slow_platforms=("ga4",), slow_latency=0.4)
+    monkeypatch.setattr(app_module, "GERAL_DEADLINE", 0.15)
+    partial = app_module.partial_responses.value(route="/geral")
+
+    started = time.monotonic()
+    response = client.get("/geral")
+    rows = read_csv(response)
+
+    assert time.monotonic() - started < 0.4
+    assert response.headers["X-Missing-Platforms"] == "ga4"
+    assert len(rows) == 6 and {row["Platform"] for row in rows} == {"meta_ads"}
+    assert app_module.partial_responses.value(route="/geral") == partial + 1
+
+
+def test_geral_streams_before_slow_platforms_finish_by_default(monkeypatch, stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, slow_platforms=("ga4",), slow_latency=0.4)
+    monkeypatch.setattr(reports, "CSV_CHUNK_SIZE", 1)
+    assert app_module.GERAL_DEADLINE == 0
+
+    response = client.get("/geral")
+    started = time.monotonic()
+    rows = read_csv(response)
+
+    assert time.monotonic() - started >= 0.3
+    assert "X-Missing-Platforms" not in response.headers
+    assert [row["Platform"] for row in rows] == ["meta_ads"] * 6 + ["ga4"] * 6
+
+
+def test_geral_leaves_failing_platforms_out_and_opens_their_breaker(monkeypatch, stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, failing_platforms=("ga4",))
+    monkeypatch.setattr(app_module, "GERAL_DEADLINE", 5)
+    for _ in range(view.platform_breaker.failure_threshold):
+        response = client.get("/geral/resumo")
+        assert response.headers["X-Missing-Platforms"] == "ga4"
+        assert [row["Platform"] for row in read_csv(response)] == ["meta_ads"]
+    assert view.platform_breaker.open_keys() == ["ga4"]
+
+
+def test_geral_marks_platforms_whose_insights_fail_as_missing(monkeypatch, stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, failing_insights=("ga4",))
+    monkeypatch.setattr(app_module, "GERAL_DEADLINE", 5)
+    partial = app_module.partial_responses.value(route="/geral")
+
+    for _ in range(view.platform_breaker.failure_threshold + 1):
+        response = client.get("/geral")
+        assert response.headers["X-Missing-Platforms"] == "ga4"
+        assert {row["Platform"] for row in read_csv(response)} == {"meta_ads"}
+    assert view.platform_breaker.open_keys() == ["ga4"]
+    assert app_module.partial_responses.value(route="/geral") == partial + view.platform_breaker.failure_threshold + 1
+
+    response = client.get("/geral/resumo")
+    assert response.headers["X-Missing-Platforms"] == "ga4"
+    assert [row["Platform"] for row in read_csv(response)] == ["meta_ads"]
+
+
+def follow_pages(client, path, args):
+    """
+    Segue o cabeçalho `X-Next-Cursor` até a última página e retorna as linhas de todas as páginas.
+    """
+    args = dict(args)
+    rows = []
+    while True:
+        response = client.get(path, query_string=args)
+        assert response.status_code == 200
+        rows += read_csv(response)
+        if "X-Next-Cursor" not in response.headers:
+            return rows
+        args["after"] = response.headers["X-Next-Cursor"]
+
+
+def test_live_pages_follow_the_sort(stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=5)
+    everything = read_csv(client.get("/geral?sort=-spend"))
+    assert [float(row["spend"]) for row in everything] == sorted((float(row["spend"]) for row in everything),
+                                                                 reverse=True)
+    assert follow_pages(client, "/geral", {"sort": "-spend", "limit": "3"}) == everything
+    assert read_csv(client.get("/geral?sort=-spend&top=4")) == everything[:4]
+    assert client.get("/geral?sort=-spend&after=invalido").status_code == 400
+    assert client.get("/geral?sort=status").status_code == 400
+
+
+def serve(monkeypatch, snapshot):
+    """
+    Serve `snapshot` nas rotas, com as plataformas identificadas pelo próprio valor (como /meta_ads).
+    """
+    monkeypatch.setattr(app_module, "get_snapshot", lambda: snapshot)
+    monkeypatch.setattr(app_module, "get_platform_by_slug",
+                        lambda slug: {"value": slug} if slug in snapshot.platform_reports else None)
+
+
+@pytest.mark.parametrize("path", ["/geral", "/geral/resumo", "/meta_ads", "/meta_ads/resumo", "/geral?format=ndjson",
+                                  "/geral/resumo?group=account&format=ndjson"])
+def test_refreshing_and_following_processes_serve_the_same_report(monkeypatch, client, snapshots, encoded_caches,
+                                                                   path):
+    refreshed, followed = snapshots
+    assert refreshed.digest == followed.digest
+
+    serve(monkeypatch, refreshed)
+    first = client.get(path)
+    assert first.status_code == 200
+
+    for cache in encoded_caches:
+        cache.invalidate()
+    serve(monkeypatch, followed)
+    second = client.get(path)
+    assert second.headers["ETag"] == first.headers["ETag"]
+    assert second.get_data() == first.get_data()
+    assert client.get(path, headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+
+def test_pages_do_not_evict_full_reports(monkeypatch, client, snapshots):
+    encoded_cache = TTLCache(max_size=2, ttl=float("inf"), stale_ttl=0)
+    page_cache = TTLCache(max_size=2, ttl=float("inf"), stale_ttl=0)
+    monkeypatch.setattr(content_encoding, "encoded_cache", encoded_cache)
+    monkeypatch.setattr(content_encoding, "page_cache", page_cache)
+    serve(monkeypatch, snapshots[0])
+    full = [client.get("/geral").data, client.get("/geral/resumo").data]
+
+    args = {"sort": "-clicks", "limit": "1"}
+    pages = []
+    while True:
+        response = client.get("/geral", query_string=args)
+        pages.append(response.data)
+        if "X-Next-Cursor" not in response.headers:
+            break
+        args["after"] = response.headers["X-Next-Cursor"]
+
+    assert len(pages) == 5 and page_cache.misses == 5
+    assert len(encoded_cache._entries) == 2
+    assert [client.get("/geral").data, client.get("/geral/resumo").data] == full
+    assert (encoded_cache.hits, encoded_cache.misses) == (2, 2)
+
+
+def test_conditional_requests(monkeypatch, client, snapshots):
+    serve(monkeypatch, snapshots[0])
+    first = client.get("/geral")
+    etag, last_modified = first.headers["ETag"], first.headers["Last-Modified"]
+    assert first.headers["Cache-Control"] == "no-cache"
+
+    assert client.get("/geral", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/geral", headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert client.get("/geral", headers={"If-None-Match": '"outro"'}).status_code == 200
+    assert client.get("/geral?sort=-clicks", headers={"If-None-Match": etag}).status_code == 200
+    assert client.get("/geral?profile=1", headers={"If-None-Match": etag}).status_code == 304
+
+
+def test_compressed_reports(monkeypatch, client, snapshots):
+    serve(monkeypatch, snapshots[0])
+    assert "Content-Encoding" not in client.get("/geral", headers={"Accept-Encoding": "gzip"}).headers
+    monkeypatch.setattr(app_module, "COMPRESSION_MIN_SIZE", 0)
+    plain = client.get("/geral")
+    compressed = client.get("/geral", headers={"Accept-Encoding": "gzip"})
+
+    assert "Content-Encoding" not in plain.headers
+    assert compressed.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["Vary"]
+    assert compressed.headers["ETag"] != plain.headers["ETag"]
+    assert gzip.decompress(compressed.data) == plain.data
+
+
+def test_live_reports_are_compressed_while_streamed(stub_api, client):
+    stub_api(platforms=2, accounts=4, ads_per_account=50)
+    plain = client.get("/geral").data
+    response = client.get("/geral", headers={"Accept-Encoding": "gzip"})
+    assert response.is_streamed and response.headers["Content-Encoding"] == "gzip"
+    assert gzip.decompress(response.data) == plain
+
+
+@pytest.mark.parametrize("path", ["/geral", "/meta_ads", "/geral/resumo?group=platform,account"])
+def test_snapshot_pages_follow_the_sort(monkeypatch, client, snapshots, path):
+    serve(monkeypatch, snapshots[0])
+    path, _, query = path.partition("?")
+    args = dict(item.split("=") for item in query.split("&")) if query else {}
+    everything = read_csv(client.get(path, query_string={**args, "sort": "-clicks"}))
+    assert len(everything) > 1
+    assert follow_pages(client, path, {**args, "sort": "-clicks", "limit": "1"}) == everything
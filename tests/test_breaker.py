@@ -0,0 +1,199 @@
+# tests/test_breaker.py
+"""
+Testes dos disjuntores (breaker.py) e de como view.py os usa nas buscas de contas, campos e insights.
+"""
+import pytest
+import view
+from breaker import CircuitBreaker
+from cache import TTLCache
+from view import ApiError, CircuitOpenError
+
+ACCOUNT = {"id": "m1", "name": "Conta 1", "token": "t"}
+
+
+def test_opens_after_threshold_and_refuses():
+    breaker = CircuitBreaker(2, 3600)
+    breaker.record_failure("a")
+    assert breaker.allow("a")
+    breaker.record_failure("a")
+    assert not breaker.allow("a")
+    assert breaker.open_keys() == ["a"]
+    assert breaker.allow("b")
+
+
+def test_success_resets_failures():
+    breaker = CircuitBreaker(2, 3600)
+    breaker.record_failure("a")
+    breaker.record_success("a")
+    breaker.record_failure("a")
+    assert breaker.allow("a")
+
+
+def test_half_open_allows_a_single_probe():
+    breaker = CircuitBreaker(1, 0)
+    breaker.record_failure("a")
+    assert breaker.allow("a")
+    assert not breaker.allow("a")
+    breaker.record_success("a")
+    assert breaker.open_keys() == []
+    assert breaker.allow("a") and breaker.allow("a")
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker(1, 3600)
+    breaker.record_failure("a")
+    breaker._states["a"][1] -= 3600
+    assert breaker.allow("a")
+    breaker.record_failure("a")
+    assert not breaker.allow("a")
+
+
+def test_release_returns_the_probe_without_closing():
+    breaker = CircuitBreaker(1, 0)
+    breaker.record_failure("a")
+    assert breaker.allow("a")
+    breaker.release("a")
+    assert breaker.open_keys() == ["a"]
+    assert breaker.allow("a")
+
+
+def test_disabled_breaker_always_allows():
+    breaker = CircuitBreaker(0, 3600)
+    for _ in range(5):
+        breaker.record_failure("a")
+    assert breaker.allow("a")
+    assert breaker.open_keys() == []
+
+
+@pytest.fixture
+def breakers(monkeypatch):
+    platform_breaker = CircuitBreaker(1, 0)
+    account_breaker = CircuitBreaker(1, 3600)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    monkeypatch.setattr(view, "account_breaker", account_breaker)
+    return platform_breaker, account_breaker
+
+
+def test_open_account_does_not_hold_the_platform_probe(monkeypatch, breakers):
+    platform_breaker, account_breaker = breakers
+    platform_breaker.record_failure("meta_ads")
+    account_breaker.record_failure(("meta_ads", "m1"))
+    monkeypatch.setattr(view, "iter_account_insights", lambda *args: pytest.fail("a API não deveria ser consultada"))
+
+    with pytest.raises(CircuitOpenError):
+        view._fetch_account_rows("meta_ads", ACCOUNT, ["clicks"])
+
+    assert platform_breaker.allow("meta_ads")
+
+
+def test_open_platform_does_not_hold_the_account_probe(monkeypatch):
+    platform_breaker = CircuitBreaker(1, 3600)
+    account_breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    monkeypatch.setattr(view, "account_breaker", account_breaker)
+    platform_breaker.record_failure("meta_ads")
+    account_breaker.record_failure(("meta_ads", "m1"))
+
+    with pytest.raises(CircuitOpenError):
+        view._fetch_account_rows("meta_ads", ACCOUNT, ["clicks"])
+
+    assert account_breaker.allow(("meta_ads", "m1"))
+
+
+def test_probe_success_closes_both_breakers(monkeypatch):
+    platform_breaker = CircuitBreaker(1, 0)
+    account_breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    monkeypatch.setattr(view, "account_breaker", account_breaker)
+    platform_breaker.record_failure("meta_ads")
+    account_breaker.record_failure(("meta_ads", "m1"))
+    monkeypatch.setattr(view, "iter_account_insights", lambda *args: iter([{"clicks": 1}]))
+
+    assert view._fetch_account_rows("meta_ads", ACCOUNT, ["clicks"]) == [{"clicks": 1}]
+    assert platform_breaker.open_keys() == [] and account_breaker.open_keys() == []
+
+
+def test_probe_failure_reopens_both_breakers(monkeypatch):
+    platform_breaker = CircuitBreaker(1, 0)
+    account_breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    monkeypatch.setattr(view, "account_breaker", account_breaker)
+
+    def failing(*args):
+        raise ApiError("/api/insights", {}, 503)
+
+    monkeypatch.setattr(view, "iter_account_insights", failing)
+    with pytest.raises(ApiError):
+        view._fetch_account_rows("meta_ads", ACCOUNT, ["clicks"])
+    assert platform_breaker.open_keys() == ["meta_ads"]
+    assert account_breaker.open_keys() == [("meta_ads", "m1")]
+
+
+@pytest.fixture
+def metadata(monkeypatch):
+    """
+    Cache de contas e campos vazio e uma API falsa que conta as buscas.
+    """
+    calls = []
+    monkeypatch.setattr(view, "metadata_cache", TTLCache(max_size=16, ttl=3600, stale_ttl=0))
+
+    def fetch_accounts(platform):
+        calls.append(("accounts", platform))
+        return [ACCOUNT]
+
+    def fetch_fields(platform):
+        calls.append(("fields", platform))
+        return [{"value": "clicks"}]
+
+    monkeypatch.setattr(view, "fetch_accounts", fetch_accounts)
+    monkeypatch.setattr(view, "fetch_fields", fetch_fields)
+    return calls
+
+
+def test_cached_metadata_does_not_reset_failures(monkeypatch, metadata):
+    platform_breaker = CircuitBreaker(2, 3600)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    assert view.get_accounts_and_fields("meta_ads") is not None
+
+    platform_breaker.record_failure("meta_ads")
+    assert view.get_accounts_and_fields("meta_ads") is not None
+    platform_breaker.record_failure("meta_ads")
+
+    assert len(metadata) == 2
+    assert platform_breaker.open_keys() == ["meta_ads"]
+    assert view.get_accounts_and_fields("meta_ads") is None
+
+
+def test_cached_metadata_releases_the_probe(monkeypatch, metadata):
+    platform_breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    view.get_accounts_and_fields("meta_ads")
+    platform_breaker.record_failure("meta_ads")
+
+    assert view.get_accounts_and_fields("meta_ads") is not None
+
+    assert platform_breaker.open_keys() == ["meta_ads"]
+    assert platform_breaker.allow("meta_ads")
+
+
+def test_fetched_metadata_closes_the_breaker(monkeypatch, metadata):
+    platform_breaker = CircuitBreaker(1, 0)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+    platform_breaker.record_failure("meta_ads")
+
+    assert view.get_accounts_and_fields("meta_ads") is not None
+
+    assert metadata == [("accounts", "meta_ads"), ("fields", "meta_ads")]
+    assert platform_breaker.open_keys() == []
+
+
+def test_failed_metadata_fetch_counts_as_failure(monkeypatch, metadata):
+    platform_breaker = CircuitBreaker(1, 3600)
+    monkeypatch.setattr(view, "platform_breaker", platform_breaker)
+
+    def failing(platform):
+        raise ApiError("/api/accounts", {"platform": platform}, 503)
+
+    monkeypatch.setattr(view, "fetch_accounts", failing)
+    assert view.get_accounts_and_fields("meta_ads") is None
+    assert platform_breaker.open_keys() == ["meta_ads"]
@@ -0,0 +1,100 @@
+# tests/test_cache.py
+"""
+Testes do cache em memória com validade por chave (cache.py): expiração, descarte das entradas menos usadas e o
+índice de plataformas por nome de URL guardado junto com a lista (view.py).
+"""
+import logging
+import time
+import view
+from cache import TTLCache
+
+
+def test_failed_background_refresh_is_logged_and_keeps_the_value(caplog):
+    cache = TTLCache(max_size=4, ttl=0.01, stale_ttl=60)
+    cache.get_or_load("platforms", lambda: ["meta_ads"])
+    time.sleep(0.02)
+
+    def failing():
+        raise RuntimeError("API fora do ar")
+
+    with caplog.at_level(logging.ERROR, logger="cache"):
+        assert cache.get_or_load("platforms", failing) == ["meta_ads"]
+        deadline = time.monotonic() + 5
+        while cache._refreshing and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert cache.get_or_load("platforms", failing) == ["meta_ads"]
+    record, = [record for record in caplog.records if record.name == "cache"]
+    assert "platforms" in record.getMessage()
+    assert record.exc_info[0] is RuntimeError
+
+
+def counting(values):
+    """
+    Retorna um loader que entrega `values` e guarda em `calls` quantas vezes foi chamado.
+    """
+    def loader():
+        loader.calls += 1
+        return values
+    loader.calls = 0
+    return loader
+
+
+def test_expired_values_are_loaded_again():
+    cache = TTLCache(max_size=4, ttl=0.05, stale_ttl=0)
+    loader = counting(["meta_ads"])
+    assert cache.get_or_load("platforms", loader) == ["meta_ads"]
+    assert cache.get_or_load("platforms", loader) == ["meta_ads"]
+    assert loader.calls == 1
+    time.sleep(0.06)
+    assert cache.get_or_load("platforms", loader) == ["meta_ads"]
+    assert loader.calls == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_ttl_can_be_set_per_key():
+    cache = TTLCache(max_size=4, ttl=60, stale_ttl=0)
+    short, long = counting(["a"]), counting(["b"])
+    cache.get_or_load("short", short, ttl=0.05)
+    cache.get_or_load("long", long)
+    time.sleep(0.06)
+    cache.get_or_load("short", short, ttl=0.05)
+    cache.get_or_load("long", long)
+    assert (short.calls, long.calls) == (2, 1)
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = TTLCache(max_size=2, ttl=60, stale_ttl=0)
+    loaders = {key: counting([key]) for key in "abc"}
+    cache.get_or_load("a", loaders["a"])
+    cache.get_or_load("b", loaders["b"])
+    cache.get_or_load("a", loaders["a"])
+    cache.get_or_load("c", loaders["c"])
+    assert list(cache._entries) == ["a", "c"]
+
+    cache.get_or_load("a", loaders["a"])
+    cache.get_or_load("b", loaders["b"])
+    assert [loader.calls for loader in loaders.values()] == [1, 2, 1]
+    assert list(cache._entries) == ["a", "b"]
+
+
+def test_platform_lookup_uses_the_cached_index(monkeypatch):
+    platforms = [{"value": "meta_ads", "text": "Facebook Ads"}, {"value": "ga4", "text": "Google Analytics"}]
+    fetch_platforms = counting(platforms)
+    slugs = []
+    original = view.platform_slug
+
+    def platform_slug(platform):
+        slugs.append(platform)
+        return original(platform)
+
+    monkeypatch.setattr(view, "metadata_cache", TTLCache(max_size=4, ttl=60, stale_ttl=0))
+    monkeypatch.setattr(view, "fetch_platforms", fetch_platforms)
+    monkeypatch.setattr(view, "platform_slug", platform_slug)
+
+    assert view.get_platforms() == platforms
+    assert view.get_platform_by_slug("google_analytics") is platforms[1]
+    assert view.get_platform_by_slug("FACEBOOK_ADS") is platforms[0]
+    assert view.get_platform_by_slug("tiktok") is None
+    assert fetch_platforms.calls == 1
+    assert len(slugs) == 2
@@ -0,0 +1,313 @@
+# tests/test_client.py
+"""
+Testes do cliente HTTP da API (client.py): novas tentativas com espera exponencial, junção de chamadas idênticas
+(SingleFlight) e duplicação das requisições lentas (HedgePolicy).
+"""
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+import pytest
+import requests
+import client as client_module
+from client import ApiClient, HedgePolicy, SingleFlight
+from metrics import upstream_hedges, upstream_retries
+from scheduler import RateScheduler
+
+
+def run_together(count, func):
+    """
+    Executa `func()` em `count` threads ao mesmo tempo e retorna os resultados (ou exceções) de cada uma.
+    """
+    barrier = threading.Barrier(count)
+
+    def call():
+        barrier.wait()
+        try:
+            return func()
+        except Exception as error:
+            return error
+
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        return list(executor.map(lambda _: call(), range(count)))
+
+
+@pytest.fixture
+def scripted_api():
+    """
+    API mínima que responde às requisições de insights na ordem de `script`: um status HTTP, ou ("sleep", segundos) e
+    ("sleep", segundos, status) para demorar antes de responder 200 ou o status. Depois do fim do roteiro, responde
+    sempre 200. Retorna o endereço base, o roteiro (uma lista a ser preenchida pelo teste) e a lista com o horário de
+    cada chamada.
+    """
+    from flask import Flask, jsonify
+    from werkzeug.serving import make_server
+
+    app = Flask(__name__)
+    script = []
+    calls = []
+
+    @app.route("/api/insights")
+    def insights():
+        calls.append(time.monotonic())
+        step = script.pop(0) if script else 200
+        if isinstance(step, tuple):
+            time.sleep(step[1])
+            step = step[2] if len(step) > 2 else 200
+        return jsonify({"insights": [], "pagination": {"current": 1, "total": 1}}), step
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", script, calls
+    server.shutdown()
+
+
+def retrying_client(monkeypatch, base_url, **options):
+    """
+    Cliente para `base_url` que guarda em `waits` cada (tentativa, espera) sorteada por backoff().
+    """
+    monkeypatch.setattr(client_module, "scheduler", RateScheduler(rate=None))
+    api = ApiClient(base_url=base_url, max_in_flight=2, hedge=False, **options)
+    api.waits = []
+
+    def backoff(attempt):
+        wait = ApiClient.backoff(api, attempt)
+        api.waits.append((attempt, wait))
+        return wait
+
+    api.backoff = backoff
+    return api
+
+
+def test_server_errors_are_retried_with_exponential_backoff(monkeypatch, scripted_api):
+    base_url, script, calls = scripted_api
+    script.extend([500, 503, 502])
+    api = retrying_client(monkeypatch, base_url, max_retries=3, backoff_base=0.01, backoff_max=0.015)
+    retries = upstream_retries.value(endpoint="insights")
+
+    assert api.get("/api/insights").status_code == 200
+    assert len(calls) == 4
+    assert [attempt for attempt, _ in api.waits] == [1, 2, 3]
+    assert all(0 <= wait <= limit for (_, wait), limit in zip(api.waits, (0.01, 0.015, 0.015)))
+    assert upstream_retries.value(endpoint="insights") == retries + 3
+    api.close()
+
+
+def test_backoff_doubles_up_to_the_limit(monkeypatch):
+    monkeypatch.setattr(client_module.random, "uniform", lambda low, high: high)
+    api = ApiClient(base_url="http://127.0.0.1:1", backoff_base=0.5, backoff_max=3, hedge=False)
+    assert [api.backoff(attempt) for attempt in range(1, 6)] == [0.5, 1, 2, 3, 3]
+    api.close()
+
+
+def test_timeouts_are_retried(monkeypatch, scripted_api):
+    base_url, script, calls = scripted_api
+    script.append(("sleep", 0.5))
+    api = retrying_client(monkeypatch, base_url, timeout=(1, 0.1), max_retries=2, backoff_base=0.01)
+
+    assert api.get("/api/insights").status_code == 200
+    assert len(calls) == 2
+    assert [attempt for attempt, _ in api.waits] == [1]
+    api.close()
+
+
+def test_retries_give_up_after_max_retries(monkeypatch, scripted_api):
+    base_url, script, calls = scripted_api
+    script.extend([503] * 10)
+    api = retrying_client(monkeypatch, base_url, max_retries=2, backoff_base=0.01)
+
+    assert api.get("/api/insights").status_code == 503
+    assert len(calls) == 3
+    assert [attempt for attempt, _ in api.waits] == [1, 2]
+
+    script[:] = [("sleep", 0.5)] * 3
+    calls.clear()
+    api.timeout = (1, 0.1)
+    with pytest.raises(requests.Timeout):
+        api.get("/api/insights", {"page": 2})
+    assert len(calls) == 3
+    api.close()
+
+
+@pytest.mark.parametrize("status", [400, 401, 404])
+def test_client_errors_are_not_retried(monkeypatch, scripted_api, status):
+    base_url, script, calls = scripted_api
+    script.append(status)
+    api = retrying_client(monkeypatch, base_url, max_retries=3, backoff_base=0.01)
+
+    assert api.get("/api/insights").status_code == status
+    assert len(calls) == 1
+    assert api.waits == []
+    api.close()
+
+
+def test_identical_calls_run_once():
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.1)
+        return "resultado"
+
+    assert run_together(8, lambda: flight.do("chave", slow)) == ["resultado"] * 8
+    assert len(calls) == 1
+    assert flight.stats() == {"leaders": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_exception_reaches_every_caller_and_is_not_kept():
+    flight = SingleFlight()
+
+    def failing():
+        time.sleep(0.1)
+        raise RuntimeError("falhou")
+
+    results = run_together(4, lambda: flight.do("chave", failing))
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.do("chave", lambda: "ok") == "ok"
+    assert flight.stats()["leaders"] == 2
+
+
+def test_different_keys_are_not_joined():
+    flight = SingleFlight()
+    assert [flight.do(key, lambda key=key: key) for key in ("a", "b")] == ["a", "b"]
+    assert flight.stats() == {"leaders": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_submit_shares_the_pending_future():
+    flight = SingleFlight()
+    started = []
+
+    def start():
+        future = Future()
+        started.append(future)
+        return future
+
+    first = flight.submit("chave", start)
+    assert flight.submit("chave", start) is first
+    assert flight.stats()["in_flight"] == 1
+    first.set_result("ok")
+    assert flight.stats()["in_flight"] == 0
+    assert flight.submit("chave", start) is not first
+    assert len(started) == 2
+
+
+def test_client_joins_identical_requests(monkeypatch, stub_api):
+    stub_api(platforms=2, latency=0.1)
+    flight = SingleFlight()
+    monkeypatch.setattr(client_module.client, "single_flight", flight)
+    responses = run_together(6, lambda: client_module.client.get("/api/platforms"))
+    assert {response.status_code for response in responses} == {200}
+    assert len({id(response) for response in responses}) == 1
+    assert (flight.leaders, flight.coalesced) == (1, 5)
+
+
+def test_hedge_delay_is_the_latency_percentile():
+    policy = HedgePolicy(endpoints=("insights",), percentile=0.9, min_samples=10, window=100)
+    for index in range(9):
+        policy.observe("insights", index / 100)
+    policy.observe("accounts", 1.0)
+    assert policy.delay("insights") is None and policy.delay("accounts") is None
+    policy.observe("insights", 0.09)
+    assert policy.delay("insights") == 0.09
+    for _ in range(6):
+        policy.observe("insights", 0.5)
+    assert policy.delay("insights") == 0.5
+
+
+def test_hedge_rate_is_limited():
+    policy = HedgePolicy(endpoints=("insights",), max_rate=0.25, window=8)
+    decisions = []
+    for _ in range(16):
+        hedged = policy.allow()
+        policy.record(hedged)
+        decisions.append(hedged)
+    assert sum(decisions[8:]) == 2
+
+
+@pytest.fixture
+def straggler_api():
+    """
+    API mínima em que a primeira requisição de insights demora 2 segundos e as seguintes respondem na hora.
+    """
+    from flask import Flask, jsonify
+    from werkzeug.serving import make_server
+
+    app = Flask(__name__)
+    calls = []
+
+    @app.route("/api/insights")
+    def insights():
+        calls.append(time.monotonic())
+        if len(calls) == 1:
+            time.sleep(2)
+        return jsonify({"insights": [{"clicks": len(calls)}], "pagination": {"current": 1, "total": 1}})
+
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_port}", calls
+    server.shutdown()
+
+
+def test_slow_request_is_hedged(monkeypatch, straggler_api):
+    base_url, calls = straggler_api
+    monkeypatch.setattr(client_module, "scheduler", RateScheduler(rate=None))
+    api = ApiClient(base_url=base_url, max_in_flight=4, hedge=True)
+    api.hedge_policy = HedgePolicy(endpoints=("insights",), max_rate=1.0, min_samples=1)
+    api.hedge_policy.observe("insights", 0.05)
+    won = upstream_hedges.value(endpoint="insights", result="won")
+
+    started = time.monotonic()
+    response = api.get("/api/insights")
+
+    assert time.monotonic() - started < 1
+    assert response.json()["insights"] == [{"clicks": 2}]
+    assert len(calls) == 2
+    assert upstream_hedges.value(endpoint="insights", result="won") == won + 1
+    api.close()
+
+
+def test_fast_request_is_not_hedged(monkeypatch, straggler_api):
+    base_url, calls = straggler_api
+    calls.append(time.monotonic())
+    monkeypatch.setattr(client_module, "scheduler", RateScheduler(rate=None))
+    api = ApiClient(base_url=base_url, max_in_flight=4, hedge=True)
+    api.hedge_policy = HedgePolicy(endpoints=("insights",), max_rate=1.0, min_samples=1)
+    api.hedge_policy.observe("insights", 0.5)
+
+    assert api.get("/api/insights").json()["insights"] == [{"clicks": 2}]
+    assert len(calls) == 2
+    api.close()
+
+
+def hedging_client(monkeypatch, base_url):
+    """
+    Cliente sem novas tentativas que duplica qualquer requisição de insights que passe de 50 ms.
+    """
+    monkeypatch.setattr(client_module, "scheduler", RateScheduler(rate=None))
+    api = ApiClient(base_url=base_url, max_in_flight=4, max_retries=0, hedge=True)
+    api.hedge_policy = HedgePolicy(endpoints=("insights",), max_rate=1.0, min_samples=1)
+    api.hedge_policy.observe("insights", 0.05)
+    return api
+
+
+def test_failed_hedge_does_not_beat_a_successful_request(monkeypatch, scripted_api):
+    base_url, script, calls = scripted_api
+    script.extend([("sleep", 0.3), 500])
+    api = hedging_client(monkeypatch, base_url)
+    won = upstream_hedges.value(endpoint="insights", result="won")
+
+    assert api.get("/api/insights").status_code == 200
+    assert len(calls) == 2
+    assert upstream_hedges.value(endpoint="insights", result="won") == won
+    api.close()
+
+
+def test_when_both_copies_fail_the_original_response_is_returned(monkeypatch, scripted_api):
+    base_url, script, calls = scripted_api
+    script.extend([("sleep", 0.3, 503), 500])
+    api = hedging_client(monkeypatch, base_url)
+
+    assert api.get("/api/insights").status_code == 503
+    assert len(calls) == 2
+    api.close()
+
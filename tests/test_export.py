@@ -0,0 +1,70 @@
+# tests/test_export.py
+"""
+Testes da exportação dos relatórios (export.py) contra a API simulada.
+"""
+import csv
+import os
+import pytest
+import export
+from export import ExportError, file_names, report_jobs
+
+
+def read_csv(path):
+    with open(path, newline='', encoding='utf-8') as file:
+        return list(csv.DictReader(file))
+
+
+def test_exports_every_report(stub_api, tmp_path):
+    stub_api(platforms=2, accounts=4, ads_per_account=3, page_size=2)
+    output = tmp_path / "exports"
+
+    assert export.main(["--output", str(output), "--workers", "2"]) == 0
+
+    assert sorted(os.listdir(output)) == ["facebook_ads.csv", "facebook_ads_resumo.csv", "geral.csv",
+                                          "geral_resumo.csv", "google_analytics.csv", "google_analytics_resumo.csv"]
+    assert len(read_csv(output / "geral.csv")) == 12
+    assert [row["Platform"] for row in read_csv(output / "geral_resumo.csv")] == ["meta_ads", "ga4"]
+    assert len(read_csv(output / "facebook_ads_resumo.csv")) == 2
+
+
+def test_no_platforms_writes_nothing(stub_api, tmp_path):
+    stub_api(platforms=0)
+    insights = tmp_path / "insights_data.csv"
+    insights.write_text("Platform,Ad Name\nmeta_ads,Conta 1\n", encoding="utf-8")
+    output = tmp_path / "exports"
+
+    assert export.main(["--output", str(output), "--insights-csv", str(insights)]) == 1
+
+    assert not output.exists()
+    assert insights.read_text(encoding="utf-8") == "Platform,Ad Name\nmeta_ads,Conta 1\n"
+
+
+def test_no_rows_writes_nothing(stub_api, tmp_path):
+    stub_api(platforms=2, accounts=2, ads_per_account=0)
+    output = tmp_path / "exports"
+    with pytest.raises(ExportError):
+        export.export(str(output))
+    assert not output.exists()
+
+
+def test_failed_platform_is_reported(stub_api, tmp_path):
+    stub_api(platforms=2, accounts=4, ads_per_account=2, failing_platforms=("ga4",))
+    output = tmp_path / "exports"
+
+    assert export.main(["--output", str(output)]) == 1
+
+    assert "google_analytics.csv" not in os.listdir(output)
+    assert {row["Platform"] for row in read_csv(output / "geral.csv")} == {"meta_ads"}
+
+
+def test_repeated_slugs_get_the_platform_value():
+    platforms = [{"value": "meta_ads", "text": "Ads"}, {"value": "google/ads", "text": "ads"},
+                 {"value": "x", "text": "Geral"}, {"value": "y", "text": "TikTok/Ads"}]
+    assert file_names(platforms) == {"meta_ads": "ads-meta_ads", "google/ads": "ads-google_ads", "x": "geral-x",
+                                     "y": "tiktok_ads"}
+
+
+def test_repeated_report_names_fail():
+    platforms = [{"value": "a", "text": "X"}, {"value": "b", "text": "X Resumo"}]
+    with pytest.raises(ExportError):
+        report_jobs(platforms, {"a": [], "b": []})
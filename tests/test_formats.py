@@ -0,0 +1,96 @@
+# tests/test_formats.py
+"""
+Testes dos formatos dos relatórios (formats.py): NDJSON, Arrow e a escolha do formato por `?format=` ou `Accept`.
+"""
+import io
+import json
+import pytest
+from werkzeug.datastructures import MIMEAccept
+import app as app_module
+import formats
+from formats import available_formats, parse_format, render_report, typed_value
+from reports import REPORT_HEADERS
+
+ROWS = [
+    {"Platform": "meta_ads", "Ad Name": "Conta ç", "clicks": 10, "impressions": "200", "spend": 1.5, "cpc": "N/A",
+     "ctr": 0.05},
+    {"Platform": "ga4", "Ad Name": "", "clicks": "inválido", "impressions": 3.0, "spend": None, "cpc": 0.1,
+     "ctr": "0.2"},
+]
+TYPED = [
+    {"Platform": "meta_ads", "Ad Name": "Conta ç", "clicks": 10, "impressions": 200, "spend": 1.5, "cpc": None,
+     "ctr": 0.05},
+    {"Platform": "ga4", "Ad Name": None, "clicks": None, "impressions": 3, "spend": None, "cpc": 0.1, "ctr": 0.2},
+]
+
+
+def test_typed_value():
+    assert typed_value("clicks", "12") == 12 and isinstance(typed_value("clicks", 12.0), int)
+    assert typed_value("spend", "1.25") == 1.25
+    assert typed_value("cpc", "N/A") is None
+    assert typed_value("status", 3) == "3" and typed_value("status", "") is None
+
+
+def test_ndjson():
+    lines = render_report(ROWS, REPORT_HEADERS, "ndjson").splitlines()
+    assert [json.loads(line) for line in lines] == TYPED
+    assert list(json.loads(lines[0])) == REPORT_HEADERS
+
+
+def test_arrow_round_trip():
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    chunks = list(formats.arrow_chunks(ROWS * 5, REPORT_HEADERS, batch_size=3))
+    reader = pyarrow.ipc.open_stream(io.BytesIO(b"".join(chunks)))
+    batches = list(reader)
+
+    assert [len(batch) for batch in batches] == [3, 3, 3, 1]
+    assert str(reader.schema.field("clicks").type) == "int64" and str(reader.schema.field("ctr").type) == "double"
+    assert pyarrow.Table.from_batches(batches).to_pylist() == TYPED * 5
+
+
+def test_parse_format():
+    assert parse_format(None) == "csv"
+    assert parse_format(" NDJSON ") == "ndjson"
+    assert parse_format(None, MIMEAccept([("application/x-ndjson", 1), ("text/plain", 0.5)])) == "ndjson"
+    assert parse_format(None, MIMEAccept([("*/*", 1)])) == "csv"
+    assert parse_format(None, MIMEAccept([("image/png", 1)])) == "csv"
+    with pytest.raises(ValueError):
+        parse_format("xml")
+
+
+def test_arrow_needs_pyarrow(monkeypatch):
+    monkeypatch.setattr(formats, "pyarrow", None)
+    assert "arrow" not in available_formats()
+    assert parse_format(None, MIMEAccept([("application/vnd.apache.arrow.stream", 1)])) == "csv"
+    with pytest.raises(ValueError):
+        parse_format("arrow")
+
+
+def test_live_report_formats(stub_api):
+    stub_api(platforms=2, accounts=4, ads_per_account=3)
+    client = app_module.app.test_client()
+
+    response = client.get("/geral", headers={"Accept": "application/x-ndjson"})
+    assert response.mimetype == "application/x-ndjson"
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert len(rows) == 12 and all(isinstance(row["clicks"], int) for row in rows)
+
+    response = client.get("/geral/resumo?format=ndjson")
+    assert [json.loads(line)["Platform"] for line in response.get_data(as_text=True).splitlines()] == [
+        "meta_ads", "ga4"]
+
+    assert client.get("/geral?format=xml").status_code == 400
+
+
+def test_live_arrow_report(stub_api):
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    stub_api(platforms=2, accounts=4, ads_per_account=3)
+    response = app_module.app.test_client().get("/facebook_ads?format=arrow")
+    assert response.mimetype == "application/vnd.apache.arrow.stream"
+    table = pyarrow.ipc.open_stream(io.BytesIO(response.data)).read_all()
+    assert table.num_rows == 6 and table.column_names == REPORT_HEADERS
+    assert set(table.column("Platform").to_pylist()) == {"meta_ads"}
@@ -0,0 +1,65 @@
+# tests/test_jsonstream.py
+"""
+Testes da leitura incremental das páginas da API (jsonstream.py), comparada com `json.loads` para todas as formas de
+dividir o corpo em pedaços.
+"""
+import json
+import pytest
+from jsonstream import iter_array
+
+DOCUMENT = {
+    "pagination": {"current": 1, "total": 3},
+    "insights": [
+        {"ad_name": "Anúncio ção 🚀", "clicks": 1234567, "spend": -12.5e-3, "status": None, "tags": ["a", "b"]},
+        {"ad_name": "aspas \" e \\ barra", "clicks": 0, "nested": {"list": [1, [2, {}]]}},
+        [],
+        "texto",
+        987654321,
+        True
+    ],
+    "extra": "fim"
+}
+
+
+def chunked(data, size):
+    return [data[start:start + size] for start in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+def test_every_chunk_size_gives_the_same_items(indent):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent).encode("utf-8")
+    for size in range(1, len(data) + 1, 3 if indent else 1):
+        rest = {}
+        assert list(iter_array(chunked(data, size), "insights", rest)) == DOCUMENT["insights"], size
+        assert rest == {"pagination": DOCUMENT["pagination"], "extra": "fim"}
+
+
+def test_number_split_between_chunks():
+    assert list(iter_array([b'{"insights": [12', b'34, 5', b'6]}'], "insights")) == [1234, 56]
+
+
+def test_items_are_yielded_as_they_arrive():
+    received = []
+
+    def chunks():
+        for chunk in (b'{"insights": [{"clicks": 1},', b' {"clicks": 2}', b']}'):
+            received.append(chunk)
+            yield chunk
+
+    items = iter_array(chunks(), "insights")
+    assert next(items) == {"clicks": 1}
+    assert len(received) == 1
+    assert list(items) == [{"clicks": 2}]
+
+
+@pytest.mark.parametrize("body", [b'{}', b'{"insights": []}', b'{"insights": null}', b'{"other": [1]}', b' { } '])
+def test_missing_or_empty_list(body):
+    assert list(iter_array([body], "insights")) == []
+
+
+@pytest.mark.parametrize("body", [
+    b'', b'[]', b'{"insights": [1, 2', b'{"insights": [1 2]}', b'{"insights": {"a": 1}}', b'{"insights": []} x',
+    b'{1: []}', b'{"insights" []}', b'{"insights": [1],}'])
+def test_invalid_json(body):
+    with pytest.raises(ValueError):
+        list(iter_array([body], "insights"))
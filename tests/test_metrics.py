@@ -0,0 +1,61 @@
+# tests/test_metrics.py
+"""
+Testes das métricas no formato do Prometheus (metrics.py) e da rota '/metrics'.
+"""
+import app as app_module
+from metrics import Registry, endpoint_name
+
+
+def test_counter_and_labels():
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requisições.", ("endpoint",))
+    counter.inc(endpoint="insights")
+    counter.inc(2, endpoint="insights")
+    counter.inc(endpoint='a"b\\c')
+    assert counter.value(endpoint="insights") == 3
+    assert counter.value(endpoint="accounts") == 0
+    assert registry.render().splitlines() == [
+        "# HELP requests_total Requisições.",
+        "# TYPE requests_total counter",
+        'requests_total{endpoint="insights"} 3',
+        'requests_total{endpoint="a\\"b\\\\c"} 1']
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Tempo.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert registry.render().splitlines()[2:] == [
+        'latency_seconds_bucket{le="0.1"} 2',
+        'latency_seconds_bucket{le="1.0"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 3.65",
+        "latency_seconds_count 4"]
+
+
+def test_callback_metric_reads_the_current_values():
+    registry = Registry()
+    values = {"hits": 1}
+    registry.callback("cache_hits", "Acertos.", lambda: [({"cache": "metadata"}, values["hits"])], type="counter")
+    values["hits"] = 5
+    assert registry.render().splitlines()[1:] == ["# TYPE cache_hits counter", 'cache_hits{cache="metadata"} 5']
+
+
+def test_endpoint_name():
+    assert endpoint_name("/api/insights") == "insights"
+    assert endpoint_name("/api/accounts/") == "accounts"
+    assert endpoint_name("/") == "root"
+
+
+def test_metrics_route_reports_upstream_and_route_timings(stub_api):
+    stub_api(platforms=1, accounts=2, ads_per_account=2)
+    client = app_module.app.test_client()
+    with client.get("/geral") as response:
+        assert response.status_code == 200 and response.get_data()
+
+    text = client.get("/metrics").get_data(as_text=True)
+
+    assert 'stract_upstream_request_seconds_count{endpoint="insights"}' in text
+    assert 'stract_route_seconds_count{route="/geral",status="200"}' in text
+    assert "# TYPE stract_upstream_errors_total counter" in text
@@ -0,0 +1,84 @@
+# tests/test_ordering.py
+"""
+Testes da ordenação e da paginação por cursor (ordering.py), com as linhas em memória (select_rows) e com o índice
+ordenado dos snapshots (RowIndex).
+"""
+import pytest
+from ordering import RowIndex, parse_selection, select_rows
+
+ROWS = [
+    {"Ad Name": "a", "budget": 9, "code": "B7", "spend": 3.0},
+    {"Ad Name": "b", "budget": "100", "code": "A1", "spend": "N/A"},
+    {"Ad Name": "c", "budget": 25, "code": 12, "spend": 1.5},
+    {"Ad Name": "d", "budget": None, "code": "N/A", "spend": 3.0},
+    {"Ad Name": "e", "budget": "12.5", "code": 3, "spend": 0.5},
+    {"Ad Name": "f", "budget": 25, "code": "a2", "spend": 2.0},
+    {"Ad Name": "g", "budget": "", "code": "B7", "spend": 3.0},
+]
+
+
+def names(rows):
+    return [row["Ad Name"] for row in rows]
+
+
+def select_all(rows, sort):
+    return select_rows(rows, parse_selection({"sort": sort}))[0]
+
+
+def test_numeric_extra_column_sorts_as_numbers():
+    assert names(select_all(ROWS, "budget")) == ["a", "e", "c", "f", "b", "d", "g"]
+    assert names(select_all(ROWS, "-budget")) == ["b", "c", "f", "e", "a", "d", "g"]
+
+
+def test_mixed_column_puts_numbers_before_text():
+    assert names(select_all(ROWS, "code")) == ["e", "c", "b", "a", "g", "f", "d"]
+    assert names(select_all(ROWS, "-code")) == ["f", "a", "g", "b", "c", "e", "d"]
+
+
+def test_metric_ties_keep_the_original_order():
+    assert names(select_all(ROWS, "-spend")) == ["a", "d", "g", "f", "c", "e", "b"]
+
+
+def pages(select, sort, limit):
+    """
+    Segue os cursores de `?limit=` até a última página e retorna as linhas de todas as páginas.
+    """
+    args = {"sort": sort, "limit": str(limit)}
+    rows = []
+    while True:
+        page, cursor = select(parse_selection(args))
+        rows += page
+        if cursor is None:
+            return rows
+        args = {"sort": sort, "limit": str(limit), "after": cursor}
+
+
+@pytest.mark.parametrize("sort", ["budget", "-budget", "code", "-code", "spend", "-spend", "Ad Name"])
+@pytest.mark.parametrize("limit", [1, 2, 3, 7])
+def test_cursor_pages_match_the_full_order(sort, limit):
+    expected = names(select_all(ROWS, sort))
+    index = RowIndex(ROWS)
+    assert names(pages(lambda selection: select_rows(ROWS, selection), sort, limit)) == expected
+    assert names(pages(index.select, sort, limit)) == expected
+
+
+def test_cursor_without_sort_continues_the_original_order():
+    index = RowIndex(ROWS)
+    expected = names(ROWS)
+    assert names(pages(lambda selection: select_rows(ROWS, selection), "", 3)) == expected
+    assert names(pages(index.select, "", 3)) == expected
+
+
+def test_cursor_from_another_sort_is_rejected():
+    _, cursor = select_rows(ROWS, parse_selection({"sort": "budget", "limit": "2"}))
+    with pytest.raises(ValueError):
+        parse_selection({"sort": "-budget", "after": cursor})
+    with pytest.raises(ValueError):
+        parse_selection({"sort": "budget", "after": "não é um cursor"})
+
+
+def test_top_requires_sort():
+    with pytest.raises(ValueError):
+        parse_selection({"top": "3"})
+    rows, cursor = select_rows(ROWS, parse_selection({"sort": "-budget", "top": "2"}))
+    assert (names(rows), cursor) == (["b", "c"], None)
@@ -0,0 +1,90 @@
+# tests/test_profiling.py
+"""
+Testes do perfil de requisições (profiling.py) e das rotas '/profiles'.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+import app as app_module
+import profiling
+from profiling import RequestProfile
+
+
+def test_nested_phases_are_not_counted_twice():
+    profile = RequestProfile(1, "/geral")
+    with profile.phase("wait"):
+        time.sleep(0.02)
+        with profile.phase("aggregate"):
+            time.sleep(0.05)
+        time.sleep(0.02)
+    assert 0.04 <= profile.phases["wait"] < 0.09
+    assert profile.phases["aggregate"] >= 0.05
+
+
+def test_phase_without_profile_does_nothing():
+    assert profiling.current() is None
+    with profiling.phase("aggregate"):
+        pass
+    items = [1, 2]
+    assert profiling.timed_iter("wait", items) is items
+    assert profiling.wrap(len) is len
+
+
+def test_timed_iter_and_thread_pool_tasks_use_the_request_profile():
+    profile, token, profiler = profiling.start("/geral")
+    try:
+        def slow_items():
+            for item in range(3):
+                time.sleep(0.02)
+                yield item
+
+        assert list(profiling.timed_iter("wait", slow_items())) == [0, 1, 2]
+
+        def task():
+            with profiling.phase("fetch"):
+                time.sleep(0.03)
+            return profiling.current()
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            assert executor.submit(profiling.wrap(task)).result() is profile
+            assert executor.submit(profiling.current).result() is None
+    finally:
+        profiling.reset(token)
+        profiling.finish(profile, profiler)
+
+    assert profile.phases["wait"] >= 0.06 and profile.phases["fetch"] >= 0.03
+    assert profiling.get_profile(profile.id) is profile
+    assert any("slow_items" in entry["function"] for entry in profile.top_functions(limit=100))
+
+
+def test_only_the_latest_profiles_are_kept(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_STORE_SIZE", 2)
+    profiles = []
+    for _ in range(3):
+        profile, token, profiler = profiling.start("/geral")
+        profiling.reset(token)
+        profiling.finish(profile, profiler)
+        profiles.append(profile)
+    assert [summary["id"] for summary in profiling.recent_profiles()] == [profiles[2].id, profiles[1].id]
+    assert profiling.get_profile(profiles[0].id) is None
+
+
+def test_profiled_request(monkeypatch, stub_api):
+    stub_api(platforms=2, accounts=4, ads_per_account=3)
+    monkeypatch.setattr(app_module, "PROFILING_ENABLED", True)
+    client = app_module.app.test_client()
+
+    with client.get("/geral/resumo", headers={"X-Profile": "1"}) as response:
+        assert response.status_code == 200 and response.get_data()
+        profile_id = int(response.headers["X-Profile-Id"])
+
+    report = client.get(f"/profiles/{profile_id}").get_json()
+    assert report["path"] == "/geral/resumo" and report["total_seconds"] > 0
+    assert set(report["phases"]) >= set(profiling.PHASES)
+    assert report["top_functions"]
+    assert profile_id in [summary["id"] for summary in client.get("/profiles").get_json()]
+    assert client.get("/profiles/999999").status_code == 404
+
+
+def test_profiles_are_disabled_by_default():
+    client = app_module.app.test_client()
+    assert client.get("/profiles").status_code == 404
@@ -0,0 +1,59 @@
+# tests/test_reports.py
+"""
+Testes da montagem dos relatórios (reports.py): CSV em pedaços, colunas pedidas e linhas de resumo.
+"""
+import csv
+import io
+import pytest
+import reports
+from reports import ALL_COLUMNS, REPORT_COLUMNS, REPORT_HEADERS, covered_by, csv_chunks, parse_columns, render_csv
+
+ROWS = [{"Platform": "meta_ads", "Ad Name": f"Anúncio {index}", "clicks": index, "impressions": index * 10,
+         "spend": index / 2, "cpc": 0.5, "ctr": 0.1} for index in range(200)]
+
+
+def test_chunks_are_whole_lines_and_join_into_the_full_csv(monkeypatch):
+    monkeypatch.setattr(reports, "CSV_CHUNK_SIZE", 256)
+    chunks = list(csv_chunks(ROWS))
+    assert len(chunks) > 10
+    assert all(chunk.endswith("\n") for chunk in chunks)
+    assert "".join(chunks) == render_csv(ROWS)
+    parsed = list(csv.DictReader(io.StringIO("".join(chunks))))
+    assert len(parsed) == 200 and parsed[199]["Ad Name"] == "Anúncio 199"
+
+
+def test_rows_are_read_as_the_chunks_are_sent(monkeypatch):
+    monkeypatch.setattr(reports, "CSV_CHUNK_SIZE", 256)
+    consumed = []
+
+    def rows():
+        for row in ROWS:
+            consumed.append(row)
+            yield row
+
+    chunks = csv_chunks(rows())
+    next(chunks)
+    assert 0 < len(consumed) < 20
+
+
+def test_missing_columns_are_empty_and_header_is_optional():
+    assert render_csv([{"Platform": "ga4", "clicks": 3}]) == ",".join(REPORT_HEADERS) + "\nga4,,3,,,,\n"
+    assert render_csv([{"Platform": "ga4"}], headers=["Platform"], write_header=False) == "ga4\n"
+    assert list(csv_chunks([])) == [",".join(REPORT_HEADERS) + "\n"]
+
+
+def test_parse_columns():
+    assert parse_columns(None) == REPORT_COLUMNS
+    assert parse_columns(" ") == REPORT_COLUMNS
+    assert parse_columns("spend, clicks,spend") == ("spend", "clicks")
+    assert parse_columns("all") == ALL_COLUMNS
+    assert parse_columns("all", allowed=REPORT_COLUMNS) == REPORT_COLUMNS
+    for value in ("clicks;drop", ",", "status"):
+        with pytest.raises(ValueError):
+            parse_columns(value, allowed=REPORT_COLUMNS if value == "status" else None)
+
+
+def test_covered_by():
+    assert covered_by(("clicks", "ctr"))
+    assert not covered_by(("clicks", "status"))
+    assert not covered_by(ALL_COLUMNS)
@@ -0,0 +1,151 @@
+# tests/test_scheduler.py
+"""
+Testes do agendador de requisições e do pool com fila por prioridade (scheduler.py).
+"""
+import threading
+import time
+import pytest
+from scheduler import BACKGROUND, INTERACTIVE, PriorityExecutor, RateScheduler, background, prioritized
+
+
+@pytest.fixture
+def executor():
+    executor = PriorityExecutor(max_workers=1, thread_name_prefix="test-priority")
+    yield executor
+    executor.shutdown()
+
+
+def test_interactive_tasks_run_before_queued_background_tasks(executor):
+    release = threading.Event()
+    order = []
+    executor.submit(release.wait)
+    with background():
+        futures = [executor.submit(order.append, f"background-{index}") for index in range(3)]
+    futures += [executor.submit(order.append, f"interactive-{index}") for index in range(2)]
+
+    release.set()
+    for future in futures:
+        future.result(timeout=5)
+
+    assert order == ["interactive-0", "interactive-1", "background-0", "background-1", "background-2"]
+
+
+def test_waiting_counts_by_priority(executor):
+    release = threading.Event()
+    executor.submit(release.wait)
+    with background():
+        executor.submit(lambda: None)
+    executor.submit(lambda: None)
+    time.sleep(0.05)
+    assert executor.waiting() == {"interactive": 1, "background": 1}
+    release.set()
+
+
+def test_map_keeps_order_and_exceptions():
+    executor = PriorityExecutor(max_workers=4)
+    try:
+        assert list(executor.map(lambda value: value * 2, range(20))) == [value * 2 for value in range(20)]
+        future = executor.submit(lambda: 1 / 0)
+        with pytest.raises(ZeroDivisionError):
+            future.result(timeout=5)
+    finally:
+        executor.shutdown()
+
+
+def test_threads_grow_up_to_max_workers():
+    executor = PriorityExecutor(max_workers=3)
+    release = threading.Event()
+    try:
+        futures = [executor.submit(release.wait) for _ in range(5)]
+        time.sleep(0.05)
+        assert len(executor._threads) == 3
+        release.set()
+        for future in futures:
+            future.result(timeout=5)
+    finally:
+        executor.shutdown()
+
+
+def test_cancelled_task_is_skipped(executor):
+    release = threading.Event()
+    executor.submit(release.wait)
+    cancelled = executor.submit(pytest.fail, "a tarefa cancelada não deveria rodar")
+    assert cancelled.cancel()
+    after = executor.submit(lambda: "ok")
+    release.set()
+    assert after.result(timeout=5) == "ok"
+
+
+def test_unlimited_scheduler_does_not_wait():
+    scheduler = RateScheduler(rate=None)
+    assert all(scheduler.acquire() < 0.05 for _ in range(100))
+
+
+def test_throttle_halves_the_measured_rate_and_caps_recovery():
+    scheduler = RateScheduler(rate=None, min_rate=1, increase=1e9, decrease=0.5)
+    for _ in range(64):
+        scheduler.acquire()
+    scheduler.on_throttle()
+
+    assert scheduler.rate is not None
+    ceiling = scheduler.ceiling
+    assert scheduler.rate == pytest.approx(max(1, ceiling * 0.5))
+    for _ in range(100000):
+        scheduler.on_success()
+    assert scheduler.rate == pytest.approx(ceiling)
+
+
+def test_recovery_never_passes_the_rate_of_the_last_throttle():
+    scheduler = RateScheduler(rate=100, min_rate=1, increase=10, decrease=0.5)
+    scheduler.on_throttle()
+    assert (scheduler.ceiling, scheduler.rate) == (100, 50)
+    scheduler._last_throttle -= 10
+    scheduler.rate = 40
+    scheduler.on_throttle()
+    assert (scheduler.ceiling, scheduler.rate) == (40, 20)
+    for _ in range(10000):
+        scheduler.on_success()
+    assert scheduler.rate == 40
+
+
+def test_configured_limit_caps_recovery():
+    scheduler = RateScheduler(rate=10, increase=10)
+    for _ in range(100):
+        scheduler.on_success()
+    assert scheduler.rate == 10
+
+
+def test_throttles_close_together_count_once():
+    scheduler = RateScheduler(rate=100, decrease=0.5)
+    scheduler.on_throttle()
+    scheduler.on_throttle()
+    assert scheduler.rate == 50
+    assert scheduler.throttles == 2
+
+
+def test_interactive_waiters_are_released_first():
+    scheduler = RateScheduler(rate=1000, burst=1)
+    scheduler.on_throttle(retry_after=0.2)
+    order = []
+
+    def acquire(name, priority):
+        with prioritized(priority):
+            scheduler.acquire()
+        order.append(name)
+
+    threads = [threading.Thread(target=acquire, args=("background", BACKGROUND))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=acquire, args=("interactive", INTERACTIVE)))
+    threads[1].start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert order == ["interactive", "background"]
+
+
+def test_try_acquire_respects_retry_after():
+    scheduler = RateScheduler(rate=None)
+    assert scheduler.try_acquire()
+    scheduler.on_throttle(retry_after=60)
+    assert not scheduler.try_acquire()
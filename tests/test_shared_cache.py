@@ -0,0 +1,149 @@
+# tests/test_shared_cache.py
+"""
+Testes do cache compartilhado entre os processos (shared_cache.py), em um arquivo SQLite temporário.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+import time
+import pytest
+import content_encoding
+from cache import TTLCache
+from shared_cache import SharedCache
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "shared.sqlite")
+
+
+def in_thread(func):
+    """
+    Executa `func()` em outra thread (outro dono de travas) e retorna o resultado.
+    """
+    result = []
+    thread = threading.Thread(target=lambda: result.append(func()))
+    thread.start()
+    thread.join(timeout=10)
+    return result[0]
+
+
+def test_loads_once_and_shares_between_instances(path):
+    first, second = SharedCache(path), SharedCache(path)
+    assert first.get_or_load("platforms", lambda: ["meta_ads"], 60) == ["meta_ads"]
+    assert second.get_or_load("platforms", lambda: pytest.fail("o valor deveria vir do arquivo"), 60) == ["meta_ads"]
+    assert (first.misses, second.hits) == (1, 1)
+
+
+def test_empty_values_are_not_stored(path):
+    cache = SharedCache(path)
+    assert cache.get_or_load("accounts", lambda: [], 60) == []
+    assert cache.get("accounts") is None
+
+
+def test_lease_belongs_to_one_owner(path):
+    cache = SharedCache(path, lease=60)
+    assert cache.acquire("snapshot")
+    assert cache.acquire("snapshot")
+    assert not in_thread(lambda: cache.acquire("snapshot"))
+    cache.release("snapshot")
+    assert in_thread(lambda: cache.acquire("snapshot"))
+
+
+def test_expired_lease_can_be_taken(path):
+    cache = SharedCache(path)
+    assert in_thread(lambda: cache.acquire("snapshot", lease=0.01))
+    time.sleep(0.02)
+    assert cache.acquire("snapshot")
+
+
+def test_stale_value_is_served_while_another_owner_loads(path):
+    cache = SharedCache(path, lease=60)
+    cache.set("fields", b'["clicks"]', -1)
+    assert in_thread(lambda: cache.acquire("fields"))
+    assert cache.get_or_load("fields", lambda: pytest.fail("outro dono tem a trava"), 60) == ["clicks"]
+    assert cache.stale_hits == 1
+
+
+def test_concurrent_threads_load_once(path):
+    cache = SharedCache(path)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        time.sleep(0.2)
+        return {"value": 1}
+
+    barrier = threading.Barrier(6)
+    results = []
+
+    def worker():
+        barrier.wait()
+        results.append(cache.get_or_load("report", loader, 60))
+
+    threads = [threading.Thread(target=worker) for _ in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert results == [{"value": 1}] * 6
+    assert len(calls) == 1
+    assert cache.waits == 5
+
+
+def load_in_process(path, marker_dir, start):
+    """
+    Executada em outro processo: espera o instante `start` e busca a chave, marcando em `marker_dir` se precisou
+    chamar o loader.
+    """
+    def loader():
+        open(os.path.join(marker_dir, str(os.getpid())), "w").close()
+        time.sleep(0.3)
+        return "valor"
+
+    time.sleep(max(0.0, start - time.time()))
+    return SharedCache(path).get_or_load("report", loader, 60)
+
+
+def test_processes_load_once(path, tmp_path):
+    markers = tmp_path / "markers"
+    markers.mkdir()
+    start = time.time() + 1.5
+    with multiprocessing.get_context("spawn").Pool(3) as pool:
+        results = pool.starmap(load_in_process, [(path, str(markers), start)] * 3)
+    assert results == ["valor"] * 3
+    assert len(os.listdir(markers)) == 1
+
+
+def test_prune_removes_old_entries_and_leases(path):
+    cache = SharedCache(path, lease=0)
+    cache.set("old", b"1", -1)
+    cache.set("new", b"2", 60)
+    in_thread(lambda: cache.acquire("lock", lease=-1))
+    cache.prune()
+    assert cache.get("old") is None and cache.get("new") is not None
+    assert cache._connection().execute("SELECT COUNT(*) FROM leases").fetchone()[0] == 0
+
+
+def test_file_errors_fall_back_to_the_loader(tmp_path, caplog):
+    cache = SharedCache(str(tmp_path / "missing" / "shared.sqlite"))
+    with caplog.at_level(logging.WARNING, logger="shared_cache"):
+        assert cache.get_or_load("platforms", lambda: ["meta_ads"], 60) == ["meta_ads"]
+    assert cache.errors >= 1 and cache.misses == 1
+    assert all(record.exc_info for record in caplog.records if record.name == "shared_cache")
+
+
+def test_encoded_reports_are_shared(monkeypatch, path):
+    monkeypatch.setattr(content_encoding, "shared_cache", SharedCache(path))
+    monkeypatch.setattr(content_encoding, "encoded_cache", TTLCache(max_size=4, ttl=float("inf"), stale_ttl=0))
+    assert content_encoding.cached_encoded("etag", lambda: (b"\x1f\x8bcorpo", "gzip")) == (b"\x1f\x8bcorpo", "gzip")
+    assert content_encoding.cached_encoded("plain", lambda: (b"corpo", None)) == (b"corpo", None)
+
+    monkeypatch.setattr(content_encoding, "encoded_cache", TTLCache(max_size=4, ttl=float("inf"), stale_ttl=0))
+    def load():
+        pytest.fail("o relatório deveria vir do cache compartilhado")
+
+    assert content_encoding.cached_encoded("etag", load) == (b"\x1f\x8bcorpo", "gzip")
+    assert content_encoding.cached_encoded("plain", load) == (b"corpo", None)
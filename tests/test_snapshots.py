@@ -0,0 +1,199 @@
+# tests/test_snapshots.py
+"""
+Testes da atualização dos snapshots (snapshots.py) com falhas da API: as buscas de view.py são substituídas por uma API
+falsa em memória.
+"""
+import os
+import pytest
+import snapshots
+from snapshots import SnapshotRefresher
+from store import InsightsTable
+
+
+def insight(platform, account, clicks):
+    return {"Platform": platform, "Ad Name": account, "clicks": clicks, "impressions": clicks * 10,
+            "spend": clicks / 2, "cpc": 0.5, "ctr": 0.1}
+
+
+class FakeApi:
+    """
+    API falsa: `data` é {plataforma: {id da conta: linhas}}. As plataformas de `failing` falham ao buscar contas e
+    campos, as contas de `failing_accounts` falham ao buscar insights e, com `down`, nenhuma plataforma é retornada.
+    """
+    def __init__(self, data):
+        self.data = data
+        self.failing = set()
+        self.failing_accounts = set()
+        self.down = False
+
+    def get_platforms(self):
+        return [] if self.down else [{"value": platform, "text": platform} for platform in self.data]
+
+    def fetch_all_accounts_and_fields(self, platforms):
+        return [{"platform": platform["value"],
+                 "accounts": {"accounts": [{"id": account} for account in self.data[platform["value"]]]},
+                 "fields": {"fields": []}}
+                for platform in platforms if platform["value"] not in self.failing]
+
+    def iter_account_results(self, platform_datas):
+        for platform_data in platform_datas:
+            platform = platform_data["platform"]
+            for account in platform_data["accounts"]["accounts"]:
+                failed = (platform, account["id"]) in self.failing_accounts
+                yield platform, account, None if failed else self.data[platform][account["id"]]
+
+
+@pytest.fixture
+def api(monkeypatch):
+    fake = FakeApi({
+        "meta_ads": {"m1": [insight("meta_ads", "Conta 1", 10)], "m2": [insight("meta_ads", "Conta 2", 20)]},
+        "ga4": {"g1": [insight("ga4", "Conta 3", 30), insight("ga4", "Conta 3", 40)]}
+    })
+    monkeypatch.setattr(snapshots, "get_platforms", fake.get_platforms)
+    monkeypatch.setattr(snapshots, "fetch_all_accounts_and_fields", fake.fetch_all_accounts_and_fields)
+    monkeypatch.setattr(snapshots, "iter_account_results", fake.iter_account_results)
+    return fake
+
+
+@pytest.fixture
+def refresher(tmp_path):
+    return SnapshotRefresher(interval=60, path=str(tmp_path / "insights.bin"))
+
+
+def clicks_by_platform(rows):
+    totals = {}
+    for row in rows:
+        totals[row["Platform"]] = totals.get(row["Platform"], 0) + row["clicks"]
+    return totals
+
+
+def test_refresh_builds_all_platforms(api, refresher):
+    snapshot = refresher.refresh()
+    assert clicks_by_platform(snapshot.rows()) == {"meta_ads": 30, "ga4": 70}
+    assert clicks_by_platform(InsightsTable.load(refresher.path).rows()) == {"meta_ads": 30, "ga4": 70}
+
+
+def test_refresh_serves_the_saved_file(api, refresher):
+    snapshot = refresher.refresh()
+    assert isinstance(snapshot, snapshots.TableSnapshot) and refresher.snapshot is snapshot
+    assert isinstance(refresher._built, snapshots.ReportSnapshot)
+    assert snapshot.digest == refresher._built.digest
+
+    in_memory = SnapshotRefresher(interval=60, path="")
+    assert isinstance(in_memory.refresh(), snapshots.ReportSnapshot)
+
+
+def test_only_changed_platforms_are_rebuilt(api, refresher):
+    first = refresher.refresh()
+    built = refresher._built
+    account = refresher._accounts[("ga4", "g1")]
+
+    unchanged = refresher.refresh()
+    assert unchanged is first
+    assert all(refresher._built.platform_reports[name] is built.platform_reports[name] for name in ("meta_ads", "ga4"))
+    assert (unchanged.digest, unchanged.modified_at) == (first.digest, first.modified_at)
+
+    api.data["meta_ads"]["m2"] = [insight("meta_ads", "Conta 2", 25)]
+    changed = refresher.refresh()
+    assert refresher._built.platform_reports["ga4"] is built.platform_reports["ga4"]
+    assert refresher._built.platform_reports["meta_ads"] is not built.platform_reports["meta_ads"]
+    assert ((changed.platform_reports["ga4"].digest, changed.platform_reports["ga4"].modified_at)
+            == (first.platform_reports["ga4"].digest, first.platform_reports["ga4"].modified_at))
+    assert refresher._accounts[("ga4", "g1")] is account
+    assert changed.digest != first.digest and changed.modified_at == changed.generated_at
+    assert clicks_by_platform(changed.rows()) == {"meta_ads": 35, "ga4": 70}
+    assert changed.summary_rows(("platform",))[0]["clicks"] == 35
+
+
+def test_failed_platform_keeps_its_rows(api, refresher):
+    refresher.refresh()
+    first = refresher._built
+    api.failing.add("ga4")
+    api.data["meta_ads"]["m1"] = [insight("meta_ads", "Conta 1", 15)]
+
+    snapshot = refresher.refresh()
+
+    assert clicks_by_platform(snapshot.rows()) == {"meta_ads": 35, "ga4": 70}
+    assert refresher._built.platform_reports["ga4"] is first.platform_reports["ga4"]
+    assert clicks_by_platform(InsightsTable.load(refresher.path).rows()) == {"meta_ads": 35, "ga4": 70}
+
+    restarted = SnapshotRefresher(interval=60, path=refresher.path)
+    assert clicks_by_platform(restarted.load().rows()) == {"meta_ads": 35, "ga4": 70}
+
+
+def test_failed_platform_keeps_its_rows_after_restart(api, refresher):
+    refresher.refresh()
+    restarted = SnapshotRefresher(interval=60, path=refresher.path)
+    restarted.load()
+    api.failing.add("meta_ads")
+    api.data["ga4"]["g1"] = [insight("ga4", "Conta 3", 5)]
+
+    snapshot = restarted.refresh()
+
+    assert clicks_by_platform(snapshot.rows()) == {"meta_ads": 30, "ga4": 5}
+    assert snapshot.summary_rows(("platform",))[0]["clicks"] == 30
+    assert clicks_by_platform(InsightsTable.load(refresher.path).rows()) == {"meta_ads": 30, "ga4": 5}
+    assert isinstance(restarted._built.platform_reports["meta_ads"], snapshots.TablePlatformReport)
+    assert isinstance(restarted._built.platform_reports["ga4"], snapshots.PlatformReport)
+
+
+def test_loaded_platform_reports_are_built_on_first_use(api, refresher, monkeypatch):
+    refresher.refresh()
+    built = []
+    original = snapshots.TableSnapshot._platform_report
+
+    def platform_report(self, platform):
+        built.append(platform)
+        return original(self, platform)
+
+    monkeypatch.setattr(snapshots.TableSnapshot, "_platform_report", platform_report)
+    snapshot = snapshots.TableSnapshot(InsightsTable.load(refresher.path))
+
+    assert built == [] and list(snapshot.platform_reports) == ["meta_ads", "ga4"]
+    assert "ga4" in snapshot.platform_reports and "tiktok" not in snapshot.platform_reports
+    assert snapshot.platform_reports.get("tiktok") is None and built == []
+    report = snapshot.platform_reports["ga4"]
+    assert snapshot.platform_reports["ga4"] is report and built == ["ga4"]
+    assert clicks_by_platform(report.rows) == {"ga4": 70}
+
+
+def test_failed_account_keeps_its_rows(api, refresher):
+    refresher.refresh()
+    api.failing_accounts.add(("meta_ads", "m2"))
+    snapshot = refresher.refresh()
+    assert clicks_by_platform(snapshot.rows()) == {"meta_ads": 30, "ga4": 70}
+
+
+def test_api_down_keeps_snapshot_and_file(api, refresher):
+    first = refresher.refresh()
+    saved = os.stat(refresher.path).st_mtime_ns
+    api.down = True
+
+    assert refresher.refresh() is first
+    assert refresher.snapshot is first
+    assert os.stat(refresher.path).st_mtime_ns == saved
+
+    api.down = False
+    api.failing.update(("meta_ads", "ga4"))
+    assert refresher.refresh() is first
+
+
+def test_api_down_before_first_snapshot_writes_nothing(api, refresher):
+    api.down = True
+    assert refresher.refresh() is None
+    assert not os.path.exists(refresher.path)
+
+
+def test_platform_removed_from_the_list_is_dropped(api, refresher):
+    refresher.refresh()
+    del api.data["ga4"]
+    snapshot = refresher.refresh()
+    assert clicks_by_platform(snapshot.rows()) == {"meta_ads": 30}
+    assert clicks_by_platform(InsightsTable.load(refresher.path).rows()) == {"meta_ads": 30}
+
+
+def test_invalid_snapshot_file_is_ignored(tmp_path):
+    path = tmp_path / "insights.bin"
+    path.write_bytes(b"not a snapshot file")
+    refresher = SnapshotRefresher(interval=60, path=str(path))
+    assert refresher.load() is None and refresher.snapshot is None
@@ -0,0 +1,142 @@
+# tests/test_store.py
+"""
+Testes da tabela de insights em colunas (store.py): conversão das linhas, resumos vetorizados (comparados com os do
+GroupAggregator) e o arquivo binário lido com mmap, com as plataformas como fatias das colunas mapeadas.
+"""
+import random
+import numpy as np
+import pytest
+from aggregate import GroupAggregator
+from store import FILE_ALIGNMENT, FILE_MAGIC, InsightsTable, parse_metric
+
+
+def random_rows(count, seed=7):
+    generator = random.Random(seed)
+    rows = []
+    for _ in range(count):
+        row = {"Platform": generator.choice(["meta_ads", "ga4", "tiktok"]),
+               "Ad Name": f"Conta {generator.randint(0, 9)}"}
+        for column in ("clicks", "impressions"):
+            row[column] = generator.randint(0, 1000)
+        for column in ("spend", "cpc", "ctr"):
+            row[column] = round(generator.uniform(0, 100), 3)
+        missing = generator.choice(["clicks", "spend", "cpc", "ctr", None, None])
+        if missing is not None:
+            row[missing] = generator.choice(["N/A", "", None, "inválido"])
+        rows.append(row)
+    return rows
+
+
+ROWS = random_rows(500)
+
+
+def test_parse_metric():
+    assert parse_metric("12.5") == (12.5, False)
+    assert parse_metric(3) == (3.0, False)
+    assert all(parse_metric(value) == (0.0, True) for value in (None, "", "N/A", "abc", [1]))
+
+
+def test_rows_round_trip():
+    rows = [{"Platform": "ga4", "Ad Name": "Conta 1", "clicks": 10, "impressions": "200", "spend": 1.5,
+             "cpc": "N/A", "ctr": 0.05},
+            {"Platform": "meta_ads", "Ad Name": "Conta 2", "clicks": 2.5, "impressions": 0, "spend": "",
+             "cpc": 0.1, "ctr": None}]
+    assert list(InsightsTable.from_rows(iter(rows)).rows()) == [
+        {"Platform": "ga4", "Ad Name": "Conta 1", "clicks": 10, "impressions": 200, "spend": 1.5, "cpc": "N/A",
+         "ctr": 0.05},
+        {"Platform": "meta_ads", "Ad Name": "Conta 2", "clicks": 2.5, "impressions": 0, "spend": "N/A", "cpc": 0.1,
+         "ctr": "N/A"}]
+
+
+@pytest.mark.parametrize("keys", [("platform",), ("account",), ("platform", "account"), ()])
+def test_group_by_matches_the_aggregator(keys):
+    expected = GroupAggregator(keys).update(ROWS).results()
+    result = InsightsTable.from_rows(ROWS).group_by(keys)
+    assert [(group["platform"], group["account"], group["count"]) for group in result] == [
+        (group["platform"], group["account"], group["count"]) for group in expected]
+    for group, expected_group in zip(result, expected):
+        for column in ("clicks", "impressions", "spend", "cpc", "ctr"):
+            assert group[column] == pytest.approx(expected_group[column])
+
+
+def test_where_platform():
+    table = InsightsTable.from_rows(ROWS)
+    ga4 = table.where_platform("ga4")
+    assert len(ga4) == sum(row["Platform"] == "ga4" for row in ROWS)
+    assert {row["Platform"] for row in ga4.rows()} == {"ga4"}
+    assert len(table.where_platform("desconhecida")) == 0
+
+
+def test_empty_table_and_invalid_keys():
+    table = InsightsTable.from_rows([])
+    assert len(table) == 0 and table.group_by(("platform",)) == [] and list(table.rows()) == []
+    with pytest.raises(ValueError):
+        table.group_by(("campaign",))
+
+
+def test_save_and_load(tmp_path):
+    path = str(tmp_path / "insights.bin")
+    table = InsightsTable.from_rows(ROWS)
+    table.save(path, digest="abc", platforms={"ga4": {"digest": "1"}})
+
+    loaded = InsightsTable.load(path)
+    grouped = InsightsTable.from_rows(sorted(ROWS, key=lambda row: table.platforms.index(row["Platform"])))
+
+    assert loaded.metadata == {"digest": "abc", "platforms": {"ga4": {"digest": "1"}}}
+    assert list(loaded.rows()) == list(grouped.rows())
+    assert loaded.group_by(("platform", "account")) == grouped.group_by(("platform", "account"))
+    assert loaded.group_by(("platform",)) == table.group_by(("platform",))
+    assert not loaded.values["clicks"].flags.writeable
+    with open(path, "rb") as file:
+        data = file.read()
+    assert data.startswith(FILE_MAGIC) and len(data) % FILE_ALIGNMENT == 0
+
+
+def test_loaded_platforms_are_slices_of_the_file(tmp_path):
+    path = str(tmp_path / "insights.bin")
+    table = InsightsTable.from_rows(ROWS)
+    table.save(path)
+    loaded = InsightsTable.load(path)
+
+    start = 0
+    for platform in table.platforms:
+        expected = table.where_platform(platform)
+        part = loaded.where_platform(platform)
+        assert loaded.platform_ranges[platform] == (start, start + len(expected))
+        assert list(part.rows()) == list(expected.rows())
+        assert part.group_by(("account",)) == expected.group_by(("account",))
+        for column in ("clicks", "spend"):
+            assert part.values[column].base is not None
+            assert np.shares_memory(part.values[column], loaded.values[column])
+            assert np.shares_memory(part.missing[column], loaded.missing[column])
+        start += len(expected)
+    assert start == len(loaded)
+    assert len(loaded.where_platform("desconhecida")) == 0
+    assert table.where_platform("ga4").platform_ranges == {"ga4": (0, len(table.where_platform("ga4")))}
+
+
+def test_empty_table_round_trip(tmp_path):
+    path = str(tmp_path / "insights.bin")
+    InsightsTable.from_rows([]).save(path)
+    loaded = InsightsTable.load(path)
+    assert len(loaded) == 0 and loaded.metadata == {}
+
+
+def test_loaded_table_survives_replacing_the_file(tmp_path):
+    path = str(tmp_path / "insights.bin")
+    InsightsTable.from_rows(ROWS[:10]).save(path)
+    old = InsightsTable.load(path)
+    expected = list(old.rows())
+
+    InsightsTable.from_rows(ROWS[10:]).save(path)
+
+    assert list(old.rows()) == expected
+    assert len(InsightsTable.load(path)) == len(ROWS) - 10
+    assert sorted(file.name for file in tmp_path.iterdir()) == ["insights.bin"]
+
+
+def test_invalid_file(tmp_path):
+    path = tmp_path / "insights.bin"
+    path.write_bytes(b"not a snapshot file")
+    with pytest.raises(ValueError):
+        InsightsTable.load(str(path))
@@ -0,0 +1,114 @@
+# tests/test_view.py
+"""
+Testes das buscas de insights (view.py): apenas os campos pedidos no relatório são buscados na API, e a leitura
+incremental das páginas retorna as mesmas linhas que a leitura da página inteira, e as buscas em paralelo mantêm a
+ordem de plataforma e conta sem passar do limite de requisições simultâneas.
+"""
+import threading
+from itertools import groupby
+import app as app_module
+import client as client_module
+import view
+from reports import ALL_COLUMNS
+from scheduler import PriorityExecutor
+from view import _account_tasks, union_columns
+
+
+def platform_data(platform, fields, accounts=1):
+    return {"platform": platform,
+            "accounts": {"accounts": [{"id": f"{platform}-{index}"} for index in range(accounts)]},
+            "fields": {"fields": [{"value": field} for field in fields]}}
+
+
+META = platform_data("meta_ads", ["ad_name", "clicks", "impressions", "spend", "cpc", "ctr", "status"], accounts=2)
+GA4 = platform_data("ga4", ["ad_name", "clicks", "impressions", "spend", "ctr", "status"])
+
+
+def test_only_requested_fields_are_fetched():
+    tasks = _account_tasks(META, ("spend", "clicks"))
+    assert [task[1]["id"] for task in tasks] == ["meta_ads-0", "meta_ads-1"]
+    assert tasks[0][2] == ["clicks", "spend"] and tasks[0][3] == ("spend", "clicks")
+    assert _account_tasks(GA4, ("cpc", "ctr"))[0][2] == ["ctr"]
+    assert _account_tasks(GA4, ("cpc",))[0][2] == ["ad_name"]
+    assert _account_tasks(GA4, ALL_COLUMNS)[0][2] == ["ad_name", "clicks", "impressions", "spend", "ctr", "status"]
+
+
+def test_union_columns_keeps_the_first_order():
+    assert union_columns([GA4, META]) == ("ad_name", "clicks", "impressions", "spend", "ctr", "status", "cpc")
+
+
+def test_routes_request_only_the_report_columns(monkeypatch, stub_api):
+    stub_api(platforms=2, accounts=4, ads_per_account=2)
+    requested = []
+    original = view.iter_account_insights
+
+    def recording(platform, account, fields, *args, **kwargs):
+        requested.append((platform, tuple(fields)))
+        return original(platform, account, fields, *args, **kwargs)
+
+    monkeypatch.setattr(view, "iter_account_insights", recording)
+    client = app_module.app.test_client()
+
+    text = client.get("/facebook_ads?columns=spend,clicks").get_data(as_text=True)
+    assert text.splitlines()[0] == "Platform,Ad Name,spend,clicks"
+    assert set(requested) == {("meta_ads", ("clicks", "spend"))}
+
+    requested.clear()
+    lines = client.get("/geral?columns=all").get_data(as_text=True).splitlines()
+    assert lines[0] == "Platform,Ad Name,ad_name,clicks,impressions,spend,cpc,ctr,status"
+    assert len(lines) == 9
+    assert {fields for _, fields in requested} == {
+        ("ad_name", "clicks", "impressions", "spend", "cpc", "ctr", "status"),
+        ("ad_name", "clicks", "impressions", "spend", "ctr", "status")}
+
+
+def test_streamed_pages_match_whole_pages(monkeypatch, stub_api):
+    stub_api(platforms=1, accounts=2, ads_per_account=25, page_size=10)
+    account = {"id": "meta_ads-1", "name": "Conta 1", "token": "token-meta_ads-1"}
+    fields = ["clicks", "impressions", "spend", "cpc", "ctr"]
+    results = {}
+    for stream in (True, False):
+        monkeypatch.setattr(view, "STREAM_INSIGHTS", stream)
+        results[stream] = list(view.iter_account_insights("meta_ads", account, fields))
+    assert len(results[True]) == 25
+    assert results[True] == results[False]
+
+
+class InFlight:
+    """
+    Conta quantas chamadas de `func` estão em andamento ao mesmo tempo e guarda o maior valor observado.
+    """
+    def __init__(self, func):
+        self.func = func
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, *args, **kwargs):
+        with self.lock:
+            self.current += 1
+            self.peak = max(self.peak, self.current)
+        try:
+            return self.func(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.current -= 1
+
+
+def test_all_insights_keep_the_order_and_the_in_flight_limit(monkeypatch, stub_api):
+    stub_api(platforms=3, accounts=24, ads_per_account=3, jitter=0.03, seed=7)
+    requests_in_flight = InFlight(client_module.client.session.get)
+    accounts_in_flight = InFlight(view._fetch_account_rows)
+    monkeypatch.setattr(client_module.client.session, "get", requests_in_flight)
+    monkeypatch.setattr(client_module.client, "_in_flight", threading.BoundedSemaphore(3))
+    monkeypatch.setattr(view, "_fetch_account_rows", accounts_in_flight)
+    monkeypatch.setattr(view, "_executor", PriorityExecutor(max_workers=3))
+
+    rows = list(view.iter_all_insights(view.get_platforms()))
+
+    assert len(rows) == 72
+    accounts = [key for key, _ in groupby((row["Platform"], row["Ad Name"]) for row in rows)]
+    assert accounts == [(platform, f"Conta {index}") for platform in ("meta_ads", "ga4", "tiktok_insights")
+                        for index in range(8)]
+    assert 1 < requests_in_flight.peak <= 3
+    assert 1 < accounts_in_flight.peak <= 3
@@ -23,45 +23,309 @@ Este é o resumo de tudo o que foi feito neste arquivo.
 """
 import requests 
 import json
-from authentication import get_api_headers
+import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from concurrent.futures import TimeoutError as FuturesTimeoutError
+from breaker import CircuitBreaker
+from cache import TTLCache
+from client import client, close_response, SingleFlight
+from config import (MAX_IN_FLIGHT, PAGE_PREFETCH, METADATA_CACHE_SIZE, METADATA_STALE_TTL, PLATFORMS_TTL,
+                    ACCOUNTS_TTL, FIELDS_TTL, LOG_LEVEL, BREAKER_FAILURES, BREAKER_COOLDOWN, STREAM_INSIGHTS)
+from jsonstream import iter_array
+from metrics import registry, rows_ingested, endpoint_name
+from profiling import phase, timed_iter, wrap
+from reports import REPORT_COLUMNS, ALL_COLUMNS
+from scheduler import BACKGROUND, PriorityExecutor, current_priority, prioritized
+from shared_cache import shared_cache
 """
-A biblioteca `requests` é usada para enviar requisições HTTP para a API externa e obter dados de plataformas, contas e campos.
+A biblioteca `requests` é usada para identificar as exceções de rede lançadas pelo cliente HTTP.
 A biblioteca `json` é usada para formatar e manipular os dados JSON recebidos da API.
-A função `get_api_headers` é importada para garantir que o token de autenticação necessário seja incluído nas requisições.
+A biblioteca `logging` registra as mensagens de erro e, em nível de depuração, o conteúdo das respostas da API.
+A biblioteca `time` controla o prazo das coletas com tempo limite.
+O `deque` é usado como fila das páginas que estão sendo buscadas antecipadamente.
+O `ThreadPoolExecutor` é usado para buscar páginas antecipadamente em paralelo, e `as_completed` e `wait` esperam pelas
+requisições de contas e insights respeitando um prazo.
+O `CircuitBreaker` deixa de consultar plataformas e contas que falham seguidamente.
+O `TTLCache` guarda em memória as plataformas, contas e campos, que mudam raramente.
+O `client` é o cliente HTTP compartilhado (client.py), que reaproveita conexões, inclui o token de autenticação e repete
+as requisições que falharem por erros transitórios. O `SingleFlight` junta as buscas de insights idênticas feitas ao
+mesmo tempo por relatórios diferentes, e `close_response` fecha as páginas buscadas antecipadamente que não serão lidas.
+A função `iter_array` lê os itens das páginas de insights à medida que o corpo da resposta chega.
+O valor `MAX_IN_FLIGHT` limita quantas requisições podem estar em andamento ao mesmo tempo e `PAGE_PREFETCH` limita
+quantas páginas de um mesmo endpoint são buscadas antecipadamente. Os valores de TTL definem por quanto tempo
+plataformas, contas e campos ficam em cache. `LOG_LEVEL` define o nível das mensagens quando o arquivo é executado
+diretamente. `BREAKER_FAILURES` e `BREAKER_COOLDOWN` configuram os disjuntores. `STREAM_INSIGHTS` ativa a leitura
+incremental das páginas de insights.
+O `registry` e o contador `rows_ingested` de `metrics` expõem em '/metrics' os itens recebidos, os acertos do cache e
+as requisições juntadas; `endpoint_name` dá o nome do endpoint usado nos rótulos.
+As funções `phase`, `timed_iter` e `wrap` de `profiling` marcam a leitura do JSON e levam o perfil da requisição para as
+tarefas enviadas aos pools de threads. `REPORT_COLUMNS` e `ALL_COLUMNS` de `reports` definem as colunas de insights pedidas
+à API quando o relatório não informa outras e o valor que pede todos os campos. Da mesma forma, `current_priority` e
+`prioritized` de `scheduler` levam a prioridade das requisições (relatório pedido pelo usuário ou trabalho em segundo
+plano) para essas tarefas, e o `PriorityExecutor` é o pool que executa primeiro as tarefas dos relatórios pedidos pelo
+usuário.
+O `shared_cache` (quando configurado) guarda plataformas, contas e campos em um arquivo compartilhado por todos os
+processos do servidor, para que apenas um deles consulte a API quando o cache vence.
 """
+
+logger = logging.getLogger(__name__)
+"""
+Antes todas as respostas de plataformas, contas e campos eram impressas inteiras com `json.dumps(indent=4)`, o que
+custava tempo de formatação e escrita no console a cada requisição. Agora elas só são formatadas com o nível DEBUG ativo.
+"""
+
+_executor = PriorityExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="stract-fetch")
+"""
+Pool de threads compartilhado por todas as requisições à API. Como o tamanho do pool é limitado por `MAX_IN_FLIGHT`,
+mesmo que várias rotas sejam chamadas ao mesmo tempo, a API externa nunca recebe mais do que esse número de requisições
+simultâneas. As tarefas enviadas ao pool fazem apenas requisições, nunca esperam por outras tarefas do mesmo pool.
+A fila do pool é ordenada por prioridade: as contas de um relatório pedido pelo usuário passam na frente das contas da
+atualização em segundo plano que ainda não começaram (ver scheduler.PriorityExecutor).
+"""
+
+registry.callback(
+    "stract_fetch_queue", "Tarefas esperando no pool de buscas à API, por prioridade.",
+    lambda: [({"priority": name}, count) for name, count in _executor.waiting().items()])
+
+
+def _task(func, priority=None):
+    """
+    Prepara `func` para ser executada em um dos pools levando a prioridade das requisições do contexto atual (ou a
+    informada em `priority`) e o perfil da requisição, se houver.
+    """
+    priority = current_priority() if priority is None else priority
+    func = wrap(func)
+
+    def run(*args, **kwargs):
+        with prioritized(priority):
+            return func(*args, **kwargs)
+
+    return run
+
+
+def _map_ordered(func, items):
+    """
+    Executa `func` para cada item em paralelo no pool compartilhado.
+    Retorna a lista de resultados na mesma ordem dos itens de entrada, independente da ordem em que as respostas chegarem.
+    """
+    return list(_executor.map(_task(func), items))
+
+
+_page_executor = ThreadPoolExecutor(max_workers=MAX_IN_FLIGHT, thread_name_prefix="stract-page")
+"""
+Pool de threads separado para a busca antecipada de páginas. As tarefas do `_executor` percorrem páginas e esperam por
+elas, então as páginas não podem ser enviadas para o mesmo pool sem risco de todas as threads ficarem esperando umas
+pelas outras.
+"""
+
+
+class ApiError(Exception):
+    """
+    Erro lançado quando a API externa responde com um status diferente de 200.
+    Guarda a URL, os parâmetros e o status da resposta para que a mensagem de erro seja útil.
+    """
+    def __init__(self, url, params, status_code, body=None):
+        super().__init__(f"{url} {params} retornou {status_code}")
+        self.url = url
+        self.params = params
+        self.status_code = status_code
+        self.body = body
+
+
+class CircuitOpenError(ApiError):
+    """
+    Erro lançado, sem acessar a API, quando o disjuntor da plataforma ou da conta está aberto.
+    """
+    def __init__(self, url, params):
+        super().__init__(url, params, None, "disjuntor aberto")
+
+
+platform_breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+account_breaker = CircuitBreaker(BREAKER_FAILURES, BREAKER_COOLDOWN)
+"""
+Disjuntores por plataforma (alimentado pelas buscas de contas, campos e insights) e por conta (plataforma, id da conta).
+"""
+
+
+def fetch_page(url, params, page):
+    """
+    Busca uma única página de um endpoint paginado da API. `url` é o caminho do endpoint, como '/api/accounts'.
+    Retorna o JSON da página ou lança `ApiError` caso a requisição não seja bem-sucedida.
+    """
+    try:
+        response = client.get(url, params={**params, "page": page})
+    except requests.RequestException as error:
+        raise ApiError(url, params, None, str(error)) from error
+    if response.status_code != 200:
+        raise ApiError(url, params, response.status_code, response.text)
+    with phase('parse'):
+        return response.json()
+
+
+def open_page(url, params, page):
+    """
+    Versão de fetch_page() com leitura incremental: envia a requisição da página e retorna a resposta assim que os
+    cabeçalhos chegam, sem ler o corpo, que é lido depois por iter_page_items().
+    Lança `ApiError` caso a requisição não seja bem-sucedida.
+    """
+    try:
+        response = client.get(url, params={**params, "page": page}, stream=True)
+    except requests.RequestException as error:
+        raise ApiError(url, params, None, str(error)) from error
+    if response.status_code != 200:
+        try:
+            body = response.text
+        finally:
+            response.close()
+        raise ApiError(url, params, response.status_code, body)
+    return response
+
+
+def iter_page_items(url, params, response, key, rest=None):
+    """
+    Lê o corpo de uma página aberta por open_page() em pedaços e gera os itens da lista `key` um a um, à medida que
+    chegam. Os demais campos da página, como 'pagination', são guardados em `rest` e ficam completos no fim da página.
+    A memória usada não depende do tamanho da página: apenas o item atual e o pedaço em leitura ficam guardados.
+    O tempo de leitura do corpo, inclusive a espera pelos pedaços seguintes, conta na fase 'parse' do perfil.
+    Lança `ApiError` se a conexão cair no meio do corpo ou se o JSON for inválido.
+    """
+    count = 0
+    try:
+        for item in timed_iter('parse', iter_array(client.iter_body(response, endpoint_name(url)), key, rest)):
+            count += 1
+            yield item
+    except (requests.RequestException, ValueError) as error:
+        raise ApiError(url, params, None, str(error)) from error
+    finally:
+        response.close()
+        rows_ingested.inc(count, endpoint=key)
+
+
+def _page_items(url, params, key, page, stream, rest=None):
+    """
+    Itens da lista `key` de uma página: lidos em pedaços da resposta aberta por open_page() (`stream`) ou do JSON já
+    lido por fetch_page(). Os demais campos da página, como 'pagination', são copiados para `rest`.
+    """
+    if stream:
+        return iter_page_items(url, params, page, key, rest)
+    if rest is not None:
+        rest.update((name, value) for name, value in page.items() if name != key)
+    items = page.get(key, [])
+    rows_ingested.inc(len(items), endpoint=key)
+    return items
+
+
+def total_pages(data):
+    """
+    Lê a quantidade total de páginas a partir da chave 'pagination' da resposta ({"current": 1, "total": N}).
+    Respostas sem a chave são tratadas como tendo uma única página.
+    """
+    pagination = data.get('pagination') or {}
+    try:
+        return max(1, int(pagination.get('total', 1)))
+    except (TypeError, ValueError):
+        return 1
+
+
+def iter_pages(url, params, key, stream=False):
+    """
+    Percorre todas as páginas de um endpoint paginado e gera, um a um, os itens da lista `key` de cada página.
+    Antes, a chave 'pagination' era apenas descartada e somente a primeira página era lida.
+    A primeira página informa o total de páginas; a partir daí até `PAGE_PREFETCH` páginas seguintes são buscadas em
+    paralelo enquanto os itens das anteriores são consumidos. As páginas são geradas em ordem e apenas a janela de busca
+    antecipada fica em memória, independente do total de páginas. As páginas buscadas antecipadamente têm prioridade
+    de segundo plano no agendador, para não passarem na frente da primeira página de outras contas.
+    Com `stream`, os itens de cada página são gerados à medida que o corpo chega (ver iter_page_items()). O total de
+    páginas só é conhecido ao fim da primeira, e as páginas buscadas antecipadamente ficam com o corpo ainda não lido
+    até a sua vez, então a memória não depende do tamanho das páginas.
+    Lança `ApiError` caso alguma página não possa ser obtida.
+    """
+    fetch = open_page if stream else fetch_page
+    first_page = fetch(url, params, 1)
+    header = {}
+    yield from _page_items(url, params, key, first_page, stream, header)
+    last_page = total_pages(header)
+    del first_page
+
+    pending = deque()
+    next_page = 2
+    try:
+        while pending or next_page <= last_page:
+            while next_page <= last_page and len(pending) < PAGE_PREFETCH:
+                pending.append(_page_executor.submit(_task(fetch, BACKGROUND), url, params, next_page))
+                next_page += 1
+            yield from _page_items(url, params, key, pending.popleft().result(), stream)
+    finally:
+        for future in pending:
+            if not future.cancel() and stream:
+                future.add_done_callback(close_response)
+
+
 def fetch_platforms():
     """
     Primeira requisição.
     Faz uma requisição à API para obter as plataformas disponíveis.
     Retorna uma lista com as plataformas se a requisição for bem-sucedida.
-    Caso contrário, imprime uma mensagem de erro e retorna uma lista vazia.
+    Caso contrário, registra uma mensagem de erro e retorna uma lista vazia.
     """
-    url = "https://sidebar.stract.to/api/platforms"
-    headers = get_api_headers()
-    response = requests.get(url, headers=headers)
+    try:
+        response = client.get("/api/platforms")
+    except requests.RequestException as error:
+        logger.error("Erro ao obter plataformas: %s", error)
+        return []
     if response.status_code == 200:
-        platforms_data = response.json()
-        print("Plataformas disponíveis:", json.dumps(platforms_data, indent=4))
-        return platforms_data.get('platforms', [])
+        with phase('parse'):
+            platforms_data = response.json()
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Plataformas disponíveis: %s", json.dumps(platforms_data, indent=4))
+        platforms = platforms_data.get('platforms', [])
+        rows_ingested.inc(len(platforms), endpoint="platforms")
+        return platforms
     else:
-        print(f"Erro ao obter plataformas: {response.status_code}")
-        print("Resposta da API:", response.json())
+        logger.error("Erro ao obter plataformas: %s", response.status_code)
+        logger.error("Resposta da API: %s", response.text)
         return []
 
 
-def remove_pagination(data):
+def platform_slug(platform):
+    """
+    Retorna o nome da plataforma no formato usado nas URLs: minúsculo e com '_' no lugar dos espaços.
+    Exemplo: 'Facebook Ads' -> 'facebook_ads'.
+    """
+    return platform['text'].replace(" ", "_").lower()
+
+
+def fetch_accounts(platform):
+    """
+    Busca todas as páginas de contas de uma plataforma. Lança `ApiError` em caso de erro.
+    """
+    accounts = list(iter_pages("/api/accounts", {"platform": platform}, "accounts"))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Contas para %s: %s", platform, json.dumps(accounts, indent=4))
+    return accounts
+
+
+def fetch_fields(platform):
     """
-    Foi percebido que existia uma chave e valor que não deveriam ser inseridos no objeto final, então deveria se descartado.
-    Remove a chave 'pagination' de um objeto JSON ou dicionário, recursivamente.
-    A função modifica o objeto de entrada diretamente.
+    Busca todas as páginas de campos de uma plataforma. Lança `ApiError` em caso de erro.
     """
-    if isinstance(data, dict):
-        data.pop('pagination', None)
-        for key, value in data.items():
-            remove_pagination(value)
-    elif isinstance(data, list):
-        for item in data:
-            remove_pagination(item)
+    fields = list(iter_pages("/api/fields", {"platform": platform}, "fields"))
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("Campos para %s: %s", platform, json.dumps(fields, indent=4))
+    return fields
+
+
+def _platform_data(platform, accounts, fields):
+    """
+    Monta o dicionário com as contas e campos de uma plataforma, no formato esperado por fetch_insights().
+    """
+    return {
+        "platform": platform,
+        "accounts": {"accounts": accounts},
+        "fields": {"fields": fields}
+    }
 
 
 def fetch_accounts_and_fields(platform):
@@ -70,74 +334,391 @@ def fetch_accounts_and_fields(platform):
     Faz requisições à API para obter as contas e os campos com base nas plataformas específicas obtidas em fetch_platforms().
     Retorna um dicionário com as contas e campos da plataforma, ou None em caso de erro.
     """
-    headers = get_api_headers()
-    accounts_url = f"https://sidebar.stract.to/api/accounts?platform={platform}"
-    accounts_response = requests.get(accounts_url, headers=headers)
-    fields_url = f"https://sidebar.stract.to/api/fields?platform={platform}"
-    fields_response = requests.get(fields_url, headers=headers)
-    
-    if accounts_response.status_code == 200 and fields_response.status_code == 200:
-        accounts_data = accounts_response.json()
-        fields_data = fields_response.json()
-        remove_pagination(accounts_data)
-        remove_pagination(fields_data)
-        print(f"Contas para {platform}: {json.dumps(accounts_data, indent=4)}")
-        print(f"Campos para {platform}: {json.dumps(fields_data, indent=4)}")
-        platform_data = {
-            "platform": platform,
-            "accounts": {"accounts": accounts_data.get("accounts", [])},
-            "fields": {"fields": fields_data.get("fields", [])}
-        }
-        return platform_data
-    else:
-        print(f"Erro ao obter dados para a plataforma {platform}")
-        print("Resposta de contas:", accounts_response.json())
-        print("Resposta de campos:", fields_response.json())
+    try:
+        return _platform_data(platform, fetch_accounts(platform), fetch_fields(platform))
+    except ApiError as error:
+        logger.error("Erro ao obter dados para a plataforma %s: %s", platform, error.status_code)
+        logger.error("Resposta da API: %s", error.body)
         return None
 
 
-def fetch_insights(platform_data):
+metadata_cache = TTLCache(max_size=METADATA_CACHE_SIZE, ttl=ACCOUNTS_TTL, stale_ttl=METADATA_STALE_TTL)
+"""
+Cache das respostas de plataformas, contas e campos. As chaves são 'platforms', ('accounts', plataforma) e
+('fields', plataforma), cada uma com seu próprio TTL.
+"""
+
+
+def _shared(key, loader, ttl):
+    """
+    Faz o `loader` de uma chave do `metadata_cache` passar antes pelo cache compartilhado entre os processos, quando ele
+    está configurado: o valor buscado por um processo é aproveitado pelos demais, e só um processo por vez consulta a
+    API para a mesma chave.
+    """
+    if shared_cache is None:
+        return loader
+    return lambda: shared_cache.get_or_load(f"metadata:{key}", loader, ttl)
+
+
+registry.callback(
+    "stract_cache_requests_total", "Consultas ao cache de plataformas, contas e campos, por resultado.",
+    lambda: [({"cache": "metadata", "result": "hit"}, metadata_cache.hits),
+             ({"cache": "metadata", "result": "stale"}, metadata_cache.stale_hits),
+             ({"cache": "metadata", "result": "miss"}, metadata_cache.misses)],
+    type="counter")
+registry.callback(
+    "stract_cache_hit_ratio", "Fração das consultas ao cache respondidas sem esperar pela API (inclui valores vencidos).",
+    lambda: [({"cache": "metadata"}, metadata_cache.hit_ratio())])
+
+
+def _load_platforms():
+    """
+    Busca as plataformas e monta junto o índice por nome de URL, para que a rota `/<plataforma>` não precise percorrer
+    a lista a cada chamada.
+    """
+    platforms = fetch_platforms()
+    if not platforms:
+        return None
+    return {
+        "platforms": platforms,
+        "by_slug": {platform_slug(platform): platform for platform in platforms}
+    }
+
+
+def get_platforms():
+    """
+    Versão em cache de fetch_platforms(). Retorna a lista de plataformas, ou uma lista vazia em caso de erro.
+    """
+    cached = metadata_cache.get_or_load("platforms", _shared("platforms", _load_platforms, PLATFORMS_TTL),
+                                        ttl=PLATFORMS_TTL)
+    return cached["platforms"] if cached else []
+
+
+def get_platform_by_slug(slug):
+    """
+    Retorna a plataforma cujo nome de URL (ver platform_slug()) é igual a `slug`, ou None se ela não existir.
+    """
+    cached = metadata_cache.get_or_load("platforms", _shared("platforms", _load_platforms, PLATFORMS_TTL),
+                                        ttl=PLATFORMS_TTL)
+    return cached["by_slug"].get(slug.lower()) if cached else None
+
+
+def get_accounts_and_fields(platform):
+    """
+    Versão em cache de fetch_accounts_and_fields(). Contas e campos são guardados separadamente, cada um com seu TTL.
+    Retorna o dicionário com as contas e campos da plataforma, ou None em caso de erro ou com o disjuntor da plataforma
+    aberto.
+    O disjuntor da plataforma só registra sucesso quando a API foi de fato consultada: contas e campos vindos do cache
+    não dizem nada sobre a plataforma e não podem zerar as falhas dos insights. Nesse caso a vaga de teste do disjuntor
+    meio-aberto, se tiver sido usada, é devolvida.
+    """
+    if not platform_breaker.allow(platform):
+        logger.warning("Plataforma %s ignorada: disjuntor aberto", platform)
+        return None
+    requested = []
+
+    def loader(fetch):
+        def load():
+            requested.append(fetch)
+            return fetch(platform)
+        return load
+
+    try:
+        accounts = metadata_cache.get_or_load(
+            ("accounts", platform), _shared(f"accounts:{platform}", loader(fetch_accounts), ACCOUNTS_TTL),
+            ttl=ACCOUNTS_TTL)
+        fields = metadata_cache.get_or_load(
+            ("fields", platform), _shared(f"fields:{platform}", loader(fetch_fields), FIELDS_TTL),
+            ttl=FIELDS_TTL)
+    except ApiError as error:
+        platform_breaker.record_failure(platform)
+        logger.error("Erro ao obter dados para a plataforma %s: %s", platform, error.status_code)
+        logger.error("Resposta da API: %s", error.body)
+        return None
+    except BaseException:
+        platform_breaker.release(platform)
+        raise
+    if requested:
+        platform_breaker.record_success(platform)
+    else:
+        platform_breaker.release(platform)
+    return _platform_data(platform, accounts, fields)
+
+
+def fetch_all_accounts_and_fields(platforms):
+    """
+    Executa get_accounts_and_fields() para todas as plataformas em paralelo.
+    Retorna a lista com os dados de cada plataforma, na mesma ordem de `platforms`, descartando as que falharam.
+    """
+    platform_values = [platform['value'] for platform in platforms]
+    for platform_value in platform_values:
+        logger.info("Processando plataforma: %s", platform_value)
+    results = _map_ordered(get_accounts_and_fields, platform_values)
+    return [platform_data for platform_data in results if platform_data]
+
+
+def iter_account_insights(platform, account, field_values, columns=REPORT_COLUMNS):
+    """
+    Percorre todas as páginas de insights de uma única conta de uma plataforma, pedindo à API apenas `field_values`.
+    Gera uma linha (dicionário) por anúncio, com 'Platform', 'Ad Name' e as colunas `columns`, à medida que as páginas
+    chegam. Lança `ApiError` em caso de erro.
+    """
+    account_name = account.get('name')
+    params = {
+        "platform": platform,
+        "account": account.get('id'),
+        "token": account.get('token'),
+        "fields": ','.join(field_values)
+    }
+
+    for insight in iter_pages("/api/insights", params, "insights", STREAM_INSIGHTS):
+        row = {"Platform": platform, "Ad Name": account_name}
+        for column in columns:
+            row[column] = insight.get(column, 'N/A')
+        yield row
+
+
+def _fetch_account_rows(platform, account, field_values, columns=REPORT_COLUMNS):
+    """
+    Busca todas as linhas de insights de uma conta passando pelos disjuntores da plataforma e da conta: com algum deles
+    aberto lança `CircuitOpenError` sem acessar a API; caso contrário registra o sucesso ou a falha nos dois.
+    O disjuntor da conta é consultado primeiro. Se ele liberar (talvez como requisição de teste) e o da plataforma
+    recusar, a vaga de teste da conta é devolvida, já que a requisição não foi feita.
+    Lança `ApiError` em caso de erro.
+    """
+    key = (platform, account.get('id'))
+    if not account_breaker.allow(key):
+        raise CircuitOpenError("/api/insights", {"platform": platform, "account": account.get('id')})
+    if not platform_breaker.allow(platform):
+        account_breaker.release(key)
+        raise CircuitOpenError("/api/insights", {"platform": platform, "account": account.get('id')})
+    try:
+        rows = list(iter_account_insights(platform, account, field_values, columns))
+    except ApiError:
+        platform_breaker.record_failure(platform)
+        account_breaker.record_failure(key)
+        raise
+    except BaseException:
+        platform_breaker.release(platform)
+        account_breaker.release(key)
+        raise
+    platform_breaker.record_success(platform)
+    account_breaker.record_success(key)
+    return rows
+
+
+def _log_account_error(platform, account, error):
+    if isinstance(error, CircuitOpenError):
+        logger.debug("Conta %s da plataforma %s ignorada: disjuntor aberto", account.get('id'), platform)
+    else:
+        logger.error("Erro ao obter insights para a conta %s na plataforma %s: %s", account.get('id'), platform,
+                     error.status_code)
+
+
+def fetch_account_insights(platform, account, field_values, columns=REPORT_COLUMNS):
+    """
+    Faz a requisição de insights de uma única conta de uma plataforma, incluindo todas as páginas.
+    Retorna a lista de linhas (dicionários) daquela conta, ou uma lista vazia em caso de erro ou com o disjuntor aberto.
+    """
+    try:
+        return _fetch_account_rows(platform, account, field_values, columns)
+    except ApiError as error:
+        _log_account_error(platform, account, error)
+        return []
+
+
+def platform_fields(platform_data):
+    """
+    Valores dos campos de insights de uma plataforma (resultado de get_accounts_and_fields()), na ordem da API.
+    """
+    return [field.get('value') for field in platform_data['fields']['fields']]
+
+
+def union_columns(platform_datas):
+    """
+    União dos campos de insights das plataformas informadas, na ordem em que aparecem pela primeira vez. É o esquema
+    de '/geral' com `?columns=all`: as colunas que uma plataforma não tem ficam como 'N/A' nas suas linhas.
+    """
+    columns = []
+    for platform_data in platform_datas:
+        for value in platform_fields(platform_data):
+            if value and value not in columns:
+                columns.append(value)
+    return tuple(columns)
+
+
+def _account_tasks(platform_data, columns=REPORT_COLUMNS):
+    """
+    Monta a lista de tarefas (plataforma, conta, campos, colunas) de uma plataforma, usada para distribuir as
+    requisições de insights. Apenas os campos da plataforma que fazem parte de `columns` são pedidos à API; com
+    `ALL_COLUMNS`, são pedidos e retornados todos os campos da plataforma. Se nenhuma coluna pedida existir na
+    plataforma, o primeiro campo é pedido mesmo assim, para que as linhas dos anúncios continuem aparecendo.
+    """
+    platform = platform_data['platform']
+    accounts = platform_data['accounts']['accounts']
+    available = platform_fields(platform_data)
+    if columns == ALL_COLUMNS:
+        columns = tuple(available)
+    field_values = [value for value in available if value in columns] or available[:1]
+    return [(platform, account, field_values, columns) for account in accounts]
+
+
+account_flight = SingleFlight()
+"""
+Junta as buscas de insights de uma mesma conta com os mesmos campos. Se dez relatórios forem pedidos ao mesmo tempo,
+cada conta é buscada uma única vez, mesmo que as tarefas ainda estejam na fila do pool.
+"""
+
+registry.callback(
+    "stract_circuit_open", "Quantidade de plataformas e contas com o disjuntor aberto.",
+    lambda: [({"scope": "platform"}, len(platform_breaker.open_keys())),
+             ({"scope": "account"}, len(account_breaker.open_keys()))])
+registry.callback(
+    "stract_single_flight_total", "Buscas executadas (leaders) e juntadas a uma idêntica em andamento (coalesced).",
+    lambda: [({"flight": flight, "result": result}, stats[result])
+             for flight, stats in (("http", client.single_flight.stats()), ("account", account_flight.stats()))
+             for result in ("leaders", "coalesced")],
+    type="counter")
+
+
+def _submit_account_task(task):
+    """
+    Envia a busca de insights de uma conta para o pool, ou reaproveita a busca idêntica que já está em andamento.
+    O resultado do future é o de _account_result(): (plataforma, conta, linhas), com `linhas` igual a None se a conta
+    falhou ou foi ignorada pelo disjuntor.
+    """
+    platform, account, field_values, columns = task
+    key = (platform, account.get('id'), tuple(field_values), tuple(columns))
+    return account_flight.submit(key, lambda: _executor.submit(_task(_account_result), task))
+
+
+def _iter_account_tasks(tasks):
+    """
+    Executa as tarefas de insights em paralelo e gera as linhas na ordem das tarefas.
+    As linhas de uma conta são geradas assim que ela e todas as anteriores terminarem, sem esperar pelas seguintes.
+    Como as buscas podem ser compartilhadas com outros relatórios, elas não são canceladas se o gerador for fechado
+    antes do fim.
+    """
+    futures = [_submit_account_task(task) for task in tasks]
+    for future in futures:
+        _, _, rows = future.result()
+        yield from rows or ()
+
+
+def iter_insights(platform_data, columns=REPORT_COLUMNS):
+    """
+    Versão em gerador de fetch_insights(): gera as linhas de insights de uma plataforma à medida que chegam, apenas
+    com as colunas `columns` (ou todos os campos da plataforma, com `ALL_COLUMNS`).
+    """
+    return _iter_account_tasks(_account_tasks(platform_data, columns))
+
+
+def fetch_insights(platform_data, columns=REPORT_COLUMNS):
     """
     Terceira requisiação
     Coleta os insights dos field values para as contas de cada uma das plataformas com base em fetch_accounts_and_fields(platform).
+    As requisições de cada conta são feitas em paralelo, mas as linhas são retornadas na ordem das contas.
     Organiza os dados de cada conta e retorna uma lista de dicionários com os resultados.
     """
-    platform = platform_data['platform']
-    accounts = platform_data['accounts']['accounts']
-    fields = platform_data['fields']['fields']
-    
-    insights_data = []
-    
-    field_values = [field.get('value') for field in fields]
-    
-    for account in accounts:
-        account_id = account.get('id')
-        account_name = account.get('name')
-        account_token = account.get('token')
-
-        field_values_str = ','.join(field_values)
-        insights_url = f"https://sidebar.stract.to/api/insights?platform={platform}&account={account_id}&token={account_token}&fields={field_values_str}"
-        
-        headers = get_api_headers()
-        response = requests.get(insights_url, headers=headers)
-
-        if response.status_code == 200:
-            insights = response.json()
-            for insight in insights.get('insights', []):
-                row = {
-                    "Platform": platform,
-                    "Ad Name": account_name,
-                    "clicks": insight.get('clicks', 'N/A'),
-                    "impressions": insight.get('impressions', 'N/A'),
-                    "spend": insight.get('spend', 'N/A'),
-                    "cpc": insight.get('cpc', 'N/A'),
-                    "ctr": insight.get('ctr', 'N/A')
-                }
-                insights_data.append(row)
-        else:
-            print(f"Erro ao obter insights para a conta {account_id} na plataforma {platform}: {response.status_code}")
-
-    return insights_data
+    return list(iter_insights(platform_data, columns))
+
+
+def iter_all_insights(platforms, columns=REPORT_COLUMNS):
+    """
+    Gera os insights de todas as contas de todas as plataformas informadas.
+    Primeiro busca contas e campos de todas as plataformas em paralelo e depois distribui as requisições de insights de
+    todas as contas no mesmo pool, de forma que o tempo total fique próximo ao da requisição mais lenta.
+    As linhas são geradas na ordem de plataforma e conta, como no processamento sequencial. Com `ALL_COLUMNS`, todas
+    as linhas têm a união dos campos das plataformas (ver union_columns()).
+    """
+    platform_datas = fetch_all_accounts_and_fields(platforms)
+    if columns == ALL_COLUMNS:
+        columns = union_columns(platform_datas)
+    tasks = []
+    for platform_data in platform_datas:
+        tasks.extend(_account_tasks(platform_data, columns))
+    return _iter_account_tasks(tasks)
+
+
+def _account_result(task):
+    """
+    Busca os insights de uma conta e retorna (plataforma, conta, linhas), com `linhas` igual a None em caso de erro.
+    Diferente de fetch_account_insights(), permite distinguir uma conta sem anúncios de uma conta que falhou.
+    """
+    platform, account, field_values, columns = task
+    try:
+        return platform, account, _fetch_account_rows(platform, account, field_values, columns)
+    except ApiError as error:
+        _log_account_error(platform, account, error)
+        return platform, account, None
+
+
+def iter_account_results(platform_datas):
+    """
+    Busca em paralelo os insights de todas as contas das plataformas informadas (resultado de
+    fetch_all_accounts_and_fields()) e gera (plataforma, conta, linhas) na ordem de plataforma e conta.
+    Usado pela atualização dos relatórios em segundo plano, que precisa tratar cada conta separadamente.
+    """
+    tasks = []
+    for platform_data in platform_datas:
+        tasks.extend(_account_tasks(platform_data))
+    return _executor.map(_task(_account_result), tasks)
+
+
+def collect_insights_within(platforms, timeout, columns=REPORT_COLUMNS):
+    """
+    Coleta os insights de todas as plataformas informadas esperando no máximo `timeout` segundos.
+    As contas e campos de cada plataforma são buscados em paralelo e, assim que uma plataforma responde, as buscas de
+    insights das suas contas são enviadas ao pool, sem esperar pelas demais plataformas.
+    Retorna (linhas, plataformas ausentes, colunas): as linhas das plataformas que terminaram dentro do prazo, na ordem
+    de plataforma e conta, a lista das plataformas deixadas de fora por não terem respondido a tempo, por falharem ao
+    buscar contas e campos ou por terem alguma conta que falhou ou foi ignorada pelo disjuntor ao buscar insights (uma
+    plataforma com contas faltando não é apresentada como completa), e as colunas das linhas. Com `ALL_COLUMNS`, cada
+    plataforma é buscada com todos os seus campos e as colunas retornadas são a união dos campos das plataformas
+    incluídas. As buscas que não terminaram continuam em andamento e podem ser aproveitadas por outros relatórios.
+    """
+    deadline = time.monotonic() + timeout
+    platform_values = [platform['value'] for platform in platforms]
+    metadata_futures = {_executor.submit(_task(get_accounts_and_fields), value): value for value in platform_values}
+    account_futures = {}
+    platform_datas = {}
+    try:
+        for future in as_completed(metadata_futures, timeout=max(0.0, deadline - time.monotonic())):
+            platform_data = future.result()
+            if platform_data:
+                platform_datas[metadata_futures[future]] = platform_data
+                account_futures[metadata_futures[future]] = [_submit_account_task(task)
+                                                              for task in _account_tasks(platform_data, columns)]
+    except FuturesTimeoutError:
+        pass
+
+    pending = [future for futures in account_futures.values() for future in futures]
+    wait(pending, timeout=max(0.0, deadline - time.monotonic()))
+
+    rows = []
+    missing = []
+    for platform_value in platform_values:
+        futures = account_futures.get(platform_value)
+        if futures is None or not all(future.done() for future in futures):
+            missing.append(platform_value)
+            continue
+        results = [future.result()[2] for future in futures]
+        if any(result is None for result in results):
+            missing.append(platform_value)
+            continue
+        for result in results:
+            rows.extend(result)
+    if columns == ALL_COLUMNS:
+        columns = union_columns(platform_datas[value] for value in platform_values if value not in missing)
+    return rows, missing, columns
+
+
+def collect_insights(platforms):
+    """
+    Coleta os insights de todas as contas de todas as plataformas informadas.
+    Retorna uma lista de dicionários ordenada por plataforma e conta (ver iter_all_insights()).
+    """
+    return list(iter_all_insights(platforms))
 
 
 def main():
@@ -145,21 +726,12 @@ def main():
     Função principal que orquestra o processo de obtenção das plataformas, contas, campos e insights.
     Organiza todos os dados em uma lista de dicionários e imprime o resultado.
     """
-    platforms = fetch_platforms()
-    all_insights_data = []
-    
-    for platform in platforms:
-        platform_value = platform['value']
-        print(f"Processando plataforma: {platform_value}")
-        
-        platform_data = fetch_accounts_and_fields(platform_value)
-        
-        if platform_data:
-            insights_data = fetch_insights(platform_data)
-            all_insights_data.extend(insights_data)
+    platforms = get_platforms()
+    all_insights_data = collect_insights(platforms)
     
     print("Dados organizados para utilização:", all_insights_data)
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=LOG_LEVEL)
     main()